@@ -0,0 +1,44 @@
+from django.conf import settings
+from posts.paginator import CursorPaginator
+from rest_framework.pagination import BasePagination, CursorPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """Keyset-пагинация ленты по (date_field, id) из posts.paginator.
+
+    Ответ: {'next': URL, 'previous': URL, 'results': [...]}, где ссылки
+    несут непрозрачный курсор; общего количества записей нет.
+    """
+    cursor_query_param = 'cursor'
+    date_field = 'pub_date'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        paginator = CursorPaginator(
+            queryset,
+            settings.REST_FRAMEWORK['PAGE_SIZE'],
+            date_field=getattr(view, 'date_field', self.date_field),
+        )
+        self.page = paginator.get_page(
+            request.query_params.get(self.cursor_query_param))
+        return list(self.page)
+
+    def _link(self, cursor):
+        if cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self._link(self.page.next_cursor),
+            'previous': self._link(self.page.previous_cursor),
+            'results': data,
+        })
+
+
+class IdCursorPagination(CursorPagination):
+    """Курсор по id для справочников без даты: группы и подписки."""
+    ordering = '-id'
@@ -0,0 +1,93 @@
+from django.contrib.auth import get_user_model
+from posts.models import Comment, Follow, Group, Post
+from rest_framework import serializers
+from rest_framework.validators import UniqueTogetherValidator
+
+User = get_user_model()
+
+
+class SparseFieldsMixin:
+    """Оставляет в ответе только поля из ?fields=id,text,author.
+
+    Неизвестные имена игнорируются; без параметра выводятся все поля.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if request is None or request.method != 'GET':
+            return
+        fields = request.query_params.get('fields')
+        if not fields:
+            return
+        wanted = {name.strip() for name in fields.split(',')}
+        for name in set(self.fields) - wanted:
+            self.fields.pop(name)
+
+
+class AuthorSerializer(serializers.ModelSerializer):
+    class Meta:
+        fields = ('id', 'username', 'first_name', 'last_name')
+        model = User
+
+
+class GroupField(serializers.SlugRelatedField):
+    """Группа принимается по slug, а выводится вложенным объектом."""
+
+    def __init__(self, **kwargs):
+        super().__init__(slug_field='slug', **kwargs)
+
+    def to_representation(self, value):
+        return {'id': value.pk, 'slug': value.slug, 'title': value.title}
+
+
+class GroupSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    class Meta:
+        fields = ('id', 'title', 'slug', 'description', 'posts_count')
+        model = Group
+
+
+class PostSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    author = AuthorSerializer(read_only=True)
+    group = GroupField(
+        queryset=Group.objects.all(), required=False, allow_null=True)
+
+    class Meta:
+        fields = (
+            'id', 'text', 'pub_date', 'author', 'group', 'image',
+            'comments_count',
+        )
+        read_only_fields = ('comments_count',)
+        model = Post
+
+
+class CommentSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    author = AuthorSerializer(read_only=True)
+
+    class Meta:
+        fields = ('id', 'post', 'author', 'text', 'created')
+        read_only_fields = ('post',)
+        model = Comment
+
+
+class FollowSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    user = serializers.HiddenField(default=serializers.CurrentUserDefault())
+    following = serializers.SlugRelatedField(
+        source='author', slug_field='username', queryset=User.objects.all())
+
+    class Meta:
+        fields = ('id', 'user', 'following')
+        model = Follow
+        validators = (
+            UniqueTogetherValidator(
+                queryset=Follow.objects.all(),
+                fields=('user', 'following'),
+                message='Вы уже подписаны на этого автора.',
+            ),
+        )
+
+    def validate_following(self, author):
+        if author == self.context['request'].user:
+            raise serializers.ValidationError(
+                'Нельзя подписаться на самого себя.')
+        return author
@@ -0,0 +1,125 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from posts.models import Comment, Follow, Group, Post
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+User = get_user_model()
+
+
+class ApiTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(
+            username='auth', first_name='Лев', last_name='Толстой')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='group_test',
+            description='Тестовое описание',
+        )
+        for i in range(25):
+            cls.post = Post.objects.create(
+                author=cls.user, text=f'Пост {i}', group=cls.group)
+        Comment.objects.create(
+            post=cls.post, author=cls.reader, text='Комментарий')
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = APIClient()
+        self.authorized_client = APIClient()
+        token = Token.objects.create(user=ApiTests.reader)
+        self.authorized_client.credentials(
+            HTTP_AUTHORIZATION=f'Token {token.key}')
+
+    def test_posts_cursor_pages(self):
+        """Проверка: посты листаются курсором, автор и группа вложены"""
+        response = self.guest_client.get(reverse('api:posts-list'))
+        data = response.json()
+        self.assertEqual(len(data['results']), 20)
+        self.assertIsNone(data['previous'])
+        first = data['results'][0]
+        self.assertEqual(first['text'], 'Пост 24')
+        self.assertEqual(first['author']['first_name'], 'Лев')
+        self.assertEqual(first['group']['slug'], self.group.slug)
+        data = self.guest_client.get(data['next']).json()
+        self.assertEqual(len(data['results']), 5)
+        self.assertIsNone(data['next'])
+
+    def test_sparse_fields(self):
+        """Проверка: ?fields= оставляет только запрошенные поля"""
+        response = self.guest_client.get(
+            reverse('api:posts-detail', args=[self.post.pk]),
+            {'fields': 'id,text,unknown'},
+        )
+        self.assertEqual(
+            response.json(), {'id': self.post.pk, 'text': 'Пост 24'})
+
+    def test_etag(self):
+        """Проверка: совпавший ETag дает 304, правка данных - новый ETag"""
+        url = reverse('api:posts-list')
+        etag = self.guest_client.get(url)['ETag']
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.post.text = 'Новый текст'
+        self.post.save()
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_write_posts_and_comments(self):
+        """Проверка: создание поста и комментария, правка только автором"""
+        response = self.authorized_client.post(
+            reverse('api:posts-list'),
+            {'text': 'Из API', 'group': self.group.slug},
+        )
+        self.assertEqual(response.status_code, 201)
+        post = Post.objects.get(pk=response.json()['id'])
+        self.assertEqual((post.author, post.group), (self.reader, self.group))
+        response = self.authorized_client.patch(
+            reverse('api:posts-detail', args=[self.post.pk]), {'text': '-'})
+        self.assertEqual(response.status_code, 403)
+        url = reverse('api:comments-list', args=[post.pk])
+        response = self.authorized_client.post(url, {'text': 'Ответ'})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.guest_client.get(url).json()['results'][0][
+            'author']['username'], 'reader')
+        response = self.guest_client.post(url, {'text': 'Гость'})
+        self.assertEqual(response.status_code, 401)
+
+    def test_follow(self):
+        """Проверка: подписка, повтор и подписка на себя отклоняются"""
+        url = reverse('api:follow-list')
+        response = self.authorized_client.post(url, {'following': 'auth'})
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(
+            Follow.objects.filter(user=self.reader, author=self.user).exists())
+        for username in ('auth', 'reader'):
+            response = self.authorized_client.post(
+                url, {'following': username})
+            self.assertEqual(response.status_code, 400)
+        results = self.authorized_client.get(url).json()['results']
+        self.assertEqual([item['following'] for item in results], ['auth'])
+        response = self.authorized_client.delete(
+            reverse('api:follow-detail', args=['auth']))
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.guest_client.get(url).status_code, 401)
+
+    def test_unfollow_dotted_username(self):
+        """Проверка: подписку на автора с точкой в имени можно удалить"""
+        author = User.objects.create_user(username='john.doe')
+        Follow.objects.create(user=self.reader, author=author)
+        response = self.authorized_client.delete(
+            reverse('api:follow-detail', args=['john.doe']))
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(
+            Follow.objects.filter(user=self.reader, author=author).exists())
+
+    def test_groups(self):
+        """Проверка: группы читаются по slug"""
+        response = self.guest_client.get(
+            reverse('api:groups-detail', args=[self.group.slug]))
+        self.assertEqual(response.json()['posts_count'], 25)
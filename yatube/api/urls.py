@@ -0,0 +1,22 @@
+from django.urls import include, path
+from rest_framework.authtoken.views import obtain_auth_token
+from rest_framework.routers import DefaultRouter
+
+from . import views
+
+app_name = 'api'
+
+router = DefaultRouter()
+router.register('posts', views.PostViewSet, basename='posts')
+router.register(
+    r'posts/(?P<post_id>\d+)/comments',
+    views.CommentViewSet,
+    basename='comments'
+)
+router.register('groups', views.GroupViewSet, basename='groups')
+router.register('follow', views.FollowViewSet, basename='follow')
+
+urlpatterns = [
+    path('v1/auth/token/', obtain_auth_token, name='token'),
+    path('v1/', include(router.urls)),
+]
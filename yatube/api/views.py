@@ -0,0 +1,135 @@
+import hashlib
+
+from django.shortcuts import get_object_or_404
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+from posts.caching import INDEX, NAMES, author_scope, get_version
+from posts.feeds import feed
+from posts.models import Group, Post
+from rest_framework import mixins, permissions, status, viewsets
+from rest_framework.response import Response
+
+from .pagination import IdCursorPagination, KeysetPagination
+from .permissions import IsAuthorOrReadOnly
+from .serializers import (CommentSerializer, FollowSerializer, GroupSerializer,
+                          PostSerializer)
+
+
+class ETagMixin:
+    """ETag/If-None-Match для GET по версиям кэша из posts.caching.
+
+    Версии областей меняются сигналами при любой правке данных, поэтому
+    совпавший ETag отдает 304 без единого запроса к базе.
+    """
+    etag_scopes = (INDEX,)
+
+    def get_etag_scopes(self, request):
+        return self.etag_scopes
+
+    def get_etag(self, request):
+        raw = ':'.join((
+            get_version(*self.get_etag_scopes(request)),
+            str(request.user.pk),
+            request.get_full_path(),
+            request.accepted_renderer.format,
+        ))
+        return '"{}"'.format(hashlib.md5(raw.encode()).hexdigest())
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(
+            request, response, *args, **kwargs)
+        etag = getattr(request, 'etag', None)
+        if etag and response.status_code == status.HTTP_200_OK:
+            response['ETag'] = etag
+        patch_vary_headers(response, ('Accept', 'Authorization', 'Cookie'))
+        return response
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method in ('GET', 'HEAD'):
+            request.etag = self.get_etag(request)
+
+    def conditional(self, action, request, *args, **kwargs):
+        etags = parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))
+        if '*' in etags or request.etag in etags:
+            return Response(
+                status=status.HTTP_304_NOT_MODIFIED,
+                headers={'ETag': request.etag},
+            )
+        return action(request, *args, **kwargs)
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional(super().retrieve, request, *args, **kwargs)
+
+
+class PostViewSet(ETagMixin, viewsets.ModelViewSet):
+    """Посты от новых к старым; фильтры ?group=<slug> и ?author=<username>."""
+    serializer_class = PostSerializer
+    pagination_class = KeysetPagination
+    permission_classes = (
+        permissions.IsAuthenticatedOrReadOnly, IsAuthorOrReadOnly,
+    )
+
+    def get_queryset(self):
+        post_list = Post.objects.all()
+        group = self.request.query_params.get('group')
+        if group:
+            post_list = post_list.filter(group__slug=group)
+        author = self.request.query_params.get('author')
+        if author:
+            post_list = post_list.filter(author__username=author)
+        if self.request.method == 'GET':
+            return feed(post_list)
+        return post_list.select_related('author', 'group')
+
+    def perform_create(self, serializer):
+        serializer.save(author=self.request.user)
+
+
+class CommentViewSet(ETagMixin, viewsets.ModelViewSet):
+    """Комментарии поста от новых к старым."""
+    serializer_class = CommentSerializer
+    pagination_class = KeysetPagination
+    date_field = 'created'
+    permission_classes = (
+        permissions.IsAuthenticatedOrReadOnly, IsAuthorOrReadOnly,
+    )
+
+    def get_post(self):
+        return get_object_or_404(
+            Post.objects.only('id'), pk=self.kwargs['post_id'])
+
+    def get_queryset(self):
+        return self.get_post().comments.select_related('author')
+
+    def perform_create(self, serializer):
+        serializer.save(author=self.request.user, post=self.get_post())
+
+
+class GroupViewSet(ETagMixin, viewsets.ReadOnlyModelViewSet):
+    queryset = Group.objects.all()
+    serializer_class = GroupSerializer
+    pagination_class = IdCursorPagination
+    lookup_field = 'slug'
+
+
+class FollowViewSet(ETagMixin, mixins.CreateModelMixin,
+                    mixins.DestroyModelMixin, viewsets.ReadOnlyModelViewSet):
+    """Подписки текущего пользователя; удаление - по username автора."""
+    serializer_class = FollowSerializer
+    pagination_class = IdCursorPagination
+    permission_classes = (permissions.IsAuthenticated,)
+    lookup_field = 'author__username'
+    lookup_url_kwarg = 'username'
+    # Символы имени пользователя Django: по умолчанию DRF не пускает точку.
+    lookup_value_regex = r'[\w.@+-]+'
+
+    def get_etag_scopes(self, request):
+        # Подписки пользователя меняют его область, переименования - NAMES.
+        return (author_scope(request.user.pk), NAMES)
+
+    def get_queryset(self):
+        return self.request.user.follower.select_related('author')
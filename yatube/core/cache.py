@@ -0,0 +1,563 @@
+"""Бэкенды кэша, которые считают попадания и промахи для /metrics.
+
+Промахи и попадания делятся по фрагменту: для {% cache %} это имя
+фрагмента, для остальных ключей - часть до первого ':' (page, version).
+Alias задается параметром METRICS_ALIAS в CACHES, по умолчанию default.
+get_many базового бэкенда вызывает get по ключу, так что тоже считается.
+
+TieredCache - двухслойный кэш: ограниченный LRU в памяти процесса перед
+общим для всех процессов файлом SQLite (SQLiteCache). Каждая запись
+в общий слой отмечается в журнале invalidations, и процессы не реже
+раза в POLL_INTERVAL секунд выбрасывают из своего слоя ключи, которые
+поменяли другие. Истекшие и лишние строки удаляет поток процесса раз
+в CULL_INTERVAL секунд, а не запись, на которую пришла очередь.
+
+Значения в файле - pickle, поэтому файл создается с правами 0600,
+а чужой файл на месте LOCATION не открывается.
+"""
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache.backends import locmem
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.exceptions import ImproperlyConfigured
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+FRAGMENT_PREFIX = 'template.cache.'
+# Сколько ждать блокировку записи в SQLite, в секундах.
+BUSY_TIMEOUT = 5
+# Ограничение SQLite на число параметров запроса с запасом.
+CHUNK_SIZE = 500
+# Сколько строк удаляет одна чистка за шаг: запись других процессов
+# ждет не дольше удаления стольких строк.
+CULL_BATCH = 1000
+SCHEMA_VERSION = 2
+# Старый файл пересоздается: в версии 1 expires лежал после value, и
+# чистка по сроку читала страницы переполнения каждой строки.
+SCHEMA = (
+    'DROP TABLE IF EXISTS cache',
+    'CREATE TABLE cache ('
+    'key TEXT PRIMARY KEY, expires REAL, value BLOB NOT NULL)',
+    'CREATE INDEX cache_expires ON cache (expires)',
+    'CREATE TABLE IF NOT EXISTS invalidations ('
+    'id INTEGER PRIMARY KEY AUTOINCREMENT, key TEXT)',
+    # Ключ NULL - сигнал очистить слой процесса целиком.
+    'INSERT INTO invalidations (key) VALUES (NULL)',
+    f'PRAGMA user_version = {SCHEMA_VERSION}',
+)
+# Потоки чистки: один на файл в каждом процессе.
+_CULLERS = {}
+_CULLERS_LOCK = threading.Lock()
+
+
+def _open_private(path):
+    """Создает файл кэша с правами 0600; чужой файл - ошибка."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+    descriptor = os.open(
+        path, os.O_RDWR | os.O_CREAT | os.O_NOFOLLOW, 0o600)
+    try:
+        if os.fstat(descriptor).st_uid != os.getuid():
+            raise ImproperlyConfigured(
+                f'Файл кэша {path} принадлежит другому пользователю')
+        # Файл от прежних версий мог быть доступен на чтение всем.
+        os.fchmod(descriptor, 0o600)
+    finally:
+        os.close(descriptor)
+
+
+def fragment_of(key):
+    if key.startswith(FRAGMENT_PREFIX):
+        return key[len(FRAGMENT_PREFIX):].split('.', 1)[0]
+    return key.split(':', 1)[0]
+
+
+def _chunks(items):
+    items = list(items)
+    for start in range(0, len(items), CHUNK_SIZE):
+        yield items[start:start + CHUNK_SIZE]
+
+
+class MetricsMixin:
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        params = args[-1] if args else kwargs.get('params', {})
+        self.metrics_alias = params.get('METRICS_ALIAS', 'default')
+
+    def record(self, key, hit):
+        metrics.record_cache(
+            self.metrics_alias, fragment_of(key), int(hit), int(not hit))
+
+    def get(self, key, default=None, version=None):
+        value = super().get(key, _MISSING, version=version)
+        hit = value is not _MISSING
+        self.record(key, hit)
+        return value if hit else default
+
+
+class LocMemCache(MetricsMixin, locmem.LocMemCache):
+    pass
+
+
+class SQLiteCache(BaseCache):
+    """Кэш в файле SQLite (LOCATION), общий для процессов одной машины.
+
+    Записи, удаления и очистка пишут ключи в журнал invalidations в той
+    же транзакции; changes() отдает журнал после заданного номера.
+    Журнал хранит последние LOG_SIZE записей.
+
+    Число строк для MAX_ENTRIES считается по rowid, без count(*): новые
+    строки получают rowid больше прежних.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self.path = location
+        options = params.get('OPTIONS', {})
+        self.log_size = options.get('LOG_SIZE', 10000)
+        self.cull_interval = options.get('CULL_INTERVAL', 10)
+        self._local = threading.local()
+
+    def connection(self):
+        # Соединение свое у каждого потока и у процесса после fork.
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            _open_private(self.path)
+            connection = sqlite3.connect(
+                self.path, timeout=BUSY_TIMEOUT, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._migrate(connection)
+            local.connection, local.pid = connection, os.getpid()
+        return local.connection
+
+    @staticmethod
+    def _version(cursor):
+        return cursor.execute('PRAGMA user_version').fetchone()[0]
+
+    def _migrate(self, connection):
+        cursor = connection.cursor()
+        if self._version(cursor) == SCHEMA_VERSION:
+            return
+        cursor.execute('BEGIN IMMEDIATE')
+        try:
+            # Другой процесс мог успеть раньше.
+            if self._version(cursor) != SCHEMA_VERSION:
+                for statement in SCHEMA:
+                    cursor.execute(statement)
+        except BaseException:
+            cursor.execute('ROLLBACK')
+            raise
+        cursor.execute('COMMIT')
+
+    def _transaction(self, callback):
+        """callback(cursor) в транзакции с блокировкой записи."""
+        cursor = self.connection().cursor()
+        cursor.execute('BEGIN IMMEDIATE')
+        try:
+            result = callback(cursor)
+        except BaseException:
+            cursor.execute('ROLLBACK')
+            raise
+        cursor.execute('COMMIT')
+        return result
+
+    def _write(self, callback):
+        self._start_culler()
+        return self._transaction(callback)
+
+    def _start_culler(self):
+        key = self.path, os.getpid()
+        if key in _CULLERS:
+            return
+        with _CULLERS_LOCK:
+            if key in _CULLERS:
+                return
+            # После fork потока чистки в ребенке нет: pid уже другой.
+            culler = _CULLERS[key] = threading.Thread(
+                target=self._cull_forever, args=(os.getpid(),),
+                name='cache-cull', daemon=True)
+        culler.start()
+
+    def _cull_forever(self, pid):
+        while os.getpid() == pid:
+            time.sleep(self.cull_interval)
+            try:
+                self.cull()
+            except sqlite3.Error:
+                logger.exception('Не удалось почистить кэш %s', self.path)
+
+    @staticmethod
+    def _log(cursor, keys):
+        cursor.executemany('INSERT INTO invalidations (key) VALUES (?)',
+                           [(key,) for key in keys])
+
+    # Методы ниже принимают готовые ключи, после make_key.
+
+    def fetch(self, keys):
+        """{ключ: (pickle значения, срок)} для живых ключей из keys."""
+        found, now = {}, time.time()
+        for chunk in _chunks(keys):
+            rows = self.connection().execute(
+                'SELECT key, value, expires FROM cache WHERE key IN ({}) '
+                'AND (expires IS NULL OR expires > ?)'.format(
+                    ', '.join('?' * len(chunk))),
+                [*chunk, now])
+            for key, value, expires in rows:
+                found[key] = value, expires
+        return found
+
+    def store(self, items, expires):
+        """Пишет {ключ: pickle значения} со сроком expires."""
+        def callback(cursor):
+            cursor.executemany(
+                'INSERT OR REPLACE INTO cache (key, value, expires) '
+                'VALUES (?, ?, ?)',
+                [(key, value, expires) for key, value in items.items()])
+            self._log(cursor, items)
+        self._write(callback)
+
+    def store_new(self, key, value, expires):
+        """Пишет значение, только если ключа нет; True, если записано."""
+        def callback(cursor):
+            cursor.execute(
+                'SELECT 1 FROM cache WHERE key = ? '
+                'AND (expires IS NULL OR expires > ?)', (key, time.time()))
+            if cursor.fetchone():
+                return False
+            cursor.execute(
+                'INSERT OR REPLACE INTO cache (key, value, expires) '
+                'VALUES (?, ?, ?)', (key, value, expires))
+            self._log(cursor, [key])
+            return True
+        return self._write(callback)
+
+    def store_existing(self, key, value, expires):
+        """Пишет значение, только если ключ есть; True, если записано."""
+        def callback(cursor):
+            cursor.execute(
+                'UPDATE cache SET value = ?, expires = ? WHERE key = ? '
+                'AND (expires IS NULL OR expires > ?)',
+                (value, expires, key, time.time()))
+            if not cursor.rowcount:
+                return False
+            self._log(cursor, [key])
+            return True
+        return self._write(callback)
+
+    def remove(self, keys):
+        """Удаляет ключи; число удаленных."""
+        def callback(cursor):
+            deleted = 0
+            for chunk in _chunks(keys):
+                cursor.execute('DELETE FROM cache WHERE key IN ({})'.format(
+                    ', '.join('?' * len(chunk))), chunk)
+                deleted += cursor.rowcount
+            self._log(cursor, keys)
+            return deleted
+        return self._write(callback)
+
+    def add_to(self, key, delta):
+        """Атомарно прибавляет delta к числу под ключом."""
+        def callback(cursor):
+            cursor.execute(
+                'SELECT value, expires FROM cache WHERE key = ? '
+                'AND (expires IS NULL OR expires > ?)', (key, time.time()))
+            row = cursor.fetchone()
+            if row is None:
+                raise ValueError(f"Key '{key}' not found")
+            value = pickle.loads(row[0]) + delta
+            cursor.execute(
+                'UPDATE cache SET value = ? WHERE key = ?',
+                (pickle.dumps(value, pickle.HIGHEST_PROTOCOL), key))
+            self._log(cursor, [key])
+            return value
+        return self._write(callback)
+
+    def prolong(self, key, expires):
+        """Меняет срок живого ключа; False, если ключа нет."""
+        def callback(cursor):
+            cursor.execute(
+                'UPDATE cache SET expires = ? WHERE key = ? '
+                'AND (expires IS NULL OR expires > ?)',
+                (expires, key, time.time()))
+            if not cursor.rowcount:
+                return False
+            self._log(cursor, [key])
+            return True
+        return self._write(callback)
+
+    def erase(self):
+        # Ключ NULL в журнале - сигнал очистить слой процесса целиком.
+        def callback(cursor):
+            cursor.execute('DELETE FROM cache')
+            self._log(cursor, [None])
+        self._write(callback)
+
+    def changes(self, since):
+        """Журнал после номера since и номер самой старой его записи."""
+        connection = self.connection()
+        oldest = connection.execute(
+            'SELECT min(id) FROM invalidations').fetchone()[0]
+        rows = connection.execute(
+            'SELECT id, key FROM invalidations WHERE id > ? ORDER BY id',
+            (since,)).fetchall()
+        return rows, oldest
+
+    def last_change(self):
+        return self.connection().execute(
+            'SELECT coalesce(max(id), 0) FROM invalidations').fetchone()[0]
+
+    def cull(self):
+        """Удаляет истекшие строки, лишние сверх MAX_ENTRIES и журнал.
+
+        За раз - не больше CULL_BATCH строк каждого вида, остальное
+        дочищают следующие вызовы.
+        """
+        def callback(cursor):
+            cursor.execute(
+                'DELETE FROM cache WHERE rowid IN (SELECT rowid FROM cache '
+                'WHERE expires <= ? LIMIT ?)', (time.time(), CULL_BATCH))
+            # Первыми уходят строки, записанные раньше других.
+            cursor.execute(
+                'SELECT min(rowid), max(rowid) - min(rowid) + 1 FROM cache')
+            first, span = cursor.fetchone()
+            extra = (span or 0) - self._max_entries
+            if extra > 0:
+                cursor.execute('DELETE FROM cache WHERE rowid < ?',
+                               (first + min(extra, CULL_BATCH),))
+            cursor.execute(
+                'DELETE FROM invalidations WHERE id <= '
+                '(SELECT max(id) FROM invalidations) - ?', (self.log_size,))
+        self._transaction(callback)
+
+    # API бэкенда Django.
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def get(self, key, default=None, version=None):
+        key = self._key(key, version)
+        row = self.fetch([key]).get(key)
+        return default if row is None else pickle.loads(row[0])
+
+    def get_many(self, keys, version=None):
+        made = {self._key(key, version): key for key in keys}
+        return {
+            made[key]: pickle.loads(value)
+            for key, (value, _) in self.fetch(made).items()
+        }
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.store(
+            {self._key(key, version): pickle.dumps(
+                value, pickle.HIGHEST_PROTOCOL)},
+            self.get_backend_timeout(timeout))
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        self.store({
+            self._key(key, version): pickle.dumps(
+                value, pickle.HIGHEST_PROTOCOL)
+            for key, value in data.items()
+        }, self.get_backend_timeout(timeout))
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.store_new(
+            self._key(key, version),
+            pickle.dumps(value, pickle.HIGHEST_PROTOCOL),
+            self.get_backend_timeout(timeout))
+
+    def replace(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        """Как replace у memcached: set, только если ключ уже есть."""
+        return self.store_existing(
+            self._key(key, version),
+            pickle.dumps(value, pickle.HIGHEST_PROTOCOL),
+            self.get_backend_timeout(timeout))
+
+    def incr(self, key, delta=1, version=None):
+        return self.add_to(self._key(key, version), delta)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.prolong(self._key(key, version),
+                            self.get_backend_timeout(timeout))
+
+    def delete(self, key, version=None):
+        return bool(self.remove([self._key(key, version)]))
+
+    def delete_many(self, keys, version=None):
+        self.remove([self._key(key, version) for key in keys])
+
+    def has_key(self, key, version=None):
+        key = self._key(key, version)
+        return key in self.fetch([key])
+
+    def clear(self):
+        self.erase()
+
+
+class TieredCache(MetricsMixin, SQLiteCache):
+    """LRU процесса на LOCAL_MAX_ENTRIES ключей перед SQLiteCache.
+
+    Чтение идет сначала в свой слой, промахи - одним запросом в общий,
+    найденное там кладется в свой слой. Запись идет в общий слой, после
+    нее ключ выбрасывается из своего и перечитается при следующем get,
+    так что свои записи процесс видит сразу, а чужие - не позже чем
+    через POLL_INTERVAL секунд.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(location, params)
+        options = params.get('OPTIONS', {})
+        self.local_max_entries = options.get('LOCAL_MAX_ENTRIES', 1000)
+        self.poll_interval = options.get('POLL_INTERVAL', 0.25)
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.pid = os.getpid()
+        self.local = OrderedDict()
+        self.last_seen = None
+        self.next_poll = 0
+        # Растет при каждом сбросе ключей из своего слоя.
+        self.generation = 0
+
+    def poll(self):
+        """Выбрасывает из своего слоя ключи, измененные в общем."""
+        if os.getpid() != self.pid:
+            self.reset()
+        now = time.monotonic()
+        if now < self.next_poll:
+            return
+        self.next_poll = now + self.poll_interval
+        if self.last_seen is None:
+            self.last_seen = self.last_change()
+            return
+        rows, oldest = self.changes(self.last_seen)
+        dropped = 0
+        if oldest is not None and oldest > self.last_seen + 1:
+            # Журнал обрезан дальше, чем процесс успел прочитать.
+            dropped = len(self.local)
+            self.local.clear()
+        for number, key in rows:
+            if key is None:
+                dropped += len(self.local)
+                self.local.clear()
+            elif self.local.pop(key, None) is not None:
+                dropped += 1
+        if rows:
+            self.last_seen = rows[-1][0]
+            self.generation += 1
+        metrics.record_invalidations(self.metrics_alias, dropped)
+
+    def _remember(self, key, value, expires, generation):
+        # Если между чтением из общего слоя и этим местом ключи
+        # сбрасывались, значение могло устареть - в свой слой его не кладем.
+        if self.generation != generation:
+            return
+        self.local[key] = value, expires
+        self.local.move_to_end(key)
+        while len(self.local) > self.local_max_entries:
+            self.local.popitem(last=False)
+
+    def lookup(self, keys):
+        """{ключ: значение} из своего слоя, а чего нет - из общего."""
+        found, missing, now = {}, [], time.time()
+        with self.lock:
+            self.poll()
+            generation = self.generation
+            for key in keys:
+                entry = self.local.get(key)
+                expires = entry and entry[1]
+                if entry is None or expires is not None and expires <= now:
+                    missing.append(key)
+                    continue
+                self.local.move_to_end(key)
+                found[key] = entry[0]
+        alias = self.metrics_alias
+        metrics.record_tier(alias, 'local', len(found), len(missing))
+        if missing:
+            shared = self.fetch(missing)
+            metrics.record_tier(
+                alias, 'shared', len(shared), len(missing) - len(shared))
+            with self.lock:
+                for key, (value, expires) in shared.items():
+                    self._remember(key, value, expires, generation)
+                    found[key] = value
+        return {key: pickle.loads(value) for key, value in found.items()}
+
+    def forget(self, keys):
+        """Сбрасывает ключи из своего слоя после записи в общий."""
+        with self.lock:
+            self.generation += 1
+            for key in keys:
+                self.local.pop(key, None)
+
+    def store(self, items, expires):
+        super().store(items, expires)
+        self.forget(items)
+
+    def store_new(self, key, value, expires):
+        try:
+            return super().store_new(key, value, expires)
+        finally:
+            self.forget([key])
+
+    def store_existing(self, key, value, expires):
+        try:
+            return super().store_existing(key, value, expires)
+        finally:
+            self.forget([key])
+
+    def remove(self, keys):
+        try:
+            return super().remove(keys)
+        finally:
+            self.forget(keys)
+
+    def add_to(self, key, delta):
+        try:
+            return super().add_to(key, delta)
+        finally:
+            self.forget([key])
+
+    def prolong(self, key, expires):
+        try:
+            return super().prolong(key, expires)
+        finally:
+            self.forget([key])
+
+    def erase(self):
+        super().erase()
+        with self.lock:
+            self.generation += 1
+            self.local.clear()
+
+    def get(self, key, default=None, version=None):
+        made = self._key(key, version)
+        found = self.lookup([made])
+        self.record(key, made in found)
+        return found.get(made, default)
+
+    def get_many(self, keys, version=None):
+        made = {self._key(key, version): key for key in keys}
+        found = self.lookup(list(made))
+        for key, original in made.items():
+            self.record(original, key in found)
+        return {made[key]: value for key, value in found.items()}
+
+    def has_key(self, key, version=None):
+        made = self._key(key, version)
+        return made in self.lookup([made])
@@ -0,0 +1,104 @@
+"""Карточки объектов из кэша: вложенное кэширование фрагментов.
+
+Карточка - шаблон одного объекта, например posts/includes/post.html.
+Ключ карточки - модель, pk и версия: отпечаток исходника шаблона
+с его include и колонок объекта вместе со связанными строками,
+загруженными с ним через select_related. Правка поста, смена группы,
+переименование автора, выкладка с новым шаблоном меняют версию,
+старая карточка просто больше не читается и уходит из кэша по сроку
+или вытеснением. Сбрасывать карточки не нужно; правки
+через queryset.update() без сигналов тоже видны.
+
+Карточки страницы читаются одним cache.get_many, рендерятся только
+промахи, и пишутся они одним set_many. Когда фрагмент страницы
+устарел, перерисовываются лишь изменившиеся карточки.
+"""
+import hashlib
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.fields.files import FieldFile
+from django.template.loader_tags import IncludeNode
+from django.utils.safestring import mark_safe
+
+
+def _digest(digest, obj):
+    loaded = obj.__dict__
+    for field in obj._meta.concrete_fields:
+        if field.attname not in loaded:
+            continue
+        value = loaded[field.attname]
+        # Картинка после обращения к ней - FieldFile, а до - строка.
+        if isinstance(value, FieldFile):
+            value = value.name
+        digest.update(f'{field.attname}={value!r};'.encode())
+    for name, related in sorted(obj._state.fields_cache.items()):
+        digest.update(f'{name}:('.encode())
+        if related is not None:
+            _digest(digest, related)
+        digest.update(b');')
+
+
+def _template_version(engine, template_name):
+    digest = hashlib.md5()
+    pending, seen = [template_name], set()
+    while pending:
+        name = pending.pop()
+        if name in seen:
+            continue
+        seen.add(name)
+        template = engine.get_template(name)
+        digest.update(f'{name}:{template.source}'.encode())
+        # Include с именем из переменной не учитываются.
+        for node in template.nodelist.get_nodes_by_type(IncludeNode):
+            if isinstance(node.template.var, str):
+                pending.append(node.template.var)
+    return digest.hexdigest()
+
+
+_cached_template_version = lru_cache(maxsize=None)(_template_version)
+
+
+def template_version(engine, template_name):
+    """Отпечаток исходника шаблона и шаблонов из его include.
+
+    Шаблоны меняются только с выкладкой, поэтому отпечаток считается
+    раз на процесс; с debug движка - при каждом вызове.
+    """
+    if engine.debug:
+        return _template_version(engine, template_name)
+    return _cached_template_version(engine, template_name)
+
+
+def card_key(obj, template_name, version=''):
+    """Ключ карточки obj: меняется вместе с любой загруженной колонкой
+    и с версией шаблона (template_version)."""
+    digest = hashlib.md5(f'{template_name}:{version}'.encode())
+    _digest(digest, obj)
+    return f'card:{obj._meta.label_lower}:{obj.pk}:{digest.hexdigest()}'
+
+
+def render_cards(context, items, template_name, name):
+    """[(объект, html)] карточек items; в шаблоне объект зовется name.
+
+    Карточка рендерится в контексте страницы, поэтому в шаблоне
+    карточки не должно быть ничего личного: меню, кнопок, форм.
+    """
+    items = list(items)
+    engine = context.template.engine
+    version = template_version(engine, template_name)
+    keys = [card_key(obj, template_name, version) for obj in items]
+    cached = cache.get_many(keys)
+    template = engine.get_template(template_name)
+    fresh = {}
+    cards = []
+    for obj, key in zip(items, keys):
+        html = cached.get(key)
+        if html is None:
+            with context.push(**{name: obj}):
+                html = fresh[key] = template.render(context)
+        cards.append((obj, mark_safe(html)))
+    if fresh:
+        cache.set_many(fresh, settings.CARD_CACHE_TIMEOUT)
+    return cards
@@ -0,0 +1,72 @@
+from collections import defaultdict, deque
+
+from core import querylog
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = ('Показывает журнал медленных запросов и N+1: последние '
+            'записи или (--top) самые дорогие формы запросов.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--type', dest='kind', choices=querylog.TYPES)
+        parser.add_argument('--view', help='Имя view, например posts:index.')
+        parser.add_argument(
+            '--min-ms', type=float, default=0,
+            help='Не короче стольких миллисекунд.')
+        parser.add_argument('--limit', type=int, default=20)
+        parser.add_argument(
+            '--top', action='store_true',
+            help='Сгруппировать по форме запроса и отсортировать по '
+                 'суммарному времени.')
+        parser.add_argument(
+            'files', nargs='*',
+            help='Файлы журнала; по умолчанию SLOW_QUERY_LOG_FILE и его '
+                 'ротированные копии.')
+
+    def handle(self, *args, kind, view, min_ms, limit, top, files,
+               **options):
+        records = (
+            record for record in querylog.read(files or querylog.log_files())
+            if (kind is None or record.get('type') == kind)
+            and (view is None or record.get('view') == view)
+            and record.get('duration_ms', 0) >= min_ms
+        )
+        if top:
+            self.show_top(records, limit)
+            return
+        for record in deque(records, maxlen=limit):
+            self.show(record)
+
+    def show(self, record):
+        repeated = ''
+        if record['type'] == querylog.N_PLUS_ONE:
+            repeated = f' x{record["count"]}'
+        self.stdout.write(self.style.WARNING(
+            f'{record["time"]} {record["view"]} {record["path"]} '
+            f'{record["type"]}{repeated} {record["duration_ms"]} мс'))
+        for name in ('site', 'template'):
+            if record.get(name):
+                self.stdout.write(f'  {name}: {record[name]}')
+        self.stdout.write(f'  {record["sql"]}')
+        if record.get('params'):
+            self.stdout.write(f'  params: {", ".join(record["params"])}')
+        for line in record.get('plan') or ():
+            self.stdout.write(f'  plan: {line}')
+
+    def show_top(self, records, limit):
+        groups = defaultdict(lambda: {'count': 0, 'total': 0.0, 'max': 0.0,
+                                      'views': set()})
+        for record in records:
+            group = groups[querylog.shape(record['sql'])]
+            group['count'] += 1
+            group['total'] += record['duration_ms']
+            group['max'] = max(group['max'], record['duration_ms'])
+            group['views'].add(record['view'] or '-')
+        ranked = sorted(groups.items(), key=lambda item: -item[1]['total'])
+        for sql, group in ranked[:limit]:
+            self.stdout.write(self.style.WARNING(
+                f'{group["total"]:.1f} мс всего, {group["count"]} раз, '
+                f'максимум {group["max"]:.1f} мс: '
+                f'{", ".join(sorted(group["views"]))}'))
+            self.stdout.write(f'  {sql}')
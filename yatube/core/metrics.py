@@ -0,0 +1,248 @@
+"""Метрики запросов в текстовом формате Prometheus.
+
+Каждый процесс копит счетчики у себя в памяти, а фоновый поток раз в
+METRICS_FLUSH_INTERVAL секунд записывает их снимок в свой файл в
+METRICS_DIR: запросы файлы не пишут. Страница /metrics складывает
+снимки всех процессов, так что счетчики воркеров суммируются. Файлы
+завершившихся процессов не удаляются: счетчики Prometheus не должны
+уменьшаться. Каталог очищают при деплое, перед запуском воркеров.
+"""
+import atexit
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+PREFIX = 'yatube_'
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+)
+HELP = {
+    'requests_total': ('counter', 'Запросы по view, методу и коду ответа.'),
+    'request_duration_seconds': ('histogram', 'Время ответа по view.'),
+    'db_queries_total': ('counter', 'SQL-запросы по view.'),
+    'db_duration_seconds_total': ('counter', 'Время SQL-запросов по view.'),
+    'response_bytes_total': ('counter', 'Размер ответов по view.'),
+    'cache_hits_total': ('counter', 'Попадания в кэш по alias и фрагменту.'),
+    'cache_misses_total': ('counter', 'Промахи кэша по alias и фрагменту.'),
+    'cache_tier_hits_total': ('counter', 'Попадания по слоям кэша.'),
+    'cache_tier_misses_total': ('counter', 'Промахи по слоям кэша.'),
+    'cache_invalidations_total': (
+        'counter', 'Ключи, сброшенные из слоя процесса по журналу.'),
+}
+
+
+class Registry:
+    """Счетчики и гистограммы текущего процесса."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # Снимок и запись файла - под своей блокировкой: старый снимок
+        # не перезапишет более новый.
+        self.flush_lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.pid = os.getpid()
+        self.name = f'{self.pid}-{time.time_ns()}.json'
+        self.counters = defaultdict(float)
+        # (имя, метки) -> [число по корзинам..., +Inf, сумма]
+        self.histograms = {}
+        self.next_flush = 0
+        # После fork потока записи в ребенке нет, он запускается заново.
+        self.flusher = None
+
+    def _check_fork(self):
+        # После fork ребенок начинает со своих нулей и своего файла,
+        # иначе счетчики родителя посчитались бы дважды.
+        if os.getpid() != self.pid:
+            self.reset()
+
+    def inc(self, name, labels, value=1):
+        with self.lock:
+            self._check_fork()
+            self.counters[name, labels] += value
+
+    def _observe(self, name, labels, value):
+        counts = self.histograms.get((name, labels))
+        if counts is None:
+            counts = self.histograms[name, labels] = [0] * (
+                len(LATENCY_BUCKETS) + 2)
+        counts[bisect_left(LATENCY_BUCKETS, value)] += 1
+        counts[-1] += value
+
+    def observe(self, name, labels, value):
+        with self.lock:
+            self._check_fork()
+            self._observe(name, labels, value)
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'counters': [
+                    [name, labels, value]
+                    for (name, labels), value in self.counters.items()
+                ],
+                'histograms': [
+                    [name, labels, counts[:]]
+                    for (name, labels), counts in self.histograms.items()
+                ],
+            }
+
+    def flush(self, force=False):
+        """Пишет снимок в файл процесса, если подошло время."""
+        now = time.monotonic()
+        with self.lock:
+            self._check_fork()
+            if not force and now < self.next_flush:
+                return
+            self.next_flush = now + settings.METRICS_FLUSH_INTERVAL
+            name = self.name
+        directory = settings.METRICS_DIR
+        with self.flush_lock:
+            os.makedirs(directory, exist_ok=True)
+            # Запись во временный файл и rename: читатель не увидит
+            # половину снимка.
+            fd, path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+            with os.fdopen(fd, 'w') as file:
+                json.dump(self.snapshot(), file)
+            os.replace(path, os.path.join(directory, name))
+
+    def _flush_forever(self, pid):
+        while os.getpid() == pid:
+            time.sleep(settings.METRICS_FLUSH_INTERVAL)
+            try:
+                self.flush()
+            except OSError:
+                logger.exception('Не удалось записать снимок метрик')
+
+    def start(self):
+        """Запускает поток записи снимков, если его еще нет."""
+        if self.flusher is not None and self.pid == os.getpid():
+            return
+        with self.lock:
+            self._check_fork()
+            if self.flusher is not None:
+                return
+            self.flusher = threading.Thread(
+                target=self._flush_forever, args=(self.pid,),
+                name='metrics-flush', daemon=True)
+        self.flusher.start()
+
+
+REGISTRY = Registry()
+
+
+@atexit.register
+def _flush_at_exit():
+    # Последние счетчики процесса, который обслуживал запросы.
+    if REGISTRY.flusher is not None:
+        REGISTRY.flush(force=True)
+
+
+def record_request(view, method, status, duration, queries, sql_time,
+                   size):
+    labels = (('view', view),)
+    with REGISTRY.lock:
+        REGISTRY._check_fork()
+        counters = REGISTRY.counters
+        counters['requests_total', (
+            ('view', view), ('method', method), ('status', str(status)),
+        )] += 1
+        counters['db_queries_total', labels] += queries
+        counters['db_duration_seconds_total', labels] += sql_time
+        if size is not None:
+            counters['response_bytes_total', labels] += size
+        REGISTRY._observe('request_duration_seconds', labels, duration)
+    REGISTRY.start()
+
+
+def record_cache(alias, fragment, hits, misses):
+    labels = (('alias', alias), ('fragment', fragment))
+    if hits:
+        REGISTRY.inc('cache_hits_total', labels, hits)
+    if misses:
+        REGISTRY.inc('cache_misses_total', labels, misses)
+
+
+def record_tier(alias, tier, hits, misses):
+    labels = (('alias', alias), ('tier', tier))
+    if hits:
+        REGISTRY.inc('cache_tier_hits_total', labels, hits)
+    if misses:
+        REGISTRY.inc('cache_tier_misses_total', labels, misses)
+
+
+def record_invalidations(alias, count):
+    if count:
+        REGISTRY.inc('cache_invalidations_total', (('alias', alias),), count)
+
+
+def collect():
+    """Сумма снимков всех процессов; свой снимок пишется заново."""
+    REGISTRY.flush(force=True)
+    counters, histograms = defaultdict(float), {}
+    directory = settings.METRICS_DIR
+    for name in os.listdir(directory):
+        if not name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(directory, name)) as file:
+                snapshot = json.load(file)
+        except (OSError, ValueError):
+            continue
+        for metric, labels, value in snapshot['counters']:
+            counters[metric, tuple(map(tuple, labels))] += value
+        for metric, labels, counts in snapshot['histograms']:
+            key = metric, tuple(map(tuple, labels))
+            total = histograms.setdefault(key, [0] * len(counts))
+            for index, count in enumerate(counts):
+                total[index] += count
+    return counters, histograms
+
+
+def _labels(labels, extra=()):
+    pairs = [*labels, *extra]
+    if not pairs:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(key, str(value).replace(
+        '\\', r'\\').replace('"', r'\"').replace('\n', r'\n'))
+        for key, value in pairs) + '}'
+
+
+def _number(value):
+    return repr(int(value)) if float(value).is_integer() else repr(value)
+
+
+def render(counters, histograms):
+    """Текстовый формат Prometheus 0.0.4."""
+    series = defaultdict(list)
+    for (name, labels), value in sorted(counters.items()):
+        series[name].append(f'{PREFIX}{name}{_labels(labels)} '
+                            f'{_number(value)}')
+    for (name, labels), counts in sorted(histograms.items()):
+        cumulative = 0
+        for bound, count in zip((*LATENCY_BUCKETS, '+Inf'), counts):
+            cumulative += count
+            series[name].append(
+                f'{PREFIX}{name}_bucket'
+                f'{_labels(labels, [("le", bound)])} {cumulative}')
+        series[name].append(
+            f'{PREFIX}{name}_sum{_labels(labels)} {_number(counts[-1])}')
+        series[name].append(
+            f'{PREFIX}{name}_count{_labels(labels)} {cumulative}')
+    lines = []
+    for name, (kind, text) in HELP.items():
+        if name in series:
+            lines.append(f'# HELP {PREFIX}{name} {text}')
+            lines.append(f'# TYPE {PREFIX}{name} {kind}')
+            lines.extend(series[name])
+    return '\n'.join(lines) + '\n'
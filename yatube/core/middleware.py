@@ -0,0 +1,74 @@
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+from . import metrics, querylog
+
+METHODS = frozenset(('GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE',
+                     'OPTIONS'))
+
+
+class QueryMeter:
+    """execute_wrapper: число и суммарное время SQL-запросов."""
+
+    def __init__(self):
+        self.count = 0
+        self.time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.time += time.perf_counter() - started
+            self.count += 1
+
+
+class MetricsMiddleware:
+    """Считает запросы по имени view для /metrics.
+
+    Стоит первым в MIDDLEWARE, чтобы время включало все остальные
+    middleware. Адреса, которые не нашлись в urls, идут под одним
+    именем, иначе любой сканер плодил бы новые серии.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        meter = QueryMeter()
+        started = time.perf_counter()
+        with connection.execute_wrapper(meter):
+            response = self.get_response(request)
+        duration = time.perf_counter() - started
+        match = request.resolver_match
+        size = None
+        if not response.streaming:
+            size = len(response.content)
+        metrics.record_request(
+            match.view_name if match else '<unresolved>',
+            request.method if request.method in METHODS else 'OTHER',
+            response.status_code, duration, meter.count, meter.time, size)
+        return response
+
+
+class QueryLogMiddleware:
+    """Журнал медленных запросов и N+1 (core.querylog).
+
+    Работает, только если включена настройка SLOW_QUERY_LOG.
+    """
+
+    def __init__(self, get_response):
+        if not settings.SLOW_QUERY_LOG:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        log = querylog.QueryLog(request)
+        try:
+            with connection.execute_wrapper(log):
+                return self.get_response(request)
+        finally:
+            log.finish()
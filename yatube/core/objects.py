@@ -0,0 +1,103 @@
+"""Read-through кэш объектов модели по естественному ключу.
+
+ObjectCache(Group, 'slug').get(slug) берет группу из кэша, а при
+промахе - из базы, и кладет в кэш на OBJECT_CACHE_TIMEOUT секунд.
+Отсутствие объекта тоже кэшируется, на OBJECT_CACHE_NEGATIVE_TIMEOUT:
+поток запросов к несуществующим адресам не доходит до базы.
+
+Кэш сбрасывается сигналами post_save и post_delete модели сразу и еще
+раз после коммита. Рядом с объектом хранится ключ, под которым он
+лежит, поэтому forget_pk() сбрасывает объект по первичному ключу - для
+изменений через queryset.update(), которые сигналов не шлют, и для
+переименований.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.http import Http404
+
+# Отметка в кэше: такого объекта нет.
+MISSING = 'missing'
+
+
+class ObjectCache:
+    def __init__(self, model, field, timeout=None):
+        self.model = model
+        self.field = field
+        self.timeout = timeout
+        self.prefix = f'object:{model._meta.label_lower}:{field}:'
+        post_save.connect(self.changed, sender=model, weak=False)
+        post_delete.connect(self.changed, sender=model, weak=False)
+
+    def _key(self, value):
+        digest = hashlib.md5(str(value).encode()).hexdigest()
+        return self.prefix + digest
+
+    def _pk_key(self, pk):
+        return f'{self.prefix}pk:{pk}'
+
+    def get(self, value):
+        """Объект с field == value или None."""
+        return self.get_many([value]).get(str(value))
+
+    def get_many(self, values):
+        """{str(значение): объект} одним запросом к кэшу и одним к базе."""
+        keys = {self._key(value): str(value) for value in values}
+        cached = cache.get_many(keys)
+        found = {
+            keys[key]: obj for key, obj in cached.items()
+            if isinstance(obj, self.model)
+        }
+        missing = [value for key, value in keys.items() if key not in cached]
+        if not missing:
+            return found
+        loaded = {
+            str(getattr(obj, self.field)): obj
+            for obj in self.model._default_manager.filter(
+                **{f'{self.field}__in': missing})
+        }
+        entries, absent = {}, {}
+        for value in missing:
+            obj = loaded.get(value)
+            if obj is None:
+                absent[self._key(value)] = MISSING
+                continue
+            entries[self._key(value)] = obj
+            entries[self._pk_key(obj.pk)] = self._key(value)
+            found[value] = obj
+        if entries:
+            cache.set_many(
+                entries, self.timeout or settings.OBJECT_CACHE_TIMEOUT)
+        if absent:
+            cache.set_many(absent, settings.OBJECT_CACHE_NEGATIVE_TIMEOUT)
+        return found
+
+    def get_or_404(self, value):
+        obj = self.get(value)
+        if obj is None:
+            raise Http404(f'No {self.model._meta.object_name} matches.')
+        return obj
+
+    def _delete(self, pk, value):
+        keys = [self._pk_key(pk)]
+        if value is not None:
+            keys.append(self._key(value))
+        old = cache.get(self._pk_key(pk))
+        if old is not None:
+            keys.append(old)
+        cache.delete_many(keys)
+
+    def forget_pk(self, pk, value=None):
+        """Сбрасывает объект pk (и ключ value) сейчас и после коммита.
+
+        Повтор не дает запросу, прочитавшему старую строку до коммита,
+        закэшировать ее снова.
+        """
+        self._delete(pk, value)
+        transaction.on_commit(lambda: self._delete(pk, value))
+
+    def changed(self, sender, instance, **kwargs):
+        self.forget_pk(instance.pk, getattr(instance, self.field))
@@ -0,0 +1,184 @@
+"""Журнал медленных SQL-запросов и повторов одного запроса (N+1).
+
+Включается настройкой SLOW_QUERY_LOG. Запрос дольше
+SLOW_QUERY_THRESHOLD_MS попадает в журнал вместе с параметрами, view,
+строкой Python и шаблона, откуда он пришел, и планом EXPLAIN. Если
+в одном HTTP-запросе запрос одной формы повторился
+N_PLUS_ONE_THRESHOLD раз, пишется отдельная запись n_plus_one.
+
+Записи - строки JSON в логгере yatube.queries; в настройках он пишет
+в файл с ротацией, а читает их команда slow_queries.
+"""
+import json
+import logging
+import os
+import re
+import sys
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+logger = logging.getLogger('yatube.queries')
+
+SLOW = 'slow'
+N_PLUS_ONE = 'n_plus_one'
+TYPES = (SLOW, N_PLUS_ONE)
+MAX_PARAM_LENGTH = 200
+# Списки IN (%s, %s, ...) разной длины - одна и та же форма запроса.
+PLACEHOLDERS = re.compile(r'IN \(%s(?:, %s)*\)')
+# Эти файлы пропускаются при поиске места вызова.
+OWN_FILES = frozenset((
+    __file__, os.path.join(os.path.dirname(__file__), 'middleware.py'),
+))
+
+
+def shape(sql):
+    return PLACEHOLDERS.sub('IN (%s, ...)', sql)
+
+
+def _param(value):
+    text = repr(value)
+    if len(text) > MAX_PARAM_LENGTH:
+        return text[:MAX_PARAM_LENGTH] + '...'
+    return text
+
+
+def _is_project(filename):
+    return (filename.startswith(settings.BASE_DIR)
+            and 'site-packages' not in filename
+            and filename not in OWN_FILES)
+
+
+def call_site():
+    """Ближайшая строка кода проекта и шаблона, откуда идет запрос."""
+    site = template = None
+    frame = sys._getframe(1)
+    while frame is not None and (site is None or template is None):
+        code = frame.f_code
+        if (template is None and code.co_name == 'render_annotated'
+                and 'self' in frame.f_locals):
+            node = frame.f_locals['self']
+            origin = getattr(node, 'origin', None)
+            token = getattr(node, 'token', None)
+            if origin is not None and token is not None:
+                name = origin.template_name or origin.name
+                template = f'{name}:{token.lineno}'
+        if site is None and _is_project(code.co_filename):
+            path = os.path.relpath(code.co_filename, settings.BASE_DIR)
+            site = f'{path}:{frame.f_lineno} in {code.co_name}'
+        frame = frame.f_back
+    return site, template
+
+
+class QueryLog:
+    """execute_wrapper одного HTTP-запроса."""
+
+    def __init__(self, request):
+        self.request = request
+        self.threshold = settings.SLOW_QUERY_THRESHOLD_MS / 1000
+        self.shapes = Counter()
+        self.sites = {}
+        self.times = Counter()
+        self.explaining = False
+
+    def __call__(self, execute, sql, params, many, context):
+        if self.explaining:
+            return execute(sql, params, many, context)
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            self.seen(sql, params, many, duration)
+
+    def view(self):
+        match = getattr(self.request, 'resolver_match', None)
+        return match.view_name if match else None
+
+    def seen(self, sql, params, many, duration):
+        key = shape(sql)
+        self.shapes[key] += 1
+        self.times[key] += duration
+        if self.shapes[key] == settings.N_PLUS_ONE_THRESHOLD:
+            self.sites[key] = call_site()
+        if duration >= self.threshold:
+            site, template = call_site()
+            self.write({
+                'type': SLOW,
+                'duration_ms': round(duration * 1000, 2),
+                'sql': sql,
+                'params': [] if many else [
+                    _param(value) for value in params or ()],
+                'site': site,
+                'template': template,
+                'plan': self.explain(sql, params, many),
+            })
+
+    def explain(self, sql, params, many):
+        if many or not sql.lstrip().upper().startswith('SELECT'):
+            return None
+        self.explaining = True
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'{connection.ops.explain_query_prefix()} {sql}', params)
+                return [
+                    ' '.join(str(column) for column in row)
+                    for row in cursor.fetchall()
+                ]
+        except Exception as error:
+            return [f'EXPLAIN не удался: {error}']
+        finally:
+            self.explaining = False
+
+    def finish(self):
+        """Пишет формы запросов, повторенные N_PLUS_ONE_THRESHOLD раз."""
+        for key, count in self.shapes.items():
+            if count < settings.N_PLUS_ONE_THRESHOLD:
+                continue
+            site, template = self.sites[key]
+            self.write({
+                'type': N_PLUS_ONE,
+                'count': count,
+                'duration_ms': round(self.times[key] * 1000, 2),
+                'sql': key,
+                'site': site,
+                'template': template,
+            })
+
+    def write(self, record):
+        logger.warning(json.dumps({
+            'time': timezone.now().isoformat(),
+            'view': self.view(),
+            'path': self.request.path,
+            **record,
+        }, ensure_ascii=False))
+
+
+def read(paths):
+    """Записи журнала из файлов paths, старые файлы первыми."""
+    for path in paths:
+        try:
+            file = open(path, encoding='utf-8')
+        except OSError:
+            continue
+        with file:
+            for line in file:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+
+def log_files():
+    """Файл журнала и его ротированные копии, от старых к новым."""
+    path = settings.SLOW_QUERY_LOG_FILE
+    rotated = []
+    number = 1
+    while os.path.exists(f'{path}.{number}'):
+        rotated.append(f'{path}.{number}')
+        number += 1
+    return [*reversed(rotated), path]
@@ -0,0 +1,31 @@
+import copy
+import os
+import tempfile
+
+from django.conf import settings
+from django.test import override_settings
+from django.test.runner import DiscoverRunner
+
+
+class TestRunner(DiscoverRunner):
+    """Тесты пишут общий кэш во временный файл, а не в файл сервера.
+
+    Иначе тесты подсовывали бы работающему серверу свои версии
+    и фрагменты, а cache.clear() в тестах очищал бы его кэш.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.cache_dir = tempfile.TemporaryDirectory()
+        caches = copy.deepcopy(settings.CACHES)
+        for alias, params in caches.items():
+            if 'LOCATION' in params:
+                params['LOCATION'] = os.path.join(
+                    self.cache_dir.name, f'{alias}.sqlite3')
+        self.cache_settings = override_settings(CACHES=caches)
+        self.cache_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.cache_settings.disable()
+        self.cache_dir.cleanup()
+        super().teardown_test_environment(**kwargs)
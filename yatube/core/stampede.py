@@ -0,0 +1,134 @@
+"""Пересчет дорогих значений кэша без лавины запросов.
+
+get_or_compute(key, compute, timeout) заменяет пару cache.get/cache.set
+для фрагментов шаблонов ({% cache %} из библиотеки fragments), страниц
+и других значений, которые долго считать.
+
+Значение живет в кэше на CACHE_STALE_TIMEOUT секунд дольше своего
+срока. Когда срок подходит, пересчитывает один вызов - тот, кто взял
+блокировку через cache.add; остальные в это время получают прежнее
+значение. Если прежнего нет (ключ новый, например после смены версии),
+остальные ждут результат до CACHE_REFILL_WAIT секунд, а потом считают
+сами. Горячие ключи пересчитываются заранее, до срока, с вероятностью,
+которая растет к сроку и со временем пересчета (XFetch): ключ
+обновляется раньше, чем истечет у всех сразу.
+"""
+import math
+import random
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import cache as default_cache
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+
+LOCK_PREFIX = 'refill:'
+# delta - сколько секунд шел пересчет, expires - срок по time.time().
+Entry = namedtuple('Entry', 'value delta expires')
+# Как часто ожидающий вызов проверяет, не появилось ли значение.
+WAIT_STEP = 0.05
+
+
+def _lock_key(key):
+    return LOCK_PREFIX + key
+
+
+def _due(delta, expires, now):
+    """Пора ли пересчитывать: после срока - всегда, до него - иногда."""
+    if expires is None:
+        return False
+    gap = -delta * settings.CACHE_EARLY_REFRESH_BETA * math.log(
+        1 - random.random())
+    return now + gap >= expires
+
+
+def _store(cache, key, compute, timeout):
+    started = time.monotonic()
+    value = compute()
+    if value is not None:
+        delta = time.monotonic() - started
+        if timeout is None:
+            expires = ttl = None
+        else:
+            expires = time.time() + timeout
+            ttl = timeout + settings.CACHE_STALE_TIMEOUT
+        cache.set(key, Entry(value, delta, expires), ttl)
+    return value
+
+
+def _refill(cache, key, compute, timeout):
+    """Пересчет под блокировкой, взятой вызывающим."""
+    try:
+        return _store(cache, key, compute, timeout)
+    finally:
+        cache.delete(_lock_key(key))
+
+
+def _get(cache, key):
+    entry = cache.get(key)
+    # Значения, записанные в кэш не через get_or_compute, - промах.
+    return entry if isinstance(entry, Entry) else None
+
+
+def _wait(cache, key):
+    """Ждет чужой пересчет, пока держится его блокировка.
+
+    Блокировка снята, а значения нет: compute вернул None или упал
+    (страница 404 или редирект), ждать больше нечего.
+    """
+    deadline = time.monotonic() + settings.CACHE_REFILL_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(WAIT_STEP)
+        entry = _get(cache, key)
+        if entry is not None:
+            return entry
+        if cache.get(_lock_key(key)) is None:
+            # Значение могли записать между двумя чтениями.
+            return _get(cache, key)
+    return None
+
+
+def update(key, change, cache=None):
+    """Меняет значение в кэше на change(значение), не трогая его срок.
+
+    Если значения нет, ничего не делает: его посчитает следующий
+    get_or_compute. Чтение и запись не атомарны, поэтому это годится
+    для значений, которые и так полностью пересчитываются по сроку.
+    """
+    if cache is None:
+        cache = default_cache
+    entry = _get(cache, key)
+    if entry is None:
+        return
+    ttl = None
+    if entry.expires is not None:
+        ttl = max(entry.expires - time.time(), 0) + (
+            settings.CACHE_STALE_TIMEOUT)
+    cache.set(key, entry._replace(value=change(entry.value)), ttl)
+
+
+def get_or_compute(key, compute, timeout=DEFAULT_TIMEOUT, cache=None):
+    """Значение из кэша или compute(); None от compute не кэшируется.
+
+    timeout - срок в секундах, None - бессрочно, 0 - не кэшировать.
+    """
+    if cache is None:
+        cache = default_cache
+    if timeout is DEFAULT_TIMEOUT:
+        timeout = cache.default_timeout
+    if timeout is not None and timeout <= 0:
+        return compute()
+    entry = _get(cache, key)
+    if entry is None:
+        if cache.add(_lock_key(key), 1, settings.CACHE_REFILL_LOCK_TIMEOUT):
+            return _refill(cache, key, compute, timeout)
+        entry = _wait(cache, key)
+        if entry is None:
+            # Чужой пересчет ничего не дал или затянулся: считаем сами,
+            # не трогая его блокировку.
+            return _store(cache, key, compute, timeout)
+        return entry.value
+    if _due(entry.delta, entry.expires, time.time()) and cache.add(
+            _lock_key(key), 1, settings.CACHE_REFILL_LOCK_TIMEOUT):
+        return _refill(cache, key, compute, timeout)
+    return entry.value
@@ -0,0 +1,39 @@
+from django import template
+from django.core.cache import caches
+from django.core.cache.utils import make_template_fragment_key
+from django.templatetags import cache
+
+from ..cards import render_cards
+from ..stampede import get_or_compute
+
+register = template.Library()
+
+
+class FragmentNode(cache.CacheNode):
+    def render(self, context):
+        timeout = self.expire_time_var.resolve(context)
+        if timeout is not None:
+            timeout = int(timeout)
+        name = 'default'
+        if self.cache_name:
+            name = self.cache_name.resolve(context)
+        key = make_template_fragment_key(
+            self.fragment_name, [var.resolve(context) for var in self.vary_on])
+        return get_or_compute(
+            key, lambda: self.nodelist.render(context), timeout,
+            cache=caches[name])
+
+
+@register.tag('cache')
+def do_cache(parser, token):
+    """{% cache %} из Django, но пересчет идет через core.stampede."""
+    node = cache.do_cache(parser, token)
+    return FragmentNode(node.nodelist, node.expire_time_var,
+                        node.fragment_name, node.vary_on, node.cache_name)
+
+
+@register.simple_tag(takes_context=True)
+def cards(context, items, template_name, name):
+    """{% cards page_obj 'posts/includes/post.html' 'post' as cards %}:
+    пары (объект, html) карточек из core.cards."""
+    return render_cards(context, items, template_name, name)
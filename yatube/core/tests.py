@@ -1,6 +1,27 @@
+import io
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
 from http import HTTPStatus
+from unittest import mock
 
-from django.test import TestCase
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import connection
+from django.template import Context, Engine, Template
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from posts import objects as posts_objects
+from posts.models import Group, Post, User
+
+from . import metrics, querylog, stampede
+from .cache import TieredCache
+from .cards import template_version
 
 
 class ViewTestClass(TestCase):
@@ -10,3 +31,446 @@ class ViewTestClass(TestCase):
         self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
         template = 'core/404.html'
         self.assertTemplateUsed(response, template)
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        settings_override = override_settings(
+            METRICS_DIR=self.directory, METRICS_ALLOWED_IPS=['127.0.0.1'])
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def value(self, metric, labels):
+        counters, _ = metrics.collect()
+        return counters.get((metric, labels), 0)
+
+    def test_request_metrics(self):
+        """Проверка: /metrics отдает запросы, гистограмму и кэш по view"""
+        labels = (
+            ('view', 'posts:index'), ('method', 'GET'), ('status', '200'),
+        )
+        before = self.value('requests_total', labels)
+        self.client.get(reverse('posts:index'))
+        self.client.get('/nonexist-page/')
+        response = self.client.get('/metrics')
+        self.assertEqual(response['Content-Type'],
+                         'text/plain; version=0.0.4; charset=utf-8')
+        text = response.content.decode()
+        self.assertIn('# TYPE yatube_request_duration_seconds histogram',
+                      text)
+        self.assertIn('yatube_request_duration_seconds_bucket{'
+                      'view="posts:index",le="+Inf"}', text)
+        self.assertIn('view="<unresolved>",method="GET",status="404"', text)
+        self.assertIn('yatube_db_queries_total{view="posts:index"}', text)
+        self.assertIn('yatube_cache_misses_total{alias="default",'
+                      'fragment="index_page"}', text)
+        self.assertEqual(self.value('requests_total', labels), before + 1)
+
+    @override_settings(METRICS_ALLOWED_IPS=[], METRICS_TOKEN='secret')
+    def test_metrics_access(self):
+        """Проверка: /metrics открыт только по адресу или токену"""
+        self.assertEqual(
+            self.client.get('/metrics').status_code, HTTPStatus.FORBIDDEN)
+        response = self.client.get(
+            '/metrics', HTTP_AUTHORIZATION='Bearer wrong')
+        self.assertEqual(response.status_code, HTTPStatus.FORBIDDEN)
+        response = self.client.get(
+            '/metrics', HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        with override_settings(METRICS_TOKEN=''):
+            response = self.client.get(
+                '/metrics', HTTP_AUTHORIZATION='Bearer ')
+            self.assertEqual(response.status_code, HTTPStatus.FORBIDDEN)
+
+    def test_requests_do_not_write_snapshots(self):
+        """Проверка: снимок пишет фоновый поток, а не запрос"""
+        threads, flush = [], metrics.REGISTRY.flush
+
+        def recorded_flush(*args, **kwargs):
+            threads.append(threading.current_thread())
+            return flush(*args, **kwargs)
+
+        with mock.patch.object(metrics.REGISTRY, 'flush', recorded_flush):
+            self.client.get(reverse('posts:index'))
+        self.assertNotIn(threading.current_thread(), threads)
+        self.assertTrue(metrics.REGISTRY.flusher.is_alive())
+
+    def test_processes_are_summed(self):
+        """Проверка: снимки других процессов складываются"""
+        labels = (('view', 'posts:index'),)
+        before = self.value('response_bytes_total', labels)
+        with open(os.path.join(self.directory, '1-1.json'), 'w') as file:
+            json.dump({
+                'counters': [['response_bytes_total', labels, 100]],
+                'histograms': [],
+            }, file)
+        self.assertEqual(
+            self.value('response_bytes_total', labels), before + 100)
+
+
+class TieredCacheTests(TestCase):
+    """Два экземпляра TieredCache на одном файле - как два воркера."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'cache.sqlite3')
+        self.first, self.second = self.tiered(), self.tiered()
+
+    def tiered(self, **options):
+        return TieredCache(self.path, {
+            'METRICS_ALIAS': 'tiered-test',
+            'OPTIONS': {'POLL_INTERVAL': 0, **options},
+        })
+
+    def tier(self, metric, tier):
+        return metrics.REGISTRY.counters[metric, (
+            ('alias', 'tiered-test'), ('tier', tier))]
+
+    def test_writes_reach_other_processes(self):
+        """Проверка: запись и удаление в одном процессе видны в другом"""
+        self.assertIsNone(self.second.get('post:1'))
+        self.first.set('post:1', 'первый')
+        self.assertEqual(self.second.get('post:1'), 'первый')
+        self.first.set('post:1', 'второй')
+        self.assertEqual(self.second.get('post:1'), 'второй')
+        self.assertEqual(self.second.get_many(['post:1', 'post:2']),
+                         {'post:1': 'второй'})
+        self.first.delete('post:1')
+        self.assertIsNone(self.second.get('post:1'))
+
+    def test_tier_metrics(self):
+        """Проверка: попадания и промахи считаются по слоям"""
+        self.first.set('post:1', 'пост')
+        local_hits = self.tier('cache_tier_hits_total', 'local')
+        shared_hits = self.tier('cache_tier_hits_total', 'shared')
+        shared_misses = self.tier('cache_tier_misses_total', 'shared')
+        self.second.get('post:1')
+        self.second.get('post:1')
+        self.second.get('post:2')
+        self.assertEqual(
+            self.tier('cache_tier_hits_total', 'local'), local_hits + 1)
+        self.assertEqual(
+            self.tier('cache_tier_hits_total', 'shared'), shared_hits + 1)
+        self.assertEqual(
+            self.tier('cache_tier_misses_total', 'shared'), shared_misses + 1)
+
+    def test_local_tier_is_bounded(self):
+        """Проверка: слой процесса хранит не больше LOCAL_MAX_ENTRIES"""
+        cache = self.tiered(LOCAL_MAX_ENTRIES=2)
+        cache.set_many({'a': 1, 'b': 2, 'c': 3})
+        self.assertEqual(cache.get_many(['a', 'b', 'c']),
+                         {'a': 1, 'b': 2, 'c': 3})
+        self.assertEqual(len(cache.local), 2)
+
+    def test_counters_and_clear_are_shared(self):
+        """Проверка: incr и add атомарны в общем слое, clear - для всех"""
+        self.first.set('version:index', 1, None)
+        self.assertEqual(self.first.get('version:index'), 1)
+        self.assertEqual(self.second.incr('version:index'), 2)
+        self.assertEqual(self.first.get('version:index'), 2)
+        self.assertFalse(self.first.add('version:index', 10))
+        with self.assertRaises(ValueError):
+            self.first.incr('version:missing')
+        self.second.clear()
+        self.assertIsNone(self.first.get('version:index'))
+
+    def test_trimmed_log_drops_local_tier(self):
+        """Проверка: если журнал обрезан раньше, чем прочитан, слой пуст"""
+        first = self.tiered(LOG_SIZE=1)
+        first.set('post:1', 'пост')
+        self.assertEqual(first.get('post:1'), 'пост')
+        first.poll_interval = 60
+        self.second.set_many({'post:2': 2, 'post:3': 3})
+        first.cull()
+        first.next_poll = 0
+        first.get('post:2')
+        self.assertNotIn(first.make_key('post:1'), first.local)
+
+    def test_file_is_private(self):
+        """Проверка: файл кэша создается с правами 0600, чужой файл
+        не открывается"""
+        self.first.set('post:1', 'пост')
+        self.assertEqual(os.stat(self.path).st_mode & 0o777, 0o600)
+        with mock.patch('os.getuid', return_value=os.getuid() + 1):
+            with self.assertRaises(ImproperlyConfigured):
+                TieredCache(self.path + '.other', {}).get('post:1')
+
+    def test_cull(self):
+        """Проверка: запись не чистит кэш сама, чистка удаляет истекшие
+        строки по индексу и лишние сверх MAX_ENTRIES"""
+        cache = self.tiered(MAX_ENTRIES=5, CULL_INTERVAL=3600)
+        with mock.patch.object(TieredCache, 'cull') as cull:
+            cache.set('expired', 1, 0)
+            cache.set_many({f'post:{number}': number for number in range(9)})
+        cull.assert_not_called()
+        connection = cache.connection()
+        plan = connection.execute(
+            'EXPLAIN QUERY PLAN SELECT rowid FROM cache WHERE expires <= ?',
+            (time.time(),)).fetchall()
+        self.assertIn('cache_expires', str(plan))
+        cache.cull()
+        keys = [key for key, in connection.execute('SELECT key FROM cache')]
+        self.assertEqual(
+            keys, [cache.make_key(f'post:{number}') for number in range(4, 9)])
+
+    def test_old_schema_is_recreated(self):
+        """Проверка: файл со старой схемой пересоздается"""
+        with sqlite3.connect(self.path) as connection:
+            connection.execute('CREATE TABLE cache (key TEXT PRIMARY KEY, '
+                               'value BLOB NOT NULL, expires REAL)')
+            connection.execute("INSERT INTO cache VALUES ('a', 'b', NULL)")
+        cache = self.tiered()
+        cache.set('post:1', 'пост')
+        columns = [row[1] for row in cache.connection().execute(
+            'PRAGMA table_info(cache)')]
+        self.assertEqual(columns, ['key', 'expires', 'value'])
+        self.assertEqual(self.second.get('post:1'), 'пост')
+
+
+class StampedeTests(TestCase):
+    key = 'stampede:test'
+
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+
+    def compute(self):
+        self.calls += 1
+        return f'значение {self.calls}'
+
+    def get(self, timeout=60):
+        return stampede.get_or_compute(self.key, self.compute, timeout)
+
+    def expire(self):
+        entry = cache.get(self.key)
+        cache.set(self.key, entry._replace(expires=time.time() - 1))
+
+    def test_stale_value_while_other_refills(self):
+        """Проверка: пока другой пересчитывает, отдается прежнее значение"""
+        self.assertEqual(self.get(), 'значение 1')
+        self.expire()
+        cache.add(stampede._lock_key(self.key), 1)
+        self.assertEqual(self.get(), 'значение 1')
+        self.assertEqual(self.calls, 1)
+        cache.delete(stampede._lock_key(self.key))
+        self.assertEqual(self.get(), 'значение 2')
+        self.assertIsNone(cache.get(stampede._lock_key(self.key)))
+
+    def test_early_refresh(self):
+        """Проверка: горячий ключ пересчитывается до срока"""
+        self.get()
+        with override_settings(CACHE_EARLY_REFRESH_BETA=0):
+            self.assertEqual(self.get(), 'значение 1')
+        with override_settings(CACHE_EARLY_REFRESH_BETA=10 ** 9):
+            self.assertEqual(self.get(), 'значение 2')
+
+    @override_settings(CACHE_REFILL_WAIT=2)
+    def test_new_key_waits_for_refill(self):
+        """Проверка: без прежнего значения ждут чужой пересчет"""
+        cache.add(stampede._lock_key(self.key), 1)
+        timer = threading.Timer(0.1, lambda: cache.set(
+            self.key, stampede.Entry('чужое значение', 0.1, time.time() + 60)))
+        timer.start()
+        self.addCleanup(timer.join)
+        self.assertEqual(self.get(), 'чужое значение')
+        self.assertEqual(self.calls, 0)
+
+    @override_settings(CACHE_REFILL_WAIT=0.1)
+    def test_slow_refill_is_not_waited_forever(self):
+        """Проверка: чужой пересчет затянулся - значение считается само"""
+        cache.add(stampede._lock_key(self.key), 1)
+        self.assertEqual(self.get(), 'значение 1')
+        self.assertEqual(cache.get(stampede._lock_key(self.key)), 1)
+
+    @override_settings(CACHE_REFILL_WAIT=5)
+    def test_refill_without_value_is_not_waited(self):
+        """Проверка: пересчет без значения (None, исключение) не
+        заставляет ждать весь CACHE_REFILL_WAIT"""
+        cache.add(stampede._lock_key(self.key), 1)
+        timer = threading.Timer(
+            0.1, lambda: cache.delete(stampede._lock_key(self.key)))
+        timer.start()
+        self.addCleanup(timer.join)
+        started = time.monotonic()
+        self.assertEqual(self.get(), 'значение 1')
+        self.assertLess(time.monotonic() - started, 2)
+
+    def test_foreign_value_is_a_miss(self):
+        """Проверка: значение старого формата пересчитывается"""
+        cache.set(self.key, 3)
+        self.assertEqual(self.get(), 'значение 1')
+
+    def test_none_and_zero_timeout_are_not_cached(self):
+        """Проверка: None и timeout=0 не попадают в кэш"""
+        stampede.get_or_compute(self.key, lambda: None)
+        self.assertIsNone(cache.get(self.key))
+        self.get(timeout=0)
+        self.assertIsNone(cache.get(self.key))
+
+    def test_fragment_tag(self):
+        """Проверка: {% cache %} из fragments рендерит фрагмент один раз"""
+        template = Template(
+            '{% load fragments %}{% cache 60 test_fragment %}'
+            '{{ compute }}{% endcache %}')
+        context = Context({'compute': self.compute})
+        self.assertEqual(template.render(context), 'значение 1')
+        self.assertEqual(template.render(context), 'значение 1')
+
+
+class CardTests(TestCase):
+    def test_template_version_covers_includes(self):
+        """Проверка: правка шаблона из include меняет версию карточки"""
+        templates = {
+            'card.html': "{% include 'picture.html' %}{% include name %}",
+            'picture.html': 'картинка',
+        }
+        engine = Engine(debug=True, loaders=[
+            ('django.template.loaders.locmem.Loader', templates)])
+        version = template_version(engine, 'card.html')
+        self.assertEqual(template_version(engine, 'card.html'), version)
+        templates['picture.html'] = 'новая картинка'
+        self.assertNotEqual(template_version(engine, 'card.html'), version)
+
+
+class ObjectCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+
+    def setUp(self):
+        cache.clear()
+        self.groups = posts_objects.groups
+
+    def test_read_through(self):
+        """Проверка: объект читается из базы один раз"""
+        with self.assertNumQueries(1):
+            self.assertEqual(self.groups.get('group'), self.group)
+            self.assertEqual(self.groups.get('group'), self.group)
+
+    def test_batch(self):
+        """Проверка: несколько промахов - один запрос к базе"""
+        Group.objects.create(title='Вторая', slug='second')
+        with self.assertNumQueries(1):
+            found = self.groups.get_many(['group', 'second', 'absent'])
+        self.assertEqual(set(found), {'group', 'second'})
+        with self.assertNumQueries(0):
+            self.groups.get_many(['group', 'second', 'absent'])
+
+    def test_negative_lookup(self):
+        """Проверка: отсутствие кэшируется, а новый объект виден сразу"""
+        url = reverse('posts:group_list', args=['new'])
+        self.assertEqual(self.client.get(url).status_code,
+                         HTTPStatus.NOT_FOUND)
+        with self.assertNumQueries(0):
+            self.assertIsNone(self.groups.get('new'))
+        Group.objects.create(title='Новая', slug='new')
+        self.assertEqual(self.client.get(url).status_code, HTTPStatus.OK)
+
+    def test_invalidation(self):
+        """Проверка: изменение, переименование и счетчик сбрасывают кэш"""
+        group = self.groups.get('group')
+        group.title = 'Новое название'
+        group.save()
+        self.assertEqual(self.groups.get('group').title, 'Новое название')
+        Post.objects.create(author=self.author, group=group, text='1')
+        self.assertEqual(self.groups.get('group').posts_count, 1)
+        group.slug = 'renamed'
+        group.save()
+        self.assertIsNone(self.groups.get('group'))
+        self.assertEqual(self.groups.get('renamed'), group)
+        group.delete()
+        self.assertIsNone(self.groups.get('renamed'))
+
+    def test_profile_uses_cache(self):
+        """Проверка: профиль берет автора из кэша"""
+        url = reverse('posts:profile', args=['author'])
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(url)
+        self.assertFalse([
+            query for query in context.captured_queries
+            if 'username' in query['sql']
+        ])
+
+
+@override_settings(SLOW_QUERY_LOG=True, SLOW_QUERY_THRESHOLD_MS=0,
+                   N_PLUS_ONE_THRESHOLD=3)
+class QueryLogTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(username='author')
+        Post.objects.create(author=author, text='Тестовый пост')
+
+    def records(self, logs):
+        return [json.loads(record.getMessage()) for record in logs.records]
+
+    def test_slow_query_has_view_site_and_plan(self):
+        """Проверка: медленный запрос пишется с view, местом и планом"""
+        cache.clear()
+        with self.assertLogs('yatube.queries', 'WARNING') as logs:
+            self.client.get(reverse('posts:index'))
+        records = [
+            record for record in self.records(logs)
+            if record['type'] == querylog.SLOW
+            and 'posts_post' in record['sql']
+        ]
+        self.assertTrue(records)
+        for record in records:
+            self.assertEqual(record['view'], 'posts:index')
+            self.assertTrue(record['site'].startswith('posts/'))
+            self.assertTrue(record['plan'])
+
+    def test_template_line(self):
+        """Проверка: для запроса из шаблона пишется строка шаблона"""
+        log = querylog.QueryLog(RequestFactory().get('/'))
+        template = Template('{% for post in posts %}\n{{ post }}{% endfor %}')
+        with connection.execute_wrapper(log):
+            with self.assertLogs('yatube.queries', 'WARNING') as logs:
+                template.render(Context({'posts': Post.objects.all()}))
+        record = self.records(logs)[0]
+        self.assertTrue(record['template'].endswith(':1'))
+        self.assertTrue(record['site'].startswith('core/tests.py:'))
+
+    def test_n_plus_one(self):
+        """Проверка: повторы запроса одной формы - запись n_plus_one"""
+        log = querylog.QueryLog(RequestFactory().get('/'))
+        with connection.execute_wrapper(log):
+            for pk in range(4):
+                Group.objects.filter(pk__in=range(pk + 1)).exists()
+        with self.assertLogs('yatube.queries', 'WARNING') as logs:
+            log.finish()
+        record = self.records(logs)[-1]
+        self.assertEqual(record['type'], querylog.N_PLUS_ONE)
+        self.assertEqual(record['count'], 4)
+        self.assertIn('IN (%s, ...)', record['sql'])
+        self.assertTrue(record['site'].startswith('core/tests.py:'))
+
+    def test_command(self):
+        """Проверка: slow_queries фильтрует и группирует записи"""
+        records = [
+            {'type': 'slow', 'time': '2021', 'view': 'posts:index',
+             'path': '/', 'duration_ms': 150, 'sql': 'SELECT 1',
+             'params': [], 'plan': ['SCAN posts_post']},
+            {'type': 'slow', 'time': '2021', 'view': 'posts:profile',
+             'path': '/profile/a/', 'duration_ms': 120, 'sql': 'SELECT 2',
+             'params': ["'a'"], 'plan': None},
+        ]
+        with tempfile.NamedTemporaryFile('w', suffix='.log') as file:
+            file.write('\n'.join(json.dumps(record) for record in records))
+            file.flush()
+            out = io.StringIO()
+            call_command('slow_queries', file.name, view='posts:index',
+                         stdout=out)
+            self.assertIn('plan: SCAN posts_post', out.getvalue())
+            self.assertNotIn('SELECT 2', out.getvalue())
+            out = io.StringIO()
+            call_command('slow_queries', file.name, top=True, stdout=out)
+            self.assertLess(out.getvalue().index('SELECT 1'),
+                            out.getvalue().index('SELECT 2'))
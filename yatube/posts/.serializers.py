@@ -1,9 +0,0 @@
-from rest_framework import serializers
-
-from .models import Post
-
-
-class PostSerializer(serializers.ModelSerializer):
-    class Meta:
-        fields = ('id', 'text', 'author', 'image', 'pub_date')
-        model = Post
@@ -0,0 +1,239 @@
+"""Замеры основных страниц в процессе, тестовым клиентом Django.
+
+Каждая страница запрашивается несколько раз от имени пользователя
+(полностраничный кэш для гостей не мешает замеру), для нее считаются
+перцентили времени ответа, число и время SQL-запросов, время рендера
+шаблонов и пик выделенной памяти. Записывающие запросы выполняются
+в транзакции, которая откатывается, так что база не меняется.
+
+Результаты сравниваются с сохраненным базовым прогоном: число
+запросов не должно расти, а p95 и память - выходить за допуск.
+"""
+import gc
+import json
+import math
+import statistics
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+from django.db import connection, transaction
+from django.db.models import Count
+from django.template.backends.django import Template
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from .models import Follow, Group, Post, User
+
+METRICS = (
+    'p50_ms', 'p95_ms', 'p99_ms', 'queries', 'sql_ms', 'template_ms',
+    'peak_kb',
+)
+# Метрики, которые сравниваются с базовым прогоном: число запросов -
+# точно, остальные - с допуском tolerance.
+EXACT = ('queries',)
+TOLERANT = ('p95_ms', 'peak_kb')
+# Запас сверх допуска: на быстрых страницах шум в пару миллисекунд
+# больше любой доли.
+SLACK = {'p95_ms': 2, 'peak_kb': 16}
+# Запросов на замер памяти: tracemalloc сильно замедляет код, поэтому
+# память меряется отдельно от времени.
+MEMORY_RUNS = 3
+
+
+class BenchmarkError(Exception):
+    pass
+
+
+def percentile(values, percent):
+    """Перцентиль по ближайшему рангу."""
+    ordered = sorted(values)
+    rank = max(1, math.ceil(percent / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+class Meter:
+    """Считает SQL-запросы и время рендера шаблонов внутри measure()."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.queries = 0
+        self.sql = 0.0
+        self.template = 0.0
+
+    def _execute(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql += time.perf_counter() - started
+            self.queries += 1
+
+    @contextmanager
+    def measure(self):
+        meter, render = self, Template.render
+
+        # Template.render бэкенда вызывается только для шаблона всей
+        # страницы; include и extends внутри него сюда не попадают.
+        def timed_render(template, *args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return render(template, *args, **kwargs)
+            finally:
+                meter.template += time.perf_counter() - started
+
+        Template.render = timed_render
+        try:
+            with connection.execute_wrapper(self._execute):
+                yield self
+        finally:
+            Template.render = render
+
+
+def targets():
+    """Самые нагруженные объекты базы: на них страницы тяжелее всего."""
+    user = User.objects.annotate(
+        total=Count('follower')).order_by('-total').first()
+    post = Post.objects.order_by('-comments_count', '-pk').first()
+    group = Group.objects.order_by('-posts_count', '-pk').first()
+    author = Follow.objects.values('author').annotate(
+        total=Count('pk')
+    ).order_by('-total').values_list('author__username', flat=True).first()
+    if user is None or post is None:
+        raise BenchmarkError(
+            'В базе нет данных: сначала заполните ее командой seed.')
+    return {
+        'user': user,
+        'post': post,
+        'group': group,
+        'author': author or post.author.username,
+    }
+
+
+def scenarios(objects):
+    """Страницы замера: имя -> (метод, URL, данные формы)."""
+    post_id = objects['post'].pk
+    pages = {
+        'index': ('get', reverse('posts:index'), None),
+        'profile': ('get', reverse(
+            'posts:profile', args=[objects['author']]), None),
+        'post_detail': ('get', reverse(
+            'posts:post_detail', args=[post_id]), None),
+        'follow_index': ('get', reverse('posts:follow_index'), None),
+        'add_comment': ('post', reverse(
+            'posts:add_comment', args=[post_id]),
+            {'text': 'Комментарий для замера'}),
+        'post_create': ('post', reverse('posts:post_create'),
+                        {'text': 'Пост для замера'}),
+    }
+    if objects['group'] is not None:
+        pages['group_posts'] = ('get', reverse(
+            'posts:group_list', args=[objects['group'].slug]), None)
+    return pages
+
+
+def _request(client, method, url, data):
+    """Запрос, изменения которого откатываются."""
+    with transaction.atomic():
+        response = getattr(client, method)(url, data)
+        transaction.set_rollback(True)
+    if response.status_code >= 400:
+        raise BenchmarkError(f'{url}: ответ {response.status_code}')
+    return response
+
+
+def measure(client, method, url, data, iterations, warmup):
+    meter = Meter()
+    for _ in range(warmup):
+        _request(client, method, url, data)
+    latencies, queries, sql, template = [], [], [], []
+    gc.collect()
+    for _ in range(iterations):
+        meter.reset()
+        with meter.measure():
+            started = time.perf_counter()
+            _request(client, method, url, data)
+            latencies.append(time.perf_counter() - started)
+        queries.append(meter.queries)
+        sql.append(meter.sql)
+        template.append(meter.template)
+    peaks = []
+    for _ in range(MEMORY_RUNS):
+        tracemalloc.start()
+        try:
+            _request(client, method, url, data)
+            peaks.append(tracemalloc.get_traced_memory()[1])
+        finally:
+            tracemalloc.stop()
+    return {
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+        'queries': max(queries),
+        # Время execute(); строки SQLite отдает уже при чтении курсора,
+        # так что для больших выборок это оценка снизу.
+        'sql_ms': round(statistics.median(sql) * 1000, 2),
+        'template_ms': round(statistics.median(template) * 1000, 2),
+        'peak_kb': round(statistics.median(peaks) / 1024, 1),
+    }
+
+
+def run(names=None, iterations=50, warmup=5, progress=None):
+    """Замеры страниц names (по умолчанию всех) в виде словаря."""
+    objects = targets()
+    pages = scenarios(objects)
+    unknown = set(names or ()) - set(pages)
+    if unknown:
+        raise BenchmarkError(f'Нет таких страниц: {", ".join(unknown)}')
+    client = Client()
+    client.force_login(objects['user'])
+    results = {}
+    # DEBUG выключен, иначе Django копит все запросы в connection.queries.
+    with override_settings(DEBUG=False, ALLOWED_HOSTS=['testserver']):
+        for name, (method, url, data) in pages.items():
+            if names and name not in names:
+                continue
+            results[name] = measure(
+                client, method, url, data, iterations, warmup)
+            if progress is not None:
+                progress(name, results[name])
+    client.logout()
+    return {
+        'iterations': iterations,
+        'posts': Post.objects.count(),
+        'views': results,
+    }
+
+
+def compare(results, baseline, tolerance=0.2):
+    """Сообщения о регрессиях прогона results относительно baseline."""
+    regressions = []
+    for name, metrics in results['views'].items():
+        base = baseline['views'].get(name)
+        if base is None:
+            continue
+        for metric in EXACT:
+            if metrics[metric] > base[metric]:
+                regressions.append(
+                    f'{name}: {metric} {metrics[metric]} > {base[metric]}')
+        for metric in TOLERANT:
+            limit = base[metric] * (1 + tolerance) + SLACK[metric]
+            if metrics[metric] > limit:
+                regressions.append(
+                    f'{name}: {metric} {metrics[metric]} > '
+                    f'{base[metric]} + {tolerance:.0%}')
+    return regressions
+
+
+def load(path):
+    with open(path, encoding='utf-8') as file:
+        return json.load(file)
+
+
+def save(results, path):
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(results, file, ensure_ascii=False, indent=2,
+                  sort_keys=True)
+        file.write('\n')
@@ -0,0 +1,194 @@
+import hashlib
+import time
+from datetime import datetime, timezone
+from functools import wraps
+
+from core.stampede import get_or_compute
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.utils.cache import patch_cache_control
+from django.utils.http import urlencode
+from django.views.decorators.http import condition
+
+INDEX = 'index'
+# Имена авторов и названия групп на страницах профиля и поста.
+NAMES = 'names'
+# Параметры запроса, которые читают ленты (my_paginator).
+FEED_PARAMS = ('page', 'cursor')
+
+
+def group_scope(group_id):
+    if group_id is None:
+        return None
+    return f'group:{group_id}'
+
+
+def author_scope(author_id):
+    return f'author:{author_id}'
+
+
+def _key(scope):
+    return f'version:{scope}'
+
+
+def _new_version():
+    # Номер от времени, а не 1: если ключ версии вытеснят из кэша,
+    # старые фрагменты под прежним номером не оживут.
+    return int(time.time() * 1000)
+
+
+def get_version(*scopes):
+    """Версия набора областей, например '1639045.1639102'."""
+    keys = [_key(scope) for scope in scopes]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, _new_version(), None)
+            versions[key] = cache.get(key)
+    return '.'.join(str(versions[key]) for key in keys)
+
+
+def _bump(scopes):
+    for scope in scopes:
+        now = _new_version()
+        try:
+            version = cache.incr(_key(scope))
+        except ValueError:
+            version = None
+        # Версия догоняет текущее время: тогда она же - момент последнего
+        # изменения области (Last-Modified в conditional_page).
+        if version is None or version < now:
+            cache.set(_key(scope), now, None)
+
+
+def bump(*scopes):
+    """Сбрасывает фрагменты областей сейчас и еще раз после коммита.
+
+    Повтор после коммита не дает читателю, успевшему до коммита,
+    закэшировать старые данные под новой версией.
+    """
+    scopes = [scope for scope in scopes if scope is not None]
+    _bump(scopes)
+    transaction.on_commit(lambda: _bump(scopes))
+
+
+def fragment_context(*scopes):
+    """Контекст для {% cache %}: таймаут и версия областей страницы."""
+    return {
+        'cache_timeout': settings.FRAGMENT_CACHE_TIMEOUT,
+        'cache_version': get_version(*scopes),
+    }
+
+
+def _resolve(scopes, request, args, kwargs):
+    """Области запроса: функции вызываются, None отбрасываются."""
+    resolved = (
+        scope(request, *args, **kwargs) if callable(scope) else scope
+        for scope in scopes
+    )
+    return [scope for scope in resolved if scope is not None]
+
+
+def _page_key(request, scopes, params):
+    query = urlencode(sorted(
+        (name, value) for name in params
+        for value in request.GET.getlist(name)
+    ))
+    return f'page:{get_version(*scopes)}:{request.path}?{query}'
+
+
+def cache_anonymous(*scopes, params=FEED_PARAMS):
+    """Кэширует страницу целиком для гостей, ключ - путь и версия областей.
+
+    Область может быть функцией (request, *args, **kwargs), например
+    область группы по slug из адреса; None - без области. В ключ
+    попадают только параметры запроса из params, которые читает view:
+    прочие параметры не плодят копий страницы в кэше.
+
+    Запросы с cookie сессии рендерятся как обычно: личные части
+    страницы (меню, форма комментария, кнопки) у них свои, а общие
+    куски берутся из кэша фрагментов.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if (request.method != 'GET'
+                    or settings.SESSION_COOKIE_NAME in request.COOKIES):
+                return view(request, *args, **kwargs)
+            key = _page_key(
+                request, _resolve(scopes, request, args, kwargs), params)
+            rendered = None
+
+            def render():
+                nonlocal rendered
+                rendered = view(request, *args, **kwargs)
+                if rendered.status_code != 200 or rendered.streaming:
+                    return None
+                return rendered.content, rendered['Content-Type']
+
+            cached = get_or_compute(key, render, settings.PAGE_CACHE_TIMEOUT)
+            if rendered is not None:
+                return rendered
+            content, content_type = cached
+            return HttpResponse(content, content_type=content_type)
+        return wrapper
+    return decorator
+
+
+def conditional_page(*scopes, latest=None):
+    """Conditional GET: ETag и Last-Modified считаются до вызова view.
+
+    Валидаторы - версии областей и дата самой свежей записи страницы
+    latest(request, *args, **kwargs), плюс пользователь и адрес запроса.
+    Области - как в cache_anonymous, в том числе функции от запроса.
+    У вошедшего пользователя в ETag входит и токен CSRF: после нового
+    входа токен другой, и страница с формой из кэша браузера не годится.
+    На совпавший If-None-Match или If-Modified-Since view не вызывается
+    и шаблон не рендерится: ответ 304 без тела.
+    """
+    def validators(request, *args, **kwargs):
+        cached = getattr(request, '_page_validators', None)
+        if cached is not None:
+            return cached
+        version = get_version(*_resolve(scopes, request, args, kwargs))
+        modified = max(
+            (int(part) for part in version.split('.') if part), default=0
+        ) / 1000
+        newest = latest(request, *args, **kwargs) if latest else None
+        if newest is not None:
+            modified = max(modified, newest.timestamp())
+        csrf = ''
+        if request.user.is_authenticated:
+            # get_token заводит токен, если cookie еще нет: тогда ETag
+            # первого ответа совпадет со следующим запросом.
+            get_token(request)
+            csrf = request.META['CSRF_COOKIE']
+        raw = ':'.join((
+            version, str(newest), str(request.user.pk), csrf,
+            request.get_full_path(),
+        ))
+        request._page_validators = (
+            '"{}"'.format(hashlib.md5(raw.encode()).hexdigest()),
+            datetime.fromtimestamp(modified, timezone.utc),
+        )
+        return request._page_validators
+
+    def decorator(view):
+        checked = condition(
+            etag_func=lambda *args, **kwargs: validators(*args, **kwargs)[0],
+            last_modified_func=(
+                lambda *args, **kwargs: validators(*args, **kwargs)[1]
+            ),
+        )(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = checked(request, *args, **kwargs)
+            # Без no-cache браузер мог бы показывать копию без проверки.
+            patch_cache_control(response, private=True, no_cache=True)
+            return response
+        return wrapper
+    return decorator
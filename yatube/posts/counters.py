@@ -0,0 +1,99 @@
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Comment, Follow, Group, Post, User, UserStats
+from .objects import groups as group_cache
+
+
+def _count(model, field, outer='pk'):
+    """Подзапрос COUNT(*) строк model, ссылающихся на внешнюю строку."""
+    rows = model.objects.filter(
+        **{field: OuterRef(outer)}
+    ).order_by().values(field).annotate(total=Count('pk')).values('total')
+    return Coalesce(Subquery(rows), 0)
+
+
+def _user_counts():
+    return {
+        'posts_count': _count(Post, 'author', 'user'),
+        'followers_count': _count(Follow, 'author', 'user'),
+        'following_count': _count(Follow, 'user', 'user'),
+    }
+
+
+def recount_users(user_ids=None, create=True):
+    if create:
+        users = User.objects.filter(stats__isnull=True)
+        if user_ids is not None:
+            users = users.filter(pk__in=user_ids)
+        UserStats.objects.bulk_create(
+            (UserStats(user_id=pk)
+             for pk in users.values_list('pk', flat=True)),
+            ignore_conflicts=True,
+        )
+    stats = UserStats.objects.all()
+    if user_ids is not None:
+        stats = stats.filter(user_id__in=user_ids)
+    return stats.update(**_user_counts())
+
+
+def recount_groups(group_ids=None):
+    groups = Group.objects.all()
+    if group_ids is not None:
+        groups = groups.filter(pk__in=group_ids)
+    try:
+        return groups.update(posts_count=_count(Post, 'group'))
+    finally:
+        _forget_groups(groups.values_list('pk', flat=True))
+
+
+def _forget_groups(group_ids):
+    # update() не шлет сигналов: счетчик в кэше групп сбрасывается здесь.
+    for pk in group_ids:
+        group_cache.forget_pk(pk)
+
+
+def recount_posts(post_ids=None):
+    posts = Post.objects.all()
+    if post_ids is not None:
+        posts = posts.filter(pk__in=post_ids)
+    return posts.update(comments_count=_count(Comment, 'post'))
+
+
+def get_stats(user):
+    """Счетчики пользователя; отсутствующая строка считается заново."""
+    try:
+        return UserStats.objects.get(user_id=user.pk)
+    except UserStats.DoesNotExist:
+        recount_users([user.pk])
+        return UserStats.objects.get(user_id=user.pk)
+
+
+def _bump(queryset, **deltas):
+    """Атомарно сдвигает счетчики; не уводит их ниже нуля."""
+    for name, delta in deltas.items():
+        if delta < 0:
+            queryset = queryset.filter(**{f'{name}__gte': -delta})
+    return queryset.update(
+        **{name: F(name) + delta for name, delta in deltas.items()}
+    )
+
+
+def bump_user(user_id, **deltas):
+    # Строки нет - ее посчитает get_stats при первом чтении.
+    if not _bump(UserStats.objects.filter(user_id=user_id), **deltas):
+        recount_users([user_id], create=False)
+
+
+def bump_group(group_id, delta):
+    if group_id is None:
+        return
+    if not _bump(Group.objects.filter(pk=group_id), posts_count=delta):
+        recount_groups([group_id])
+        return
+    _forget_groups([group_id])
+
+
+def bump_post(post_id, delta):
+    if not _bump(Post.objects.filter(pk=post_id), comments_count=delta):
+        recount_posts([post_id])
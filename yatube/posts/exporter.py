@@ -0,0 +1,146 @@
+"""Потоковая выгрузка постов и комментариев в NDJSON или CSV.
+
+Строки читаются порциями по ключу (дата, id) от старых к новым, так что
+в памяти всегда одна порция, а запросы идут по индексам. Поля строк те
+же, что понимает импорт (posts.importer), поэтому выгрузку можно
+загрузить обратно командой import_content.
+"""
+import csv
+import json
+import zlib
+from datetime import datetime, time
+
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .importer import COMMENT, POST
+from .models import Comment, Post
+
+CHUNK_SIZE = 2000
+FORMATS = ('ndjson', 'csv')
+CONTENT_TYPES = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+EXPORTS = {
+    # тип: (модель, поле даты, колонки values_list -> поля строки)
+    POST: (Post, 'pub_date', (
+        ('id', 'id'),
+        ('author__username', 'author'),
+        ('group__slug', 'group'),
+        ('text', 'text'),
+        ('pub_date', 'pub_date'),
+    )),
+    COMMENT: (Comment, 'created', (
+        ('id', 'id'),
+        ('post_id', 'post'),
+        ('author__username', 'author'),
+        ('text', 'text'),
+        ('created', 'created'),
+    )),
+}
+
+
+def parse_moment(value):
+    """Дата или дата со временем из ISO 8601; ValueError, если не они."""
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f'неверная дата: {value}')
+        moment = datetime.combine(day, time.min)
+    if timezone.is_naive(moment):
+        return timezone.make_aware(moment)
+    return moment
+
+
+def filtered(kind, author=None, group=None, since=None, until=None):
+    """Queryset выгрузки: автор по username, группа по slug, даты [since,
+    until). Для комментариев группа - это группа их поста."""
+    model, date_field, _ = EXPORTS[kind]
+    lookups = {}
+    if author:
+        lookups['author__username'] = author
+    if group:
+        group_field = 'group__slug' if kind == POST else 'post__group__slug'
+        lookups[group_field] = group
+    if since:
+        lookups[f'{date_field}__gte'] = since
+    if until:
+        lookups[f'{date_field}__lt'] = until
+    return model.objects.filter(**lookups)
+
+
+def iter_rows(kind, rows, chunk_size=CHUNK_SIZE):
+    """Словари строк выгрузки, порциями по chunk_size от старых к новым."""
+    _, date_field, columns = EXPORTS[kind]
+    values = [column for column, _ in columns]
+    names = [name for _, name in columns]
+    rows = rows.order_by(date_field, 'pk').values_list(*values)
+    date_index = names.index(date_field)
+    last = None
+    while True:
+        chunk = rows
+        if last is not None:
+            chunk = rows.filter(
+                Q(**{f'{date_field}__gt': last[date_index]})
+                | Q(**{date_field: last[date_index], 'pk__gt': last[0]})
+            )
+        chunk = list(chunk[:chunk_size])
+        for row in chunk:
+            row = dict(zip(names, row))
+            row[date_field] = row[date_field].isoformat()
+            yield row
+        if len(chunk) < chunk_size:
+            return
+        last = chunk[-1]
+
+
+class _Echo:
+    """Файл для csv.writer, который просто возвращает записанное."""
+
+    def write(self, value):
+        return value
+
+
+def encode(kind, rows, fmt):
+    """Строки выгрузки в виде текстовых кусков NDJSON или CSV."""
+    if fmt == 'csv':
+        writer = csv.writer(_Echo())
+        names = [name for _, name in EXPORTS[kind][2]]
+        yield writer.writerow(names)
+        for row in rows:
+            yield writer.writerow([
+                '' if row[name] is None else row[name] for name in names
+            ])
+        return
+    for row in rows:
+        row['type'] = kind
+        yield json.dumps(row, ensure_ascii=False) + '\n'
+
+
+def to_bytes(pieces, compress=False, buffer_size=64 * 1024):
+    """Склеивает куски в блоки около buffer_size байт, по желанию
+    сжимая их gzip прямо на лету."""
+    compressor = zlib.compressobj(wbits=31) if compress else None
+    buffer, size = [], 0
+    for piece in pieces:
+        data = piece.encode()
+        buffer.append(data)
+        size += len(data)
+        if size >= buffer_size:
+            block = b''.join(buffer)
+            buffer, size = [], 0
+            if compressor is not None:
+                block = compressor.compress(block)
+            if block:
+                yield block
+    block = b''.join(buffer)
+    if compressor is not None:
+        block = compressor.compress(block) + compressor.flush()
+    if block:
+        yield block
+
+
+def export(kind, fmt='ndjson', compress=False, **filters):
+    """Итератор байтов выгрузки kind в формате fmt."""
+    rows = iter_rows(kind, filtered(kind, **filters))
+    return to_bytes(encode(kind, rows, fmt), compress=compress)
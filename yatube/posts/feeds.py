@@ -0,0 +1,28 @@
+from .models import Post
+
+# Колонки, которые выводит карточка поста (posts/includes/post.html).
+CARD_FIELDS = (
+    'id',
+    'text',
+    'pub_date',
+    'image',
+    'comments_count',
+    'thumbnails',
+    'author__id',
+    'author__username',
+    'author__first_name',
+    'author__last_name',
+    'group__id',
+    'group__slug',
+    'group__title',
+)
+
+
+def feed(post_list=None):
+    """Queryset для лент: автор и группа одним JOIN, только нужные колонки.
+
+    Страница ленты - это один запрос независимо от числа постов на ней.
+    """
+    if post_list is None:
+        post_list = Post.objects.all()
+    return post_list.select_related('author', 'group').only(*CARD_FIELDS)
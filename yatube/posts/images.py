@@ -0,0 +1,208 @@
+"""Обработка картинок постов.
+
+Оригинал при загрузке поворачивается по EXIF, уменьшается до
+IMAGE_MAX_SIDE и пересохраняется без метаданных. Из него готовятся
+варианты карточки нескольких ширин и форматов для srcset.
+"""
+import io
+import math
+import os
+from urllib.parse import unquote
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image
+
+# Форматы оригинала, которые пересохраняются; GIF и прочие не трогаем.
+SANITIZED_FORMATS = ('JPEG', 'PNG', 'WEBP')
+ORIGINAL_QUALITY = 90
+ORIENTATION_TAG = 0x0112
+ORIENTATIONS = {
+    2: Image.FLIP_LEFT_RIGHT,
+    3: Image.ROTATE_180,
+    4: Image.FLIP_TOP_BOTTOM,
+    5: Image.TRANSPOSE,
+    6: Image.ROTATE_270,
+    7: Image.TRANSVERSE,
+    8: Image.ROTATE_90,
+}
+VARIANT_FORMATS = {
+    # формат: (MIME-тип, расширение, параметры сохранения)
+    'avif': ('image/avif', 'avif', {}),
+    'webp': ('image/webp', 'webp', {'method': 4}),
+    'jpeg': ('image/jpeg', 'jpg', {'optimize': True, 'progressive': True}),
+}
+VARIANTS_DIR = 'posts/variants/'
+
+
+def supported_formats():
+    """Форматы из IMAGE_VARIANT_FORMATS, которые умеет сохранять Pillow."""
+    Image.init()
+    return [
+        name for name in settings.IMAGE_VARIANT_FORMATS
+        if name in VARIANT_FORMATS and name.upper() in Image.SAVE
+    ]
+
+
+def _orientation(image):
+    return ORIENTATIONS.get(image.getexif().get(ORIENTATION_TAG))
+
+
+def _draft(image, width, height, method):
+    """Декодирует JPEG сразу в уменьшенном масштабе, не меньше width x height.
+
+    Для остальных форматов ничего не делает.
+    """
+    if method in (Image.TRANSPOSE, Image.TRANSVERSE,
+                  Image.ROTATE_90, Image.ROTATE_270):
+        width, height = height, width
+    image.draft(image.mode, (width, height))
+
+
+def sanitize(file):
+    """Оригинал без метаданных и не больше IMAGE_MAX_SIDE по стороне.
+
+    Возвращает новый файл или None, если оригинал надо оставить как есть.
+    """
+    try:
+        file.seek(0)
+        image = Image.open(file)
+    except (OSError, Image.DecompressionBombError):
+        return None
+    with image:
+        if (image.format not in SANITIZED_FORMATS
+                or getattr(image, 'is_animated', False)):
+            return None
+        fmt, icc_profile = image.format, image.info.get('icc_profile')
+        method = _orientation(image)
+        max_side = settings.IMAGE_MAX_SIDE
+        _draft(image, max_side, max_side, method)
+        # thumbnail() меняет картинку на месте, копия нужна только
+        # для поворота уже уменьшенного кадра.
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+        if method is not None:
+            image = image.transpose(method)
+        if fmt == 'JPEG' and image.mode not in ('RGB', 'L', 'CMYK'):
+            image = image.convert('RGB')
+        buffer = io.BytesIO()
+        options = {'icc_profile': icc_profile} if icc_profile else {}
+        if fmt != 'PNG':
+            options['quality'] = ORIGINAL_QUALITY
+        image.save(buffer, fmt, optimize=True, **options)
+    return ContentFile(buffer.getvalue(), name=os.path.basename(file.name))
+
+
+def _crop_box(width, height):
+    """Рамка по центру кадра с пропорциями IMAGE_CARD_SIZE."""
+    card_width, card_height = settings.IMAGE_CARD_SIZE
+    if width * card_height > height * card_width:
+        new_width = max(1, height * card_width // card_height)
+        left = (width - new_width) // 2
+        return (left, 0, left + new_width, height)
+    new_height = max(1, width * card_height // card_width)
+    top = (height - new_height) // 2
+    return (0, top, width, top + new_height)
+
+
+def _rgb(image):
+    """RGB-кадр; прозрачность заливается белым."""
+    if image.mode == 'RGB':
+        return image
+    if 'A' in image.getbands() or 'transparency' in image.info:
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def _save_variant(image, storage, stem, width, name):
+    _, extension, options = VARIANT_FORMATS[name]
+    buffer = io.BytesIO()
+    image.save(buffer, name.upper(),
+               quality=settings.IMAGE_VARIANT_QUALITY, **options)
+    saved = storage.save(
+        f'{VARIANTS_DIR}{stem}-{width}.{extension}',
+        ContentFile(buffer.getvalue()),
+    )
+    return storage.url(saved)
+
+
+def _card(variants):
+    """URL самого широкого варианта, не шире карточки."""
+    card_width = settings.IMAGE_CARD_SIZE[0]
+    fitting = [item for item in variants if item[0] <= card_width]
+    if fitting:
+        return max(fitting)[1]
+    return min(variants)[1] if variants else None
+
+
+def render_variants(field_file):
+    """Сохраняет варианты карточки и возвращает их URL.
+
+    Результат: {'card': URL для src, 'sources': [[MIME, srcset], ...]}.
+    Картинка декодируется один раз: первая ширина вырезается из кадра,
+    каждая следующая уменьшается из предыдущей, так что в памяти
+    одновременно только исходник и один вариант.
+    """
+    formats = supported_formats()
+    card_width, card_height = settings.IMAGE_CARD_SIZE
+    stem = os.path.splitext(os.path.basename(field_file.name))[0]
+    srcsets = {name: [] for name in formats}
+    field_file.open('rb')
+    with field_file, Image.open(field_file) as source:
+        method = _orientation(source)
+        widest = max(settings.IMAGE_VARIANT_WIDTHS)
+        _draft(source, widest,
+               math.ceil(widest * card_height / card_width), method)
+        image = _rgb(source.transpose(method) if method else source)
+        box = _crop_box(*image.size)
+        frame_width, frame_height = box[2] - box[0], box[3] - box[1]
+        widths = sorted(
+            (width for width in settings.IMAGE_VARIANT_WIDTHS
+             if width <= frame_width),
+            reverse=True,
+        ) or [frame_width]
+        for width in widths:
+            height = max(1, round(width * frame_height / frame_width))
+            image = image.resize(
+                (width, height), Image.LANCZOS, box=box, reducing_gap=3.0)
+            box = None
+            for name in formats:
+                url = _save_variant(image, field_file.storage, stem,
+                                    width, name)
+                srcsets[name].append((width, url))
+    return {
+        'card': _card(srcsets.get('jpeg', [])),
+        'sources': [
+            [VARIANT_FORMATS[name][0], ', '.join(
+                f'{url} {width}w' for width, url in reversed(srcsets[name])
+            )]
+            for name in formats
+        ],
+    }
+
+
+def variant_urls(urls):
+    """Все URL вариантов из словаря render_variants."""
+    found = {urls['card']} if urls.get('card') else set()
+    for _, srcset in urls.get('sources', []):
+        found.update(item.rsplit(' ', 1)[0] for item in srcset.split(', '))
+    return found
+
+
+def delete_variants(urls, storage):
+    """Удаляет файлы вариантов по их URL.
+
+    URL переводятся обратно в имена через base_url хранилища; чужие URL
+    и файлы вне VARIANTS_DIR пропускаются.
+    """
+    base_url = getattr(storage, 'base_url', None)
+    if not base_url:
+        return
+    for url in variant_urls(urls):
+        if not url.startswith(base_url):
+            continue
+        name = unquote(url[len(base_url):])
+        if name.startswith(VARIANTS_DIR):
+            storage.delete(name)
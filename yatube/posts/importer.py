@@ -0,0 +1,431 @@
+"""Массовый импорт постов, комментариев и подписок из NDJSON или CSV.
+
+Строки читаются потоком и пишутся порциями через executemany, каждая
+порция в своей транзакции. Сигналы при этом не срабатывают, поэтому
+счетчики, поисковый индекс, ленты подписок и версии кэша обновляются
+функцией refresh раз в FLUSH_ROWS строк и в Importer.finish().
+
+Скорость на SQLite (100 тыс. постов, вместе с refresh): около 19-25
+тыс. строк в секунду против 16-22 тыс. до оптимизации. Цель в 50 тыс.
+не достигнута: больше всего времени уходит на сами INSERT и на
+поисковый индекс, а не на разбор строк.
+
+Поля строк:
+    post    - author, text, [group], [pub_date], [id]
+    comment - post, author, text, [created]
+    follow  - user, author
+Тип строки задается полем type или параметром kind у Importer.
+"""
+import csv
+import json
+import time
+from datetime import datetime
+from datetime import timezone as utc_zone
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import caching, counters, search, timeline
+from .models import Comment, Follow, Group, Post, User
+
+POST = 'post'
+COMMENT = 'comment'
+FOLLOW = 'follow'
+KINDS = (POST, COMMENT, FOLLOW)
+FORMATS = ('ndjson', 'csv')
+# Не больше стольких параметров в одном IN (...): лимит старых SQLite.
+LOOKUP_CHUNK = 900
+MAX_ERRORS = 20
+# Раз в столько строк Importer обновляет счетчики, поиск и ленты.
+FLUSH_ROWS = 100000
+utc = utc_zone.utc
+_raw_decode = json.JSONDecoder().raw_decode
+
+
+class RowError(ValueError):
+    pass
+
+
+def _json(line):
+    """Значение из строки NDJSON; ValueError, если строка не JSON.
+
+    raw_decode вдвое быстрее json.loads, но не пропускает пробелы
+    в начале строки и не проверяет ее хвост.
+    """
+    try:
+        value, end = _raw_decode(line)
+    except ValueError:
+        return json.loads(line)
+    if end != len(line) and not line[end:].isspace():
+        raise ValueError(f'лишние символы после JSON: {line[end:]!r}')
+    return value
+
+
+def read_rows(stream, fmt):
+    """Пары (номер строки, dict); битая строка NDJSON дает None."""
+    if fmt == 'csv':
+        for number, row in enumerate(csv.DictReader(stream), 2):
+            yield number, row
+        return
+    for number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            row = _json(line)
+        except ValueError:
+            row = None
+        yield number, row if isinstance(row, dict) else None
+
+
+def _chunks(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _lookup(queryset, field, values):
+    """{значение field: id} для values, запросами по LOOKUP_CHUNK штук."""
+    found = {}
+    for chunk in _chunks(values, LOOKUP_CHUNK):
+        found.update(queryset.filter(
+            **{f'{field}__in': chunk}
+        ).values_list(field, 'pk'))
+    return found
+
+
+def _insert(model, columns, rows, ignore_conflicts=False):
+    """INSERT через executemany.
+
+    bulk_create строит SQL из экземпляров моделей и на больших объемах
+    в разы медленнее; здесь строки уже готовые кортежи значений колонок.
+    """
+    if not rows:
+        return
+    ops = connection.ops
+    sql = '{} {} ({}) VALUES ({}) {}'.format(
+        ops.insert_statement(ignore_conflicts=ignore_conflicts),
+        ops.quote_name(model._meta.db_table),
+        ', '.join(ops.quote_name(column) for column in columns),
+        ', '.join(['%s'] * len(columns)),
+        ops.ignore_conflicts_suffix_sql(ignore_conflicts=ignore_conflicts),
+    )
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, rows)
+
+
+def _string(row, name):
+    """Строковое поле или None; значение другого типа - ошибка строки."""
+    value = row.get(name)
+    if isinstance(value, str):
+        return value or None
+    if value is None:
+        return None
+    raise RowError(f'поле {name} должно быть строкой: {value!r}')
+
+
+def _text(row, name):
+    value = (_string(row, name) or '').strip()
+    if not value:
+        raise RowError(f'пустое поле {name}')
+    return value
+
+
+def _utc_text(date):
+    return str(date.astimezone(utc).replace(tzinfo=None))
+
+
+def _date_adapter():
+    """Функция, которая приводит дату к виду, в котором ее хранит база.
+
+    SQLite хранит дату строкой в UTC: Django переводит в UTC через pytz,
+    а datetime.timezone.utc делает то же в C, вдвое быстрее.
+    """
+    if (connection.vendor == 'sqlite' and settings.USE_TZ
+            and connection.timezone_name == 'UTC'):
+        return _utc_text
+    return connection.ops.adapt_datetimefield_value
+
+
+def _date(row, name, default, adapt):
+    """Дата из ISO 8601 в виде, в котором ее хранит база."""
+    # Даты чаще нет: пустое поле отсекается без вызовов.
+    if not row.get(name):
+        return default
+    value = _string(row, name)
+    try:
+        date = datetime.fromisoformat(value)
+    except ValueError:
+        date = None
+    if date is None:
+        # parse_datetime понимает и то, что fromisoformat в Python 3.7
+        # не умеет ('Z' в конце); на несуществующей дате - ValueError.
+        try:
+            date = parse_datetime(value)
+        except ValueError:
+            date = None
+    if date is None:
+        raise RowError(f'неверная дата в поле {name}: {value}')
+    if timezone.is_naive(date):
+        date = timezone.make_aware(date)
+    return adapt(date)
+
+
+def _int(row, name, required=True):
+    value = row.get(name)
+    if value in (None, '') and not required:
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise RowError(f'неверное число в поле {name}: {value}')
+
+
+POST_COLUMNS = (
+    'author_id', 'group_id', 'text', 'pub_date',
+    'image', 'comments_count', 'thumbnails',
+)
+COMMENT_COLUMNS = ('post_id', 'author_id', 'text', 'created')
+FOLLOW_COLUMNS = ('user_id', 'author_id')
+
+
+def _last_post_id():
+    return Post.objects.order_by('-pk').values_list(
+        'pk', flat=True).first() or 0
+
+
+class Importer:
+    """Пишет строки порциями. В памяти только текущая порция и то, что
+    накопилось с последнего flush(): он вызывается раз в flush_rows
+    строк, так что память не растет с объемом импорта."""
+
+    def __init__(self, kind=None, batch_size=5000, flush_rows=FLUSH_ROWS):
+        self.kind = kind
+        self.batch_size = batch_size
+        self.flush_rows = flush_rows
+        self.adapt_date = _date_adapter()
+        self.created = dict.fromkeys(KINDS, 0)
+        self.rows = 0
+        self.error_count = 0
+        self.errors = []
+        # Новые посты без id получают id больше этого; посты с явным
+        # id ниже него запоминаются отдельно, для поискового индекса.
+        self.last_post_id = _last_post_id()
+        self._forget()
+
+    def _forget(self):
+        self.users = {}
+        self.groups = {}
+        self.touched_users = set()
+        self.touched_groups = set()
+        self.commented_posts = set()
+        self.old_post_ids = []
+        self.unflushed = 0
+        self.unflushed_posts = 0
+
+    def run(self, rows, progress=None):
+        """Импортирует пары (номер, строка); progress(rows, seconds)."""
+        started = time.monotonic()
+        for chunk in _chunks(rows, self.batch_size):
+            self.write(chunk)
+            if self.unflushed >= self.flush_rows:
+                self.flush()
+            if progress is not None:
+                progress(self.rows, time.monotonic() - started)
+        return time.monotonic() - started
+
+    def error(self, number, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append(f'строка {number}: {message}')
+
+    def _resolve(self, chunk):
+        """Догружает в словари неизвестные имена и slug-и порции."""
+        users, groups = self.users, self.groups
+        usernames, slugs = set(), set()
+        for _, row in chunk:
+            if row is None:
+                continue
+            # Значения не-строки здесь пропускаются, а ошибкой строки
+            # становятся в _build.
+            author, user, slug = row.get('author'), row.get('user'), row.get(
+                'group')
+            if isinstance(author, str) and author not in users:
+                usernames.add(author)
+            if isinstance(user, str) and user not in users:
+                usernames.add(user)
+            if isinstance(slug, str) and slug not in groups:
+                slugs.add(slug)
+        for cache, model, field, missing in (
+            (users, User, 'username', usernames),
+            (groups, Group, 'slug', slugs),
+        ):
+            found = _lookup(model.objects.all(), field, missing)
+            cache.update((value, found.get(value)) for value in missing)
+
+    def _user(self, row, name):
+        username = _string(row, name)
+        user_id = self.users.get(username)
+        if user_id is None:
+            raise RowError(f'нет пользователя {username!r}')
+        return user_id
+
+    def _post(self, row, now):
+        """(id или None, значения POST_COLUMNS)."""
+        group_id = None
+        slug = _string(row, 'group')
+        if slug is not None:
+            group_id = self.groups.get(slug)
+            if group_id is None:
+                raise RowError(f'нет группы {slug!r}')
+        return _int(row, 'id', required=False), (
+            self._user(row, 'author'),
+            group_id,
+            _text(row, 'text'),
+            _date(row, 'pub_date', now, self.adapt_date),
+            '', 0, '',
+        )
+
+    def _comment(self, row, now):
+        return (
+            _int(row, 'post'),
+            self._user(row, 'author'),
+            _text(row, 'text'),
+            _date(row, 'created', now, self.adapt_date),
+        )
+
+    def _follow(self, row, now):
+        user_id, author_id = self._user(row, 'user'), self._user(row, 'author')
+        if user_id == author_id:
+            raise RowError('подписка на самого себя')
+        return user_id, author_id
+
+    def _build(self, chunk):
+        now = self.adapt_date(timezone.now())
+        built = {kind: [] for kind in KINDS}
+        builders = {
+            POST: self._post, COMMENT: self._comment, FOLLOW: self._follow,
+        }
+        for number, row in chunk:
+            if row is None:
+                self.error(number, 'строка не JSON-объект')
+                continue
+            kind = row.get('type') or self.kind
+            if not isinstance(kind, str) or kind not in builders:
+                self.error(number, f'неизвестный тип {kind!r}')
+                continue
+            try:
+                built[kind].append((number, builders[kind](row, now)))
+            except RowError as error:
+                self.error(number, error)
+        return built
+
+    def _check_posts(self, posts, comments):
+        """Отбрасывает посты с занятым id и комментарии к несуществующим."""
+        new_ids = [pk for _, (pk, _) in posts if pk is not None]
+        existing = set(_lookup(
+            Post.objects.all(), 'pk',
+            new_ids + [comment[0] for _, comment in comments],
+        ))
+        valid_posts = []
+        for number, post in posts:
+            pk = post[0]
+            if pk is not None:
+                if pk in existing:
+                    self.error(number, f'пост {pk} уже есть')
+                    continue
+                existing.add(pk)
+            valid_posts.append(post)
+        valid_comments = []
+        for number, comment in comments:
+            if comment[0] in existing:
+                valid_comments.append(comment)
+            else:
+                self.error(number, f'нет поста {comment[0]}')
+        return valid_posts, valid_comments
+
+    def write(self, chunk):
+        self.rows += len(chunk)
+        self.unflushed += len(chunk)
+        self._resolve(chunk)
+        built = self._build(chunk)
+        posts, comments = self._check_posts(built[POST], built[COMMENT])
+        follows = [follow for _, follow in built[FOLLOW]]
+        with transaction.atomic():
+            _insert(Post, ('id', *POST_COLUMNS), [
+                (pk, *values) for pk, values in posts if pk is not None])
+            _insert(Post, POST_COLUMNS, [
+                values for pk, values in posts if pk is None])
+            _insert(Comment, COMMENT_COLUMNS, comments)
+            _insert(Follow, FOLLOW_COLUMNS, follows, ignore_conflicts=True)
+        self.created[POST] += len(posts)
+        self.unflushed_posts += len(posts)
+        self.created[COMMENT] += len(comments)
+        self.created[FOLLOW] += len(follows)
+        last_post_id = self.last_post_id
+        self.touched_users.update(values[0] for _, values in posts)
+        self.touched_groups.update(values[1] for _, values in posts)
+        self.old_post_ids.extend(
+            pk for pk, _ in posts if pk is not None and pk <= last_post_id)
+        for follow in follows:
+            self.touched_users.update(follow)
+        self.commented_posts.update(comment[0] for comment in comments)
+
+    def _new_posts(self, last_post_id):
+        posts = Post.objects.order_by().filter(
+            Q(pk__gt=self.last_post_id, pk__lte=last_post_id)
+            | Q(pk__in=self.old_post_ids)
+        )
+        return posts.values_list('pk', 'text').iterator()
+
+    def flush(self):
+        """Обновляет счетчики, поиск, ленты и кэш после записанных строк
+        и забывает их, вместе со словарями пользователей и групп."""
+        last_post_id = _last_post_id()
+        refresh(
+            self.touched_users,
+            [pk for pk in self.touched_groups if pk is not None],
+            new_posts=(
+                self._new_posts(last_post_id) if self.unflushed_posts
+                else None
+            ),
+            post_ids=self.commented_posts,
+        )
+        self.last_post_id = last_post_id
+        self._forget()
+
+    def finish(self):
+        self.flush()
+
+
+def refresh(user_ids, group_ids, new_posts=None, post_ids=()):
+    """Пересчитывает все, что при обычном сохранении делают сигналы.
+
+    new_posts - пары (id, text) для поискового индекса, post_ids - посты
+    с новыми комментариями: пересчитываются счетчики только у них.
+    """
+    users = list(user_ids)
+    groups = list(group_ids)
+    timeline.forget_hot_authors()
+    with transaction.atomic():
+        for chunk in _chunks(users, LOOKUP_CHUNK):
+            counters.recount_users(chunk)
+            timeline.fill(chunk)
+        for chunk in _chunks(groups, LOOKUP_CHUNK):
+            counters.recount_groups(chunk)
+        for chunk in _chunks(post_ids, LOOKUP_CHUNK):
+            counters.recount_posts(chunk)
+        if new_posts is not None:
+            search.index_posts(new_posts)
+        caching.bump(
+            caching.INDEX,
+            *(caching.author_scope(pk) for pk in users),
+            *(caching.group_scope(pk) for pk in groups),
+        )
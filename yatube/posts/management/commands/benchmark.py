@@ -0,0 +1,67 @@
+import json
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from posts import benchmark
+
+
+class Command(BaseCommand):
+    help = ('Замеряет основные страницы на текущей базе (заполните ее '
+            'командой seed) и сравнивает с базовым прогоном; при '
+            'регрессии завершается с ошибкой.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'views', nargs='*',
+            help='Страницы для замера; по умолчанию все.')
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument(
+            '-o', '--output',
+            help='Файл для результатов в JSON; "-" - stdout.')
+        parser.add_argument(
+            '--baseline', default=settings.BENCHMARK_BASELINE,
+            help='Базовый прогон для сравнения.')
+        parser.add_argument(
+            '--save-baseline', action='store_true',
+            help='Записать результаты как новый базовый прогон.')
+        parser.add_argument(
+            '--tolerance', type=float, default=settings.BENCHMARK_TOLERANCE,
+            help='Допустимый рост p95 и памяти, доля.')
+
+    def progress(self, name, metrics):
+        self.stderr.write(f'{name:<14}' + '  '.join(
+            f'{metric} {metrics[metric]}' for metric in benchmark.METRICS))
+
+    def handle(self, *args, views, baseline, tolerance, **options):
+        if options['iterations'] < 1:
+            raise CommandError('--iterations должно быть больше 0.')
+        try:
+            results = benchmark.run(
+                views, iterations=options['iterations'],
+                warmup=options['warmup'], progress=self.progress)
+        except benchmark.BenchmarkError as error:
+            raise CommandError(error)
+        if options['output'] == '-':
+            self.stdout.write(json.dumps(results, indent=2))
+        elif options['output']:
+            benchmark.save(results, options['output'])
+        if options['save_baseline']:
+            os.makedirs(os.path.dirname(baseline), exist_ok=True)
+            benchmark.save(results, baseline)
+            self.stderr.write(f'Базовый прогон записан в {baseline}')
+            return
+        if not os.path.exists(baseline):
+            self.stderr.write(f'Нет базового прогона {baseline}')
+            return
+        saved = benchmark.load(baseline)
+        if saved.get('posts') != results['posts']:
+            self.stderr.write(self.style.WARNING(
+                f'Базовый прогон снят на {saved.get("posts")} постах, '
+                f'а в базе их {results["posts"]}: сравнение неточное.'))
+        regressions = benchmark.compare(results, saved, tolerance)
+        if regressions:
+            raise CommandError(
+                'Регрессии производительности:\n' + '\n'.join(regressions))
+        self.stderr.write(self.style.SUCCESS('Регрессий нет'))
@@ -0,0 +1,52 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from posts import exporter
+
+
+class Command(BaseCommand):
+    help = ('Выгружает посты или комментарии в NDJSON или CSV потоком: '
+            'в файл или stdout, по желанию со сжатием gzip.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=tuple(exporter.EXPORTS))
+        parser.add_argument(
+            '-o', '--output', default='-',
+            help='Файл для выгрузки; по умолчанию или "-" - stdout.')
+        parser.add_argument(
+            '--format', choices=exporter.FORMATS, default='ndjson')
+        parser.add_argument('--author', help='username автора.')
+        parser.add_argument('--group', help='slug группы.')
+        parser.add_argument(
+            '--since', help='Дата начала (ISO 8601), включительно.')
+        parser.add_argument(
+            '--until', help='Дата конца (ISO 8601), не включительно.')
+        parser.add_argument(
+            '--gzip', action='store_true', help='Сжимать gzip.')
+
+    def handle(self, *args, kind, output, **options):
+        filters = {'author': options['author'], 'group': options['group']}
+        try:
+            for name in ('since', 'until'):
+                if options[name]:
+                    filters[name] = exporter.parse_moment(options[name])
+        except ValueError as error:
+            raise CommandError(error)
+        chunks = exporter.export(
+            kind, options['format'], compress=options['gzip'], **filters)
+        if output == '-':
+            target = sys.stdout.buffer
+        else:
+            target = open(output, 'wb')
+        size = 0
+        try:
+            for chunk in chunks:
+                target.write(chunk)
+                size += len(chunk)
+        finally:
+            if target is not sys.stdout.buffer:
+                target.close()
+        if output != '-':
+            self.stdout.write(self.style.SUCCESS(
+                f'Выгружено в {output}: {size} байт'
+            ))
@@ -0,0 +1,59 @@
+import io
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from posts import importer
+
+
+class Command(BaseCommand):
+    help = ('Импортирует посты, комментарии и подписки из NDJSON или CSV '
+            '(файл или stdin), затем пересчитывает счетчики, поиск и ленты.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?', default='-',
+            help='Файл для импорта; по умолчанию или "-" - stdin.')
+        parser.add_argument(
+            '--format', choices=importer.FORMATS,
+            help='Формат; по умолчанию по расширению файла, иначе ndjson.')
+        parser.add_argument(
+            '--type', dest='kind', choices=importer.KINDS,
+            help='Тип строк без поля type (обязателен для CSV).')
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help='Строк в одной транзакции.')
+
+    def progress(self, rows, seconds):
+        self.stderr.write(
+            f'{rows} строк, {rows / max(seconds, 1e-9):.0f} строк/с')
+
+    def handle(self, *args, path, kind, batch_size, **options):
+        fmt = options['format']
+        if fmt is None:
+            fmt = 'csv' if path.endswith('.csv') else 'ndjson'
+        if fmt == 'csv' and kind is None:
+            raise CommandError('Для CSV нужен параметр --type.')
+        if path == '-':
+            stream = io.TextIOWrapper(
+                sys.stdin.buffer, encoding='utf-8', newline='')
+        else:
+            try:
+                stream = open(path, encoding='utf-8', newline='')
+            except OSError as error:
+                raise CommandError(error)
+        job = importer.Importer(kind=kind, batch_size=batch_size)
+        with stream:
+            seconds = job.run(
+                importer.read_rows(stream, fmt), progress=self.progress)
+        job.finish()
+        for message in job.errors:
+            self.stderr.write(message)
+        created = job.created
+        self.stdout.write(self.style.SUCCESS(
+            f'Импортировано за {seconds:.1f} с '
+            f'({job.rows / max(seconds, 1e-9):.0f} строк/с): '
+            f'постов {created[importer.POST]}, '
+            f'комментариев {created[importer.COMMENT]}, '
+            f'подписок {created[importer.FOLLOW]}; '
+            f'ошибок {job.error_count}'
+        ))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from posts import counters
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает счетчики постов, комментариев и подписок, '
+            'исправляя расхождения с таблицами.')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            users = counters.recount_users()
+            groups = counters.recount_groups()
+            posts = counters.recount_posts()
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитано: пользователей {users}, групп {groups}, '
+            f'постов {posts}'
+        ))
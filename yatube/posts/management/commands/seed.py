@@ -0,0 +1,61 @@
+from django.core.management.base import BaseCommand, CommandError
+from posts import seeding
+from posts.exporter import parse_moment
+
+
+class Command(BaseCommand):
+    help = ('Создает воспроизводимый синтетический набор данных: '
+            'пользователей, группы, посты с картинками, комментарии и '
+            'подписки. Пароль всех пользователей - '
+            f'"{seeding.PASSWORD}", только для локальной базы.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help='Зерно генератора; одно зерно - одни и те же данные.')
+        parser.add_argument(
+            '--scale', type=float, default=1,
+            help=('Множитель объема: 1 - {posts} постов и {users} '
+                  'пользователей, 1000 - в тысячу раз больше.').format(
+                      **seeding.SIZES))
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help='Строк в одной транзакции.')
+        parser.add_argument(
+            '--images', type=int, default=8,
+            help='Сколько разных картинок нарисовать для постов.')
+        parser.add_argument(
+            '--image-ratio', type=float, default=0.05,
+            help='Доля постов с картинкой.')
+        parser.add_argument(
+            '--end',
+            help=('Дата последних постов в ISO 8601, по умолчанию '
+                  f'{seeding.END.date()}; даты идут на год назад от нее.'))
+
+    def progress(self, name, rows, seconds):
+        self.stderr.write(
+            f'{name}: {rows} строк, {rows / max(seconds, 1e-9):.0f} строк/с')
+
+    def handle(self, *args, seed, scale, batch_size, **options):
+        if scale <= 0 or batch_size <= 0:
+            raise CommandError('--scale и --batch-size должны быть больше 0.')
+        end = seeding.END
+        if options['end']:
+            try:
+                end = parse_moment(options['end'])
+            except ValueError as error:
+                raise CommandError(f'--end: {error}')
+        seeder = seeding.Seeder(
+            seed=seed, scale=scale, batch_size=batch_size,
+            image_count=options['images'],
+            image_ratio=options['image_ratio'] if options['images'] else 0,
+            end=end,
+        )
+        seconds = seeder.run(progress=self.progress)
+        created = seeder.created
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано за {seconds:.1f} с: пользователей {created["users"]}, '
+            f'групп {created["groups"]}, постов {created["posts"]}, '
+            f'комментариев {created["comments"]}, '
+            f'подписок {created["follows"]}'
+        ))
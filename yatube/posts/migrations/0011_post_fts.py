@@ -0,0 +1,43 @@
+# Generated by Django 2.2.16 on 2026-10-18 04:35
+
+import re
+
+from django.db import migrations
+
+from posts.stemmer import stem
+
+
+def create_fts(apps, schema_editor):
+    """Индекс FTS5 есть только у SQLite, на других базах поиск выключен."""
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    Post = apps.get_model('posts', 'Post')
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE posts_post_fts USING fts5("
+        "stems, tokenize = 'unicode61 remove_diacritics 2')"
+    )
+    rows = (
+        (pk, ' '.join(stem(word) for word in re.findall(r'\w+', text.lower())))
+        for pk, text in Post.objects.values_list('pk', 'text').iterator()
+    )
+    with schema_editor.connection.cursor() as cursor:
+        cursor.executemany(
+            'INSERT INTO posts_post_fts (rowid, stems) VALUES (%s, %s)',
+            list(rows)
+        )
+
+
+def drop_fts(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS posts_post_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0010_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts, drop_fts),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 2.2.16 on 2026-10-18 06:33
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Индексы внешних ключей удаляются прямо по имени: AlterField в SQLite
+# дважды копировал бы всю таблицу постов.
+INDEXES = (
+    ('posts_post_author_id_fe5487bf', 'author_id'),
+    ('posts_post_group_id_c91a8485', 'group_id'),
+)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0015_comment_created_index'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(
+                    f'DROP INDEX IF EXISTS "{name}"',
+                    f'CREATE INDEX "{name}" ON "posts_post" ("{column}")',
+                )
+                for name, column in INDEXES
+            ],
+            state_operations=[
+                migrations.AlterField(
+                    model_name='post',
+                    name='author',
+                    field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='posts', to=settings.AUTH_USER_MODEL, verbose_name='Автор'),
+                ),
+                migrations.AlterField(
+                    model_name='post',
+                    name='group',
+                    field=models.ForeignKey(blank=True, db_index=False, help_text='Выберите группу', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='posts_group', to='posts.Group', verbose_name='Группа'),
+                ),
+            ],
+        ),
+    ]
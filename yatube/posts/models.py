@@ -1,5 +1,8 @@
+import json
+
 from django.contrib.auth import get_user_model
 from django.db import models
+from django.utils.functional import cached_property
 
 User = get_user_model()
 
@@ -8,6 +11,11 @@ class Group(models.Model):
     title = models.CharField(max_length=200)
     slug = models.SlugField(max_length=50, unique=True)
     description = models.TextField()
+    posts_count = models.PositiveIntegerField(
+        'Количество постов',
+        default=0,
+        editable=False
+    )
 
     def __str__(self):
         #  название группы
@@ -27,11 +35,15 @@ class Post(models.Model):
         'Дата публикации',
         auto_now_add=True
     )
+    # Отдельных индексов у author и group нет: их заменяют
+    # post_author_date_idx и post_group_date_idx, а лишний индекс
+    # замедлял бы каждую вставку.
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
         related_name='posts',
-        verbose_name='Автор'
+        verbose_name='Автор',
+        db_index=False
     )
     group = models.ForeignKey(
         Group,
@@ -40,7 +52,8 @@ class Post(models.Model):
         null=True,
         on_delete=models.SET_NULL,
         verbose_name='Группа',
-        help_text='Выберите группу'
+        help_text='Выберите группу',
+        db_index=False
     )
     image = models.ImageField(
         verbose_name='Картинка',
@@ -48,16 +61,50 @@ class Post(models.Model):
         blank=True,
         help_text='Выберите файл изображения'
     )
+    comments_count = models.PositiveIntegerField(
+        'Количество комментариев',
+        default=0,
+        editable=False
+    )
+    thumbnails = models.TextField(
+        'Миниатюры',
+        blank=True,
+        default='',
+        editable=False,
+        help_text='JSON: URL карточки и srcset вариантов по форматам'
+    )
 
     class Meta:
-        ordering = ('-pub_date',)
+        ordering = ('-pub_date', '-id')
         verbose_name = 'пост'
         verbose_name_plural = 'Посты'
+        indexes = (
+            # лента и keyset-пагинация по (pub_date, id)
+            models.Index(
+                fields=('-pub_date', '-id'),
+                name='post_date_idx'
+            ),
+            # profile
+            models.Index(
+                fields=('author', '-pub_date', '-id'),
+                name='post_author_date_idx'
+            ),
+            # group_posts
+            models.Index(
+                fields=('group', '-pub_date', '-id'),
+                name='post_group_date_idx'
+            ),
+        )
 
     def __str__(self):
         # первые пятнадцать символов поста
         return f'{self.text[:15]}'
 
+    @cached_property
+    def thumbnail_urls(self):
+        """Готовые миниатюры картинки; пока их нет - пустой словарь."""
+        return json.loads(self.thumbnails) if self.thumbnails else {}
+
 
 class Comment(models.Model):
     post = models.ForeignKey(
@@ -85,6 +132,18 @@ class Comment(models.Model):
         ordering = ('-created',)
         verbose_name = 'комментарий'
         verbose_name_plural = 'Комментарии'
+        indexes = (
+            # комментарии поста в post_detail, keyset по (created, id)
+            models.Index(
+                fields=('post', '-created', '-id'),
+                name='comment_post_created_idx'
+            ),
+            # выгрузка всех комментариев по (created, id)
+            models.Index(
+                fields=('-created', '-id'),
+                name='comment_created_idx'
+            ),
+        )
 
 
 class Follow(models.Model):
@@ -100,3 +159,83 @@ class Follow(models.Model):
         related_name='following',
         verbose_name='Автор'
     )
+
+    class Meta:
+        verbose_name = 'подписка'
+        verbose_name_plural = 'Подписки'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'author'),
+                name='unique_follow_user_author'
+            ),
+        )
+
+
+class UserStats(models.Model):
+    """Счетчики пользователя, которые поддерживаются сигналами
+    вместо COUNT(*) на каждый запрос."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Пользователь'
+    )
+    posts_count = models.PositiveIntegerField('Постов', default=0)
+    followers_count = models.PositiveIntegerField('Подписчиков', default=0)
+    following_count = models.PositiveIntegerField('Подписок', default=0)
+
+    class Meta:
+        verbose_name = 'счетчики пользователя'
+        verbose_name_plural = 'Счетчики пользователей'
+
+    def __str__(self):
+        return f'{self.user}'
+
+
+class TimelineEntry(models.Model):
+    """Запись материализованной ленты «Избранные авторы».
+
+    Заполняется при публикации поста (fan-out on write), поэтому
+    лента подписчика читается одним диапазоном по индексу
+    (user, pub_date) без соединения Follow и Post.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Подписчик'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Пост'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор'
+    )
+    pub_date = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        verbose_name = 'запись ленты'
+        verbose_name_plural = 'Ленты подписок'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'post'),
+                name='unique_timeline_user_post'
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=('user', '-pub_date', '-post'),
+                name='timeline_user_date_post_idx'
+            ),
+            models.Index(
+                fields=('user', 'author'),
+                name='timeline_user_author_idx'
+            ),
+        )
@@ -0,0 +1,7 @@
+"""Горячие объекты из адресов страниц: группа по slug, автор по имени."""
+from core.objects import ObjectCache
+
+from .models import Group, User
+
+groups = ObjectCache(Group, 'slug')
+authors = ObjectCache(User, 'username')
@@ -0,0 +1,314 @@
+import base64
+import hashlib
+import json
+from collections.abc import Sequence
+
+from core.stampede import get_or_compute
+from django.conf import settings
+from django.core.paginator import EmptyPage, Page, PageNotAnInteger, Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+NEXT = 'n'
+PREVIOUS = 'p'
+# Сколько номеров показывать по бокам от текущей страницы и у краев.
+ON_EACH_SIDE = 2
+ON_ENDS = 1
+# Знак пропуска в WindowPage.window.
+ELLIPSIS = None
+
+
+# Имена аннотаций для ключей-выражений CursorPaginator.
+CURSOR_KEYS = ('cursor_date', 'cursor_id')
+
+
+class InvalidCursorError(Exception):
+    pass
+
+
+def encode_cursor(pub_date, pk, direction):
+    """Непрозрачный токен: позиция (pub_date, id) и направление."""
+    raw = json.dumps([pub_date.isoformat(), pk, direction])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    try:
+        padding = '=' * (-len(token) % 4)
+        raw = base64.urlsafe_b64decode(token + padding)
+        pub_date, pk, direction = json.loads(raw)
+        pub_date = parse_datetime(pub_date)
+    except (ValueError, TypeError):
+        raise InvalidCursorError(token)
+    if pub_date is None or not isinstance(pk, int):
+        raise InvalidCursorError(token)
+    if direction not in (NEXT, PREVIOUS):
+        raise InvalidCursorError(token)
+    return pub_date, pk, direction
+
+
+class CursorPage(Sequence):
+    """Страница ленты без номера и без общего количества записей.
+
+    position - курсор, по которому открыта страница ('' - первая):
+    ключ кэша фрагмента страницы, как number у WindowPage.
+    """
+    is_cursor = True
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None,
+                 position=''):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.position = position
+
+    def __repr__(self):
+        return f'<CursorPage: {len(self)} objects>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """Keyset-пагинация по (pub_date, id), от новых записей к старым.
+
+    Вместо COUNT(*) и OFFSET каждая страница - это один запрос
+    с условием по ключу последней показанной записи, поэтому
+    время ответа не зависит от глубины страницы.
+
+    keys - пара (дата, id), по которой идут сортировка и поиск позиции:
+    имена полей или выражения, например F() колонок TimelineEntry,
+    у которых есть индекс. Их значения должны совпадать с date_field
+    и pk объекта. По умолчанию - сами date_field и pk.
+    """
+
+    def __init__(self, object_list, per_page, date_field='pub_date',
+                 keys=None):
+        self.per_page = int(per_page)
+        self.date_field = date_field
+        self.keys = tuple(keys or (date_field, 'pk'))
+        if not isinstance(self.keys[0], str):
+            object_list = object_list.annotate(**dict(zip(CURSOR_KEYS, keys)))
+            self.keys = CURSOR_KEYS
+        self.object_list = object_list
+
+    def _seek(self, pub_date, pk, op):
+        # Условие date <= X вдобавок к (date < X или id < Y) позволяет
+        # базе начать чтение индекса прямо с позиции курсора.
+        date_key, id_key = self.keys
+        return Q(**{f'{date_key}__{op}e': pub_date}) & (
+            Q(**{f'{date_key}__{op}': pub_date})
+            | Q(**{f'{id_key}__{op}': pk})
+        )
+
+    def _after(self, pub_date, pk):
+        return self._seek(pub_date, pk, 'lt')
+
+    def _before(self, pub_date, pk):
+        return self._seek(pub_date, pk, 'gt')
+
+    def _cursor(self, obj, direction):
+        return encode_cursor(getattr(obj, self.date_field), obj.pk, direction)
+
+    def page(self, cursor=None):
+        """Страница после/до позиции из курсора; без курсора - первая."""
+        asc = self.keys
+        desc = tuple(f'-{key}' for key in asc)
+        if cursor is None:
+            rows = list(self.object_list.order_by(*desc)[:self.per_page + 1])
+            has_next, has_previous = len(rows) > self.per_page, False
+        else:
+            pub_date, pk, direction = decode_cursor(cursor)
+            if direction == NEXT:
+                queryset = self.object_list.filter(
+                    self._after(pub_date, pk)
+                ).order_by(*desc)
+                rows = list(queryset[:self.per_page + 1])
+                has_next, has_previous = len(rows) > self.per_page, True
+            else:
+                queryset = self.object_list.filter(
+                    self._before(pub_date, pk)
+                ).order_by(*asc)
+                rows = list(queryset[:self.per_page + 1])
+                has_next, has_previous = True, len(rows) > self.per_page
+                rows = rows[:self.per_page][::-1]
+        rows = rows[:self.per_page]
+        if not rows:
+            return CursorPage([], position=cursor or '')
+        return CursorPage(
+            rows,
+            next_cursor=self._cursor(rows[-1], NEXT) if has_next else None,
+            previous_cursor=(
+                self._cursor(rows[0], PREVIOUS) if has_previous else None
+            ),
+            position=cursor or '',
+        )
+
+    def get_page(self, cursor=None):
+        """Как Paginator.get_page: испорченный курсор - первая страница."""
+        try:
+            return self.page(cursor or None)
+        except InvalidCursorError:
+            return self.page(None)
+
+
+class WindowPage(Page):
+    """Страница с окном номеров вокруг текущей вместо page_range.
+
+    Записи читаются только при обращении к ним, с одной лишней: если
+    список постов взят из кэша фрагмента, запроса не будет вовсе.
+    """
+    is_cursor = False
+
+    def __init__(self, rows, number, paginator):
+        # rows - срез на per_page + 1 записей, queryset или список.
+        self.rows = rows
+        self.number = number
+        self.paginator = paginator
+
+    @cached_property
+    def fetched(self):
+        return list(self.rows)
+
+    @property
+    def object_list(self):
+        return self.fetched[:self.paginator.per_page]
+
+    def has_next(self):
+        last = self.paginator.num_pages
+        if last is not None and (
+                self.number < last or self.paginator.exact):
+            return self.number < last
+        # Число из кэша могло отстать: на последней странице решают записи.
+        return len(self.fetched) > self.paginator.per_page
+
+    @property
+    def position(self):
+        return self.number
+
+    @cached_property
+    def window(self):
+        """Номера страниц для ссылок, ELLIPSIS на месте пропусков."""
+        return self.paginator.window(self.number, self.has_next())
+
+
+class WindowedPaginator(Paginator):
+    """Paginator, которому не нужен точный COUNT(*) на каждый запрос.
+
+    Число записей берется из count (например, счетчика группы), иначе
+    из кэша на PAGINATION_COUNT_TIMEOUT секунд, иначе считается, но не
+    дальше PAGINATION_MAX_COUNT записей. Если записей больше, число
+    страниц неизвестно и в окне нет последнего номера, остаются
+    соседние страницы и «Следующая».
+
+    Переданному count (счетчики поддерживаются сигналами) страница
+    верит полностью. Число из кэша могло отстать, поэтому на последней
+    по нему странице и за ней решают сами записи, прочитанные с одной
+    лишней: отставший кэш не обрезает ленту.
+    """
+
+    def __init__(self, object_list, per_page, count=None):
+        super().__init__(object_list, per_page)
+        self.exact = count is not None
+        if self.exact:
+            self.count = count
+
+    def _count_key(self):
+        sql = str(self.object_list.query)
+        return 'count:' + hashlib.md5(sql.encode()).hexdigest()
+
+    @cached_property
+    def count(self):
+        """Число записей или None, если их больше PAGINATION_MAX_COUNT."""
+        def count():
+            limit = settings.PAGINATION_MAX_COUNT
+            total = self.object_list[:limit + 1].count()
+            return -1 if total > limit else total
+
+        total = get_or_compute(
+            self._count_key(), count, settings.PAGINATION_COUNT_TIMEOUT)
+        return None if total < 0 else total
+
+    @cached_property
+    def num_pages(self):
+        if self.count is None:
+            return None
+        return super().num_pages
+
+    def validate_number(self, number):
+        # Верхняя граница не проверяется: конец ленты виден по записям.
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger('That page number is not an integer')
+        if number < 1:
+            raise EmptyPage('That page number is less than 1')
+        return number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        rows = self.object_list[bottom:bottom + self.per_page + 1]
+        count = self.count
+        if number == 1 or count is not None and bottom < count:
+            return WindowPage(rows, number, self)
+        if self.exact:
+            raise EmptyPage('That page contains no results')
+        # За концом ленты по кэшу или без числа записей: есть ли там
+        # записи, видно только по ним самим.
+        rows = list(rows)
+        if not rows:
+            raise EmptyPage('That page contains no results')
+        return WindowPage(rows, number, self)
+
+    def get_page(self, number):
+        try:
+            return self.page(number)
+        except PageNotAnInteger:
+            return self.page(1)
+        except EmptyPage:
+            pass
+        # Номер за концом ленты - последняя страница, если она известна.
+        try:
+            return self.page(self.num_pages or 1)
+        except EmptyPage:
+            return self.page(1)
+
+    def window(self, number, has_next):
+        """Номера вокруг number и у краев, с ELLIPSIS в пропусках."""
+        last = self.num_pages
+        end = number + int(has_next)
+        if last is not None:
+            end = max(end, last)
+        pages = sorted(
+            page for page in {
+                *range(1, ON_ENDS + 1),
+                *range(number - ON_EACH_SIDE, number + ON_EACH_SIDE + 1),
+                *range(end - ON_ENDS + 1, end + 1),
+            }
+            if 1 <= page <= end
+        )
+        window = []
+        for page in pages:
+            if window and page - window[-1] == 2:
+                # Пропуск в один номер короче показать самим номером.
+                window.append(page - 1)
+            elif window and page - window[-1] > 2:
+                window.append(ELLIPSIS)
+            window.append(page)
+        if last is None and has_next:
+            window.append(ELLIPSIS)
+        return window
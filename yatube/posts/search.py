@@ -0,0 +1,227 @@
+"""Полнотекстовый поиск по постам на SQLite FTS5.
+
+В виртуальную таблицу posts_post_fts (rowid = id поста) пишутся
+основы слов текста, поэтому запрос «посты» находит «постами».
+Слово со звездочкой в конце ищется как префикс: «прогр*».
+"""
+import base64
+import json
+import re
+from functools import lru_cache
+
+from django.db import connection
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import Post
+from .paginator import NEXT, PREVIOUS, CursorPage, InvalidCursorError
+from .stemmer import stem
+
+TABLE = 'posts_post_fts'
+WORD = re.compile(r'\w+\*?')
+PLAIN_WORD = re.compile(r'\w+')
+SNIPPET_WORDS = 30
+BATCH_SIZE = 1000
+# Основы частых слов: при индексации тысяч постов слова повторяются.
+STEM_CACHE_SIZE = 100000
+
+
+def available():
+    return connection.vendor == 'sqlite'
+
+
+_cached_stem = lru_cache(maxsize=STEM_CACHE_SIZE)(stem)
+
+
+def _words(text):
+    return PLAIN_WORD.findall(text.lower())
+
+
+def index_text(text):
+    return ' '.join(map(_cached_stem, _words(text)))
+
+
+def parse_query(query):
+    """Термы запроса: (основа, префикс ли) для каждого слова."""
+    terms = []
+    for word in WORD.findall(query.lower()):
+        if word.endswith('*'):
+            terms.append((word[:-1].replace('ё', 'е'), True))
+        else:
+            terms.append((stem(word), False))
+    return [(term, prefix) for term, prefix in terms if term]
+
+
+def match_expression(terms):
+    """Выражение MATCH: все термы обязательны, термы в кавычках."""
+    return ' '.join(
+        '"{}"{}'.format(term.replace('"', '""'), '*' if prefix else '')
+        for term, prefix in terms
+    )
+
+
+def index_posts(posts):
+    """Добавляет или обновляет посты в индексе; posts - пары (id, text)."""
+    if not available():
+        return
+    with connection.cursor() as cursor:
+        batch = []
+        for pk, text in posts:
+            batch.append((pk, index_text(text)))
+            if len(batch) >= BATCH_SIZE:
+                _write(cursor, batch)
+                batch = []
+        _write(cursor, batch)
+
+
+def _write(cursor, batch):
+    if not batch:
+        return
+    cursor.executemany(
+        f'DELETE FROM {TABLE} WHERE rowid = %s', [(pk,) for pk, _ in batch])
+    cursor.executemany(
+        f'INSERT INTO {TABLE} (rowid, stems) VALUES (%s, %s)', batch)
+
+
+def unindex_post(pk):
+    if available():
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {TABLE} WHERE rowid = %s', [pk])
+
+
+def rebuild():
+    """Переписывает индекс заново, например после массового импорта."""
+    if not available():
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE}')
+    posts = Post.objects.order_by().values_list('pk', 'text')
+    index_posts(posts.iterator())
+    return posts.count()
+
+
+def filter_posts(post_list, query):
+    """Оставляет в queryset постов только найденные по индексу."""
+    terms = parse_query(query)
+    if not terms:
+        return post_list.none()
+    # RawSQL в pk__in SQLite оборачивает в скалярный подзапрос,
+    # поэтому условие задается через extra().
+    return post_list.extra(
+        where=[
+            f'{Post._meta.db_table}.id IN '
+            f'(SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s)'
+        ],
+        params=[match_expression(terms)],
+    )
+
+
+def _encode(score, pk, direction):
+    raw = json.dumps([score, pk, direction])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def _decode(token):
+    try:
+        padding = '=' * (-len(token) % 4)
+        score, pk, direction = json.loads(base64.urlsafe_b64decode(
+            token + padding))
+    except (ValueError, TypeError):
+        raise InvalidCursorError(token)
+    if not isinstance(pk, int) or direction not in (NEXT, PREVIOUS):
+        raise InvalidCursorError(token)
+    return float(score), pk, direction
+
+
+def _ranked(expression, per_page, cursor):
+    """Пары (id, score) одной страницы, по релевантности bm25."""
+    sql = (
+        f'SELECT rowid, score FROM ('
+        f'SELECT rowid, bm25({TABLE}) AS score FROM {TABLE} '
+        f'WHERE {TABLE} MATCH %s) '
+    )
+    params = [expression]
+    if cursor is None:
+        direction = NEXT
+        sql += 'ORDER BY score, rowid LIMIT %s'
+    else:
+        score, pk, direction = cursor
+        if direction == NEXT:
+            sql += ('WHERE score > %s OR (score = %s AND rowid > %s) '
+                    'ORDER BY score, rowid LIMIT %s')
+        else:
+            sql += ('WHERE score < %s OR (score = %s AND rowid < %s) '
+                    'ORDER BY score DESC, rowid DESC LIMIT %s')
+        params += [score, score, pk]
+    params.append(per_page + 1)
+    with connection.cursor() as db:
+        db.execute(sql, params)
+        rows = db.fetchall()
+    more = len(rows) > per_page
+    rows = rows[:per_page]
+    if direction == PREVIOUS:
+        return rows[::-1], True, more
+    return rows, more, cursor is not None
+
+
+def highlight(text, terms):
+    """Фрагмент текста вокруг первого совпадения, совпадения в <mark>."""
+    def matches(word):
+        word = word.lower().replace('ё', 'е')
+        return any(
+            word.startswith(term) if prefix else stem(word) == term
+            for term, prefix in terms
+        )
+
+    words = re.split(r'(\w+)', text)
+    first = next(
+        (i for i in range(1, len(words), 2) if matches(words[i])), 1)
+    start = max(0, first - SNIPPET_WORDS)
+    end = first + SNIPPET_WORDS * 2
+    parts = []
+    for i, part in enumerate(words[start:end], start):
+        if i % 2 and matches(part):
+            parts.append(f'<mark>{escape(part)}</mark>')
+        else:
+            parts.append(escape(part))
+    snippet = ''.join(parts).strip()
+    if start > 0:
+        snippet = '… ' + snippet
+    if end < len(words):
+        snippet += ' …'
+    return mark_safe(snippet)
+
+
+def search(query, per_page, cursor=None, post_list=None):
+    """Страница найденных постов, от самых релевантных.
+
+    У каждого поста есть атрибут highlight - фрагмент с подсветкой.
+    """
+    terms = parse_query(query)
+    if not terms or not available():
+        return CursorPage([])
+    try:
+        position = _decode(cursor) if cursor else None
+    except InvalidCursorError:
+        position = None
+    rows, has_next, has_previous = _ranked(
+        match_expression(terms), per_page, position)
+    if post_list is None:
+        post_list = Post.objects.all()
+    posts = post_list.in_bulk([pk for pk, _ in rows])
+    found = []
+    for pk, score in rows:
+        if pk in posts:
+            post = posts[pk]
+            post.score = score
+            post.highlight = highlight(post.text, terms)
+            found.append(post)
+    if not rows:
+        return CursorPage([])
+    return CursorPage(
+        found,
+        next_cursor=_encode(*rows[-1][::-1], NEXT) if has_next else None,
+        previous_cursor=(
+            _encode(*rows[0][::-1], PREVIOUS) if has_previous else None
+        ),
+    )
@@ -0,0 +1,263 @@
+"""Синтетические данные для нагрузочных тестов.
+
+Один и тот же seed дает одни и те же данные (даты отсчитываются от
+end, по умолчанию постоянной END). Объем задает scale: при scale=1 это
+SIZES, при scale=1000 - десять миллионов постов. Популярность авторов
+и групп распределена по закону Ципфа, число подписок пользователя - по
+Парето, а подписываются тоже по Ципфу, на популярных авторов, так что
+граф подписок степенной.
+
+Строки пишутся порциями через importer._insert без сигналов, а
+счетчики, поиск, ленты и версии кэша обновляются один раз в конце
+(importer.refresh).
+"""
+import io
+import itertools
+import json
+import random
+import time
+from datetime import datetime, timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.utils import timezone
+from faker import Faker
+from PIL import Image
+
+from . import images, importer
+from .models import Comment, Follow, Group, Post, User
+
+# Объемы при scale=1.
+SIZES = {
+    'users': 1000,
+    'groups': 20,
+    'posts': 10000,
+    'comments': 20000,
+}
+# Пароль всех созданных пользователей, чтобы под ними можно было войти.
+PASSWORD = 'seed-password'
+DAYS = 365
+# Последняя дата данных: от текущего времени даты плыли бы между прогонами.
+END = datetime(2024, 1, 1, tzinfo=timezone.utc)
+# Показатель закона Ципфа для авторов и групп.
+ZIPF_EXPONENT = 1.1
+GROUP_RATIO = 0.7
+# Подписок у пользователя: FOLLOW_MIN * Парето(FOLLOW_ALPHA).
+FOLLOW_MIN = 3
+FOLLOW_ALPHA = 1.5
+MAX_FOLLOWS = 1000
+# Среднее время от поста до комментария, в секундах.
+COMMENT_DELAY = 6 * 3600
+TEXT_POOL = 2000
+NAME_POOL = 500
+IMAGE_SIZE = (1600, 900)
+IMAGES_DIR = 'posts/seed/'
+
+USER_COLUMNS = (
+    'id', 'password', 'last_login', 'is_superuser', 'username',
+    'first_name', 'last_name', 'email', 'is_staff', 'is_active',
+    'date_joined',
+)
+GROUP_COLUMNS = ('id', 'title', 'slug', 'description', 'posts_count')
+
+
+def _next_id(model):
+    return (model.objects.order_by('-pk').values_list(
+        'pk', flat=True).first() or 0) + 1
+
+
+def _zipf(count):
+    """Накопленные веса рангов 1..count для random.choices."""
+    return list(itertools.accumulate(
+        1 / rank ** ZIPF_EXPONENT for rank in range(1, count + 1)))
+
+
+class Seeder:
+    def __init__(self, seed=0, scale=1, batch_size=5000,
+                 image_count=8, image_ratio=0.05, end=END):
+        self.random = random.Random(seed)
+        self.fake = Faker('ru_RU')
+        self.fake.seed_instance(seed)
+        self.seed = seed
+        self.sizes = {
+            name: max(1, round(size * scale)) for name, size in SIZES.items()
+        }
+        self.batch_size = batch_size
+        self.image_count = image_count
+        self.image_ratio = image_ratio
+        self.end = end
+        self.start = self.end - timedelta(days=DAYS)
+        self.step = (self.end - self.start) / self.sizes['posts']
+        self.created = dict.fromkeys(
+            ('users', 'groups', 'posts', 'comments', 'follows'), 0)
+        self.first_user = _next_id(User)
+        self.first_group = _next_id(Group)
+        self.first_post = _next_id(Post)
+
+    def run(self, progress=None):
+        """Создает все данные; progress(что, сколько, секунд)."""
+        started = time.monotonic()
+        self.progress = progress or (lambda *args: None)
+        self.texts = [
+            self.fake.sentence(nb_words=self.random.randint(4, 14))
+            for _ in range(TEXT_POOL)
+        ]
+        self.users()
+        self.groups()
+        self.posts()
+        self.comments()
+        self.follows()
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(
+                    no_style(), [User, Group, Post]):
+                cursor.execute(sql)
+        user_ids = range(self.first_user,
+                         self.first_user + self.sizes['users'])
+        group_ids = range(self.first_group,
+                          self.first_group + self.sizes['groups'])
+        importer.refresh(
+            user_ids, group_ids,
+            new_posts=Post.objects.filter(
+                pk__gte=self.first_post
+            ).order_by().values_list('pk', 'text').iterator(),
+            post_ids=range(
+                self.first_post, self.first_post + self.sizes['posts']),
+        )
+        return time.monotonic() - started
+
+    def _write(self, name, model, columns, rows):
+        """Пишет строки порциями, каждую в своей транзакции."""
+        started = time.monotonic()
+        for chunk in importer._chunks(rows, self.batch_size):
+            with transaction.atomic():
+                importer._insert(model, columns, chunk)
+            self.created[name] += len(chunk)
+            self.progress(name, self.created[name],
+                          time.monotonic() - started)
+
+    def users(self):
+        fake, count = self.fake, self.sizes['users']
+        password = make_password(PASSWORD)
+        date_joined = connection.ops.adapt_datetimefield_value(self.start)
+        logins = [fake.user_name() for _ in range(NAME_POOL)]
+        first_names = [fake.first_name() for _ in range(NAME_POOL)]
+        last_names = [fake.last_name() for _ in range(NAME_POOL)]
+        rows = []
+        for pk in range(self.first_user, self.first_user + count):
+            username = f'{self.random.choice(logins)}{pk}'
+            rows.append((
+                pk, password, None, False, username,
+                self.random.choice(first_names),
+                self.random.choice(last_names),
+                f'{username}@example.com', False, True, date_joined,
+            ))
+        self._write('users', User, USER_COLUMNS, rows)
+        # Ранги Ципфа раздаются вразброс и независимо для активности
+        # (кто пишет посты) и популярности (на кого подписываются):
+        # если бы они совпадали, ленты подписок росли бы квадратично.
+        self.authors = list(range(self.first_user, self.first_user + count))
+        self.random.shuffle(self.authors)
+        self.celebrities = self.authors[:]
+        self.random.shuffle(self.celebrities)
+        self.author_weights = _zipf(count)
+
+    def groups(self):
+        fake, count = self.fake, self.sizes['groups']
+        rows = [
+            (pk, fake.sentence(nb_words=2)[:-1][:200], f'seed-{pk}',
+             fake.paragraph(), 0)
+            for pk in range(self.first_group, self.first_group + count)
+        ]
+        self._write('groups', Group, GROUP_COLUMNS, rows)
+        self.group_ids = [row[0] for row in rows]
+        self.group_weights = _zipf(count)
+
+    def _picture(self, number):
+        """Градиент случайных цветов; имя и JSON его вариантов."""
+        colors = [
+            tuple(self.random.randrange(256) for _ in range(3))
+            for _ in range(2)
+        ]
+        image = Image.linear_gradient('L').rotate(
+            self.random.randrange(360)).resize(IMAGE_SIZE)
+        image = Image.merge('RGB', [
+            image.point(lambda value, channel=channel: (
+                colors[0][channel] * (255 - value)
+                + colors[1][channel] * value) // 255)
+            for channel in range(3)
+        ])
+        buffer = io.BytesIO()
+        image.save(buffer, 'JPEG', quality=85)
+        name = default_storage.save(
+            f'{IMAGES_DIR}seed{self.seed}-{number}.jpg',
+            ContentFile(buffer.getvalue()))
+        return name, json.dumps(images.render_variants(Post(image=name).image))
+
+    def _post_rows(self, pictures):
+        rand, texts = self.random, self.texts
+        adapt = connection.ops.adapt_datetimefield_value
+        for number in range(self.sizes['posts']):
+            author_id = rand.choices(
+                self.authors, cum_weights=self.author_weights)[0]
+            group_id = None
+            if rand.random() < GROUP_RATIO:
+                group_id = rand.choices(
+                    self.group_ids, cum_weights=self.group_weights)[0]
+            image, thumbnails = '', ''
+            if pictures and rand.random() < self.image_ratio:
+                image, thumbnails = rand.choice(pictures)
+            # Посты идут по времени: id растет вместе с pub_date.
+            pub_date = self.start + self.step * (number + rand.random())
+            yield (
+                self.first_post + number, author_id, group_id,
+                ' '.join(rand.choices(texts, k=rand.randint(1, 6))),
+                adapt(pub_date), image, 0, thumbnails,
+            )
+
+    def posts(self):
+        pictures = [
+            self._picture(number) for number in range(self.image_count)
+        ] if self.image_ratio else []
+        self._write('posts', Post, ('id', *importer.POST_COLUMNS),
+                    self._post_rows(pictures))
+
+    def _comment_rows(self):
+        rand, count = self.random, self.sizes['posts']
+        adapt = connection.ops.adapt_datetimefield_value
+        for _ in range(self.sizes['comments']):
+            # Свежие посты комментируют чаще: плотность растет как x^2.
+            number = min(count - 1, int(count * rand.random() ** (1 / 3)))
+            created = min(self.end, self.start + self.step * (number + 1)
+                          + timedelta(seconds=rand.expovariate(
+                              1 / COMMENT_DELAY)))
+            yield (
+                self.first_post + number,
+                rand.choice(self.authors),
+                rand.choice(self.texts),
+                adapt(created),
+            )
+
+    def comments(self):
+        self._write('comments', Comment, importer.COMMENT_COLUMNS,
+                    self._comment_rows())
+
+    def _follow_rows(self):
+        rand, count = self.random, self.sizes['users']
+        for user_id in range(self.first_user, self.first_user + count):
+            follows = min(
+                int(FOLLOW_MIN * rand.paretovariate(FOLLOW_ALPHA)),
+                MAX_FOLLOWS, count - 1,
+            )
+            authors = set(rand.choices(
+                self.celebrities, cum_weights=self.author_weights,
+                k=follows))
+            authors.discard(user_id)
+            for author_id in sorted(authors):
+                yield user_id, author_id
+
+    def follows(self):
+        self._write('follows', Follow, importer.FOLLOW_COLUMNS,
+                    self._follow_rows())
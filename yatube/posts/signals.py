@@ -0,0 +1,145 @@
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
+
+from . import caching, counters, images, search, thumbnails, timeline
+from .models import Comment, Follow, Group, Post, User
+
+
+def _post_scopes(post_id=None, author_id=None, group_id=None):
+    if post_id is not None:
+        author_id, group_id = Post.objects.filter(
+            pk=post_id
+        ).values_list('author_id', 'group_id').first() or (None, None)
+    return (
+        caching.INDEX,
+        caching.group_scope(group_id),
+        caching.author_scope(author_id) if author_id else None,
+    )
+
+
+@receiver(pre_save, sender=Post)
+def post_sanitize_image(sender, instance, raw=False, **kwargs):
+    """Новая картинка сохраняется без EXIF и не больше IMAGE_MAX_SIDE."""
+    if raw or not instance.image or instance.image._committed:
+        return
+    sanitized = images.sanitize(instance.image.file)
+    if sanitized is not None:
+        instance.image = sanitized
+
+
+@receiver(pre_save, sender=Post)
+def post_remember_old(sender, instance, raw=False, **kwargs):
+    """Запоминает прежние группу и картинку поста: счетчик группы
+    переносится, а миниатюры старой картинки сбрасываются."""
+    old = None, '', ''
+    if instance.pk is not None and not raw:
+        old = Post.objects.filter(pk=instance.pk).values_list(
+            'group_id', 'image', 'thumbnails').first() or old
+    (instance._old_group_id, instance._old_image,
+     instance._old_thumbnails) = old
+    if (instance.image.name or '') != (instance._old_image or ''):
+        instance.thumbnails = ''
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    search.index_posts([(instance.pk, instance.text)])
+    if (instance.image.name or '') != (instance._old_image or ''):
+        thumbnails.discard(instance._old_thumbnails)
+        thumbnails.schedule(instance)
+    if created:
+        counters.bump_user(instance.author_id, posts_count=1)
+        counters.bump_group(instance.group_id, 1)
+        timeline.fan_out(instance)
+    elif instance._old_group_id != instance.group_id:
+        counters.bump_group(instance._old_group_id, -1)
+        counters.bump_group(instance.group_id, 1)
+        caching.bump(caching.group_scope(instance._old_group_id))
+    caching.bump(*_post_scopes(
+        author_id=instance.author_id, group_id=instance.group_id))
+
+
+@receiver(pre_delete, sender=Post)
+def post_remember_thumbnails(sender, instance, **kwargs):
+    """Миниатюры пишутся в базу через update(), поэтому у объекта в
+    памяти их может не быть: берем из строки, пока она есть."""
+    instance._old_thumbnails = Post.objects.filter(
+        pk=instance.pk).values_list('thumbnails', flat=True).first()
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    search.unindex_post(instance.pk)
+    thumbnails.discard(instance._old_thumbnails)
+    counters.bump_user(instance.author_id, posts_count=-1)
+    counters.bump_group(instance.group_id, -1)
+    caching.bump(*_post_scopes(
+        author_id=instance.author_id, group_id=instance.group_id))
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.bump_post(instance.post_id, 1)
+        caching.bump(*_post_scopes(post_id=instance.post_id))
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    counters.bump_post(instance.post_id, -1)
+    caching.bump(*_post_scopes(post_id=instance.post_id))
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        caching.bump(
+            caching.INDEX, caching.NAMES, caching.group_scope(instance.pk))
+
+
+@receiver(post_save, sender=Follow)
+def follow_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.bump_user(instance.author_id, followers_count=1)
+        counters.bump_user(instance.user_id, following_count=1)
+        timeline.follow_changed(instance.author_id, 1)
+        timeline.backfill(instance.user_id, instance.author_id)
+        caching.bump(
+            caching.author_scope(instance.author_id),
+            caching.author_scope(instance.user_id),
+        )
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    counters.bump_user(instance.author_id, followers_count=-1)
+    counters.bump_user(instance.user_id, following_count=-1)
+    timeline.follow_changed(instance.author_id, -1)
+    timeline.prune(instance.user_id, instance.author_id)
+    caching.bump(
+        caching.author_scope(instance.author_id),
+        caching.author_scope(instance.user_id),
+    )
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, raw=False, update_fields=None,
+               **kwargs):
+    """Имя автора есть на всех страницах с постами; вход на сайт
+    (обновление last_login) кэш не сбрасывает."""
+    if raw or created or update_fields == frozenset(('last_login',)):
+        return
+    # Страницы групп кэшируются по версии своей группы.
+    group_ids = Post.objects.filter(
+        author_id=instance.pk, group_id__isnull=False
+    ).order_by().values_list('group_id', flat=True).distinct()
+    caching.bump(
+        caching.INDEX,
+        caching.NAMES,
+        caching.author_scope(instance.pk),
+        *(caching.group_scope(group_id) for group_id in group_ids),
+    )
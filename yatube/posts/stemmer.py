@@ -0,0 +1,125 @@
+"""Стеммер русского языка по алгоритму Snowball (Портер).
+
+Нужен поиску: в индекс и в запрос попадают основы слов, поэтому
+«пост», «посты» и «постами» находят друг друга.
+"""
+import re
+from functools import lru_cache
+
+VOWELS = 'аеиоуыэюя'
+
+
+def _endings(*groups):
+    """Окончания, отсортированные от длинных к коротким."""
+    return sorted(
+        (ending for group in groups for ending in group.split()),
+        key=len,
+        reverse=True,
+    )
+
+
+PERFECTIVE_GERUND_1 = _endings('в вши вшись')
+PERFECTIVE_GERUND_2 = _endings('ив ивши ившись ыв ывши ывшись')
+ADJECTIVE = _endings(
+    'ее ие ые ое ими ыми ей ий ый ой ем им ым ом его ого ему ому '
+    'их ых ую юю ая яя ою ею'
+)
+PARTICIPLE_1 = _endings('ем нн вш ющ щ')
+PARTICIPLE_2 = _endings('ивш ывш ующ')
+REFLEXIVE = _endings('ся сь')
+VERB_1 = _endings('ла на ете йте ли й л ем н ло но ет ют ны ть ешь нно')
+VERB_2 = _endings(
+    'ила ыла ена ейте уйте ите или ыли ей уй ил ыл им ым ен ило ыло '
+    'ено ят ует уют ит ыт ены ить ыть ишь ую ю'
+)
+NOUN = _endings(
+    'а ев ов ие ье е иями ями ами еи ии и ией ей ой ий й иям ям ием ем '
+    'ам ом о у ах иях ях ы ь ию ью ю ия ья я'
+)
+SUPERLATIVE = _endings('ейш ейше')
+DERIVATIONAL = _endings('ост ость')
+
+
+def _region(word, start=0):
+    """Позиция после первой согласной, идущей за гласной."""
+    for i in range(start + 1, len(word)):
+        if word[i] not in VOWELS and word[i - 1] in VOWELS:
+            return i + 1
+    return len(word)
+
+
+def _strip(rv, group_1=(), group_2=()):
+    """Отрезает окончание группы 2 или группы 1 после «а»/«я»."""
+    for ending in sorted((*group_1, *group_2), key=len, reverse=True):
+        if not rv.endswith(ending):
+            continue
+        if ending in group_2:
+            return rv[:-len(ending)]
+        if rv[:-len(ending)][-1:] in ('а', 'я'):
+            return rv[:-len(ending)]
+    return None
+
+
+def _adjectival(rv):
+    stripped = _strip(rv, group_2=ADJECTIVE)
+    if stripped is None:
+        return None
+    participle = _strip(stripped, PARTICIPLE_1, PARTICIPLE_2)
+    return stripped if participle is None else participle
+
+
+def _step_1(rv):
+    stripped = _strip(rv, PERFECTIVE_GERUND_1, PERFECTIVE_GERUND_2)
+    if stripped is not None:
+        return stripped
+    reflexive = _strip(rv, group_2=REFLEXIVE)
+    if reflexive is not None:
+        rv = reflexive
+    for step in (
+        _adjectival,
+        lambda rv: _strip(rv, VERB_1, VERB_2),
+        lambda rv: _strip(rv, group_2=NOUN),
+    ):
+        stripped = step(rv)
+        if stripped is not None:
+            return stripped
+    return rv
+
+
+# Слова в текстах повторяются, поэтому основы запоминаются:
+# переиндексация после импорта в разы быстрее.
+@lru_cache(maxsize=100000)
+def stem(word):
+    word = word.lower().replace('ё', 'е')
+    if not re.search('[а-я]', word):
+        return word
+    rv_start = next(
+        (i + 1 for i, char in enumerate(word) if char in VOWELS), len(word)
+    )
+    prefix, rv = word[:rv_start], word[rv_start:]
+    r2 = _region(word, _region(word)) - rv_start
+
+    rv = _step_1(rv)
+
+    # Шаг 2
+    if rv.endswith('и'):
+        rv = rv[:-1]
+
+    # Шаг 3
+    for ending in DERIVATIONAL:
+        if rv.endswith(ending) and len(rv) - len(ending) >= r2:
+            rv = rv[:-len(ending)]
+            break
+
+    # Шаг 4
+    if rv.endswith('нн'):
+        rv = rv[:-1]
+    else:
+        superlative = _strip(rv, group_2=SUPERLATIVE)
+        if superlative is not None:
+            rv = superlative
+            if rv.endswith('нн'):
+                rv = rv[:-1]
+        elif rv.endswith('ь'):
+            rv = rv[:-1]
+    return prefix + rv
@@ -0,0 +1,78 @@
+import io
+import json
+import os
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+
+from .. import benchmark
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class BenchmarkTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='group_test',
+            description='Тестовое описание',
+        )
+        Follow.objects.create(user=cls.user, author=cls.author)
+        for number in range(15):
+            post = Post.objects.create(
+                author=cls.author, text=f'Пост {number}', group=cls.group)
+        Comment.objects.create(post=post, author=cls.user, text='Коммент')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_run_measures_all_views(self):
+        """Проверка: все страницы замерены и база не изменилась"""
+        posts, comments = Post.objects.count(), Comment.objects.count()
+        results = benchmark.run(iterations=3, warmup=1)
+        self.assertEqual(set(results['views']), {
+            'index', 'group_posts', 'profile', 'post_detail',
+            'follow_index', 'add_comment', 'post_create',
+        })
+        for metrics in results['views'].values():
+            self.assertEqual(set(metrics), set(benchmark.METRICS))
+            self.assertGreater(metrics['queries'], 0)
+            self.assertLessEqual(metrics['p50_ms'], metrics['p99_ms'])
+        self.assertGreater(results['views']['index']['template_ms'], 0)
+        self.assertEqual(Post.objects.count(), posts)
+        self.assertEqual(Comment.objects.count(), comments)
+
+    def test_compare(self):
+        """Проверка: рост запросов и p95 сверх допуска - регрессия"""
+        metrics = dict.fromkeys(benchmark.METRICS, 10)
+        baseline = {'views': {'index': metrics}}
+        self.assertEqual(benchmark.compare(baseline, baseline), [])
+        results = {'views': {'index': {
+            **metrics, 'queries': 11, 'p95_ms': 20}}}
+        self.assertEqual(len(benchmark.compare(results, baseline)), 2)
+
+    def test_command_fails_on_regression(self):
+        """Проверка: команда падает, если страница стала хуже базы"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'baseline.json')
+            options = {
+                'iterations': 2, 'warmup': 1, 'baseline': path,
+                'stderr': io.StringIO(),
+            }
+            call_command('benchmark', 'index', save_baseline=True,
+                         **options)
+            with open(path, encoding='utf-8') as file:
+                saved = json.load(file)
+            call_command('benchmark', 'index', **options)
+            saved['views']['index']['queries'] -= 1
+            benchmark.save(saved, path)
+            with self.assertRaisesMessage(CommandError, 'index: queries'):
+                call_command('benchmark', 'index', **options)
@@ -0,0 +1,75 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Comment, Post
+
+User = get_user_model()
+
+
+@override_settings(COUNT_COMMENTS_PAGE=5)
+class CommentPagesTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='auth')
+        cls.post = Post.objects.create(author=cls.author, text='Пост')
+        for i in range(12):
+            user = User.objects.create_user(username=f'reader{i}')
+            Comment.objects.create(
+                post=cls.post, author=user, text=f'Комментарий {i}')
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def selects(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.guest_client.get(url)
+        count = sum(
+            query['sql'].startswith('SELECT')
+            for query in context.captured_queries
+        )
+        return response, count
+
+    def test_post_detail_renders_first_batch(self):
+        """Проверка: на странице поста только первая порция комментариев"""
+        response = self.guest_client.get(
+            reverse('posts:post_detail', args=[self.post.pk]))
+        comments = response.context['comments']
+        self.assertEqual(
+            [comment.text for comment in comments],
+            [f'Комментарий {i}' for i in range(11, 6, -1)],
+        )
+        self.assertTrue(comments.has_next())
+        self.assertContains(response, 'js-more-comments')
+
+    def test_fragment_loads_next_batches(self):
+        """Проверка: фрагмент отдает следующие порции без повторов"""
+        url = reverse('posts:post_comments', args=[self.post.pk])
+        response = self.guest_client.get(url)
+        seen = [comment.pk for comment in response.context['comments']]
+        while response.context['comments'].has_next():
+            cursor = response.context['comments'].next_cursor
+            response = self.guest_client.get(url, {'cursor': cursor})
+            seen += [comment.pk for comment in response.context['comments']]
+        self.assertEqual(len(seen), 12)
+        self.assertEqual(len(set(seen)), 12)
+        self.assertNotContains(response, 'js-more-comments')
+
+    def test_queries_do_not_depend_on_comments(self):
+        """Проверка: число запросов не растет вместе с комментариями"""
+        url = reverse('posts:post_detail', args=[self.post.pk])
+        # первый запрос заводит строку UserStats автора
+        self.guest_client.get(url)
+        cache.clear()
+        _, before = self.selects(url)
+        for i in range(10):
+            Comment.objects.create(
+                post=self.post, author=self.author, text='Еще')
+        cache.clear()
+        _, after = self.selects(url)
+        self.assertEqual(before, after)
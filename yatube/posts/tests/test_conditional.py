@@ -0,0 +1,122 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='group_test',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.author, text='Пост', group=cls.group)
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(ConditionalGetTests.reader)
+
+    def urls(self):
+        return (
+            reverse('posts:index'),
+            reverse('posts:group_list', args=[self.group.slug]),
+            reverse('posts:profile', args=[self.author.username]),
+            reverse('posts:post_detail', args=[self.post.pk]),
+            reverse('posts:follow_index'),
+        )
+
+    def test_not_modified(self):
+        """Проверка: совпавший ETag - 304 без рендера шаблона"""
+        for url in self.urls():
+            with self.subTest(url=url):
+                response = self.authorized_client.get(url)
+                self.assertEqual(response['Cache-Control'],
+                                 'private, no-cache')
+                with CaptureQueriesContext(connection) as context:
+                    response = self.authorized_client.get(
+                        url, HTTP_IF_NONE_MATCH=response['ETag'])
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response.content, b'')
+                self.assertFalse(response.templates)
+                self.assertLessEqual(len([
+                    query for query in context.captured_queries
+                    if query['sql'].startswith('SELECT')
+                ]), 4)
+
+    def test_if_modified_since(self):
+        """Проверка: If-Modified-Since по Last-Modified"""
+        url = reverse('posts:index')
+        last_modified = self.guest_client.get(url)['Last-Modified']
+        response = self.guest_client.get(
+            url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+    def test_changes_invalidate(self):
+        """Проверка: новый комментарий и правка поста меняют ETag"""
+        url = reverse('posts:post_detail', args=[self.post.pk])
+        etag = self.guest_client.get(url)['ETag']
+        Comment.objects.create(
+            post=self.post, author=self.reader, text='Комментарий')
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        self.post.text = 'Новый текст'
+        self.post.save()
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, 'Новый текст')
+
+    def test_etag_depends_on_user(self):
+        """Проверка: ETag гостя не подходит пользователю"""
+        url = reverse('posts:index')
+        etag = self.guest_client.get(url)['ETag']
+        response = self.authorized_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_etag_depends_on_csrf_token(self):
+        """Проверка: после повторного входа старый ETag не подходит,
+        форма с прежним токеном CSRF не берется из кэша браузера"""
+        url = reverse('posts:post_detail', args=[self.post.pk])
+        self.authorized_client.get(url)
+        etag = self.authorized_client.get(url)['ETag']
+        response = self.authorized_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.authorized_client.logout()
+        self.authorized_client.force_login(ConditionalGetTests.reader)
+        response = self.authorized_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_etag_scopes(self):
+        """Проверка: пост другого автора в другой группе не меняет ETag
+        страниц группы, профиля и поста, а свой - меняет"""
+        other_group = Group.objects.create(
+            title='Другая группа', slug='other', description='Описание')
+        other = User.objects.create_user(username='other')
+        urls = self.urls()[1:4]
+        etags = {url: self.guest_client.get(url)['ETag'] for url in urls}
+        Post.objects.create(author=other, text='Чужой', group=other_group)
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.guest_client.get(
+                    url, HTTP_IF_NONE_MATCH=etags[url])
+                self.assertEqual(response.status_code, 304)
+        Post.objects.create(author=self.author, text='Свой', group=self.group)
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.guest_client.get(
+                    url, HTTP_IF_NONE_MATCH=etags[url])
+                self.assertEqual(response.status_code, 200)
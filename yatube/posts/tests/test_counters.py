@@ -0,0 +1,92 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..counters import get_stats
+from ..models import Comment, Follow, Group, Post, UserStats
+
+User = get_user_model()
+
+
+class CountersTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='group_test',
+            description='Тестовое описание',
+        )
+        cls.other_group = Group.objects.create(
+            title='Другая группа',
+            slug='group_other',
+            description='Тестовое описание',
+        )
+
+    def setUp(self):
+        self.guest_client = Client()
+
+    def test_post_counters(self):
+        """Проверка: посты меняют счетчики автора и группы"""
+        post = Post.objects.create(
+            author=self.author, text='Тестовый пост', group=self.group)
+        self.assertEqual(get_stats(self.author).posts_count, 1)
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 1)
+        post.group = self.other_group
+        post.save()
+        self.group.refresh_from_db()
+        self.other_group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 0)
+        self.assertEqual(self.other_group.posts_count, 1)
+        post.delete()
+        self.other_group.refresh_from_db()
+        self.assertEqual(get_stats(self.author).posts_count, 0)
+        self.assertEqual(self.other_group.posts_count, 0)
+
+    def test_comment_counter(self):
+        """Проверка: комментарии меняют счетчик поста"""
+        post = Post.objects.create(author=self.author, text='Тестовый пост')
+        comment = Comment.objects.create(
+            post=post, author=self.reader, text='Комментарий')
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        comment.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+
+    def test_follow_counters(self):
+        """Проверка: подписка меняет счетчики обоих пользователей"""
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(get_stats(self.author).followers_count, 1)
+        self.assertEqual(get_stats(self.reader).following_count, 1)
+        follow.delete()
+        self.assertEqual(get_stats(self.author).followers_count, 0)
+        self.assertEqual(get_stats(self.reader).following_count, 0)
+
+    def test_recount_repairs_drift(self):
+        """Проверка: команда recount исправляет расхождения"""
+        Post.objects.bulk_create([
+            Post(author=self.author, text='Пост', group=self.group)
+            for _ in range(3)
+        ])
+        UserStats.objects.filter(user=self.author).update(posts_count=42)
+        call_command('recount', stdout=StringIO())
+        self.group.refresh_from_db()
+        self.assertEqual(get_stats(self.author).posts_count, 3)
+        self.assertEqual(self.group.posts_count, 3)
+
+    def test_profile_reads_counters(self):
+        """Проверка: профиль показывает счетчики без COUNT(*)"""
+        Post.objects.create(author=self.author, text='Тестовый пост')
+        get_stats(self.author)
+        response = self.guest_client.get(
+            reverse('posts:profile', args=[self.author.username]))
+        self.assertEqual(response.context['posts_count'], 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(response.context['stats'].followers_count, 0)
@@ -0,0 +1,92 @@
+import csv
+import gzip
+import io
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..exporter import iter_rows
+from ..models import Comment, Group, Post
+
+User = get_user_model()
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='group_test',
+            description='Тестовое описание',
+        )
+        for i in range(7):
+            post = Post.objects.create(
+                author=cls.author, text=f'Пост {i}',
+                group=cls.group if i % 2 else None)
+            Comment.objects.create(
+                post=post, author=cls.author, text=f'Комментарий {i}')
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(ExportTests.author)
+
+    def get(self, kind, **params):
+        response = self.authorized_client.get(
+            reverse('posts:export', args=[kind]), params)
+        return response, b''.join(response.streaming_content)
+
+    def test_chunks_cover_all_rows(self):
+        """Проверка: порции по (дата, id) идут без пропусков и повторов"""
+        rows = list(iter_rows('post', Post.objects.all(), chunk_size=3))
+        self.assertEqual(
+            [row['text'] for row in rows], [f'Пост {i}' for i in range(7)])
+
+    def test_ndjson_filters(self):
+        """Проверка: NDJSON по группе в формате импорта"""
+        response, body = self.get('post', group=self.group.slug)
+        self.assertTrue(response.streaming)
+        rows = [json.loads(line) for line in body.decode().splitlines()]
+        self.assertEqual([row['text'] for row in rows],
+                         ['Пост 1', 'Пост 3', 'Пост 5'])
+        self.assertEqual(rows[0]['type'], 'post')
+        self.assertEqual(rows[0]['author'], 'author')
+
+    def test_csv_gzip(self):
+        """Проверка: CSV со сжатием gzip"""
+        response, body = self.get('comment', format='csv', gzip='1')
+        self.assertIn('comments.csv.gz', response['Content-Disposition'])
+        rows = list(csv.DictReader(io.StringIO(
+            gzip.decompress(body).decode())))
+        self.assertEqual(len(rows), 7)
+        self.assertEqual(rows[0]['text'], 'Комментарий 0')
+
+    def test_bad_params(self):
+        """Проверка: неверные параметры дают 400 и 404"""
+        response = self.authorized_client.get(
+            reverse('posts:export', args=['post']), {'since': 'вчера'})
+        self.assertEqual(response.status_code, 400)
+        response = self.authorized_client.get(
+            reverse('posts:export', args=['user']))
+        self.assertEqual(response.status_code, 404)
+
+    def test_command_round_trip(self):
+        """Проверка: выгрузку команды можно загрузить импортом"""
+        handle, path = tempfile.mkstemp(suffix='.ndjson')
+        os.close(handle)
+        self.addCleanup(os.remove, path)
+        call_command('export_content', 'post', '-o', path,
+                     '--since', '2000-01-01', stdout=StringIO())
+        Post.objects.all().delete()
+        call_command('import_content', path,
+                     stdout=StringIO(), stderr=StringIO())
+        self.assertEqual(Post.objects.count(), 7)
+        self.assertEqual(
+            Post.objects.filter(group=self.group).count(), 3)
@@ -0,0 +1,91 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Follow, Group, Post
+
+User = get_user_model()
+
+
+class FeedQueriesTests(TestCase):
+    """Число запросов на страницу ленты не зависит от числа постов."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='group_test',
+            description='Тестовое описание',
+        )
+        for i in range(12):
+            author = User.objects.create_user(
+                username=f'author{i}', first_name=f'Имя{i}')
+            group = Group.objects.create(
+                title=f'Группа {i}', slug=f'group_{i}', description='-')
+            Post.objects.create(author=author, text=f'Пост {i}', group=group)
+            Post.objects.create(
+                author=author, text=f'Пост {i}', group=cls.group)
+            Follow.objects.create(user=cls.reader, author=author)
+        cls.author = author
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(FeedQueriesTests.reader)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        # SAVEPOINT/RELEASE добавляет ATOMIC_REQUESTS, это не чтения
+        return len([
+            query for query in context.captured_queries
+            if query['sql'].startswith('SELECT')
+        ])
+
+    def test_fixed_query_count(self):
+        """Проверка: 1 и 20 постов на странице - одинаково запросов"""
+        # в каждом числе один запрос даты для Last-Modified
+        expected = {
+            reverse('posts:index'): 5,
+            reverse('posts:group_list', args=[self.group.slug]): 5,
+            reverse('posts:profile', args=[self.author.username]): 7,
+            reverse('posts:follow_index'): 6,
+        }
+        for url, queries in expected.items():
+            with self.subTest(url=url):
+                self.count_queries(url)
+                with override_settings(COUNT_POSTS_PAGE=1):
+                    cache.clear()
+                    small = self.count_queries(url)
+                with override_settings(COUNT_POSTS_PAGE=20):
+                    cache.clear()
+                    large = self.count_queries(url)
+                self.assertEqual(small, large)
+                self.assertEqual(large, queries)
+
+    def card_renders(self, url):
+        response = self.client.get(url)
+        return [template.name for template in response.templates].count(
+            'posts/includes/post.html')
+
+    def test_only_changed_cards_rerender(self):
+        """Проверка: после правки перерисовываются только ее карточки"""
+        url = reverse('posts:index')
+        self.assertEqual(self.card_renders(url), settings.COUNT_POSTS_PAGE)
+        post = Post.objects.select_related('author').first()
+        post.text = 'Исправленный пост'
+        post.save()
+        self.assertEqual(self.card_renders(url), 1)
+        self.assertContains(self.client.get(url), 'Исправленный пост')
+        post.author.first_name = 'Переименован'
+        post.author.save()
+        self.assertEqual(
+            self.card_renders(url),
+            Post.objects.filter(author=post.author).count())
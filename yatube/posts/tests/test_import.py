@@ -0,0 +1,161 @@
+import json
+import os
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+
+from .. import importer
+from ..importer import Importer
+from ..models import Comment, Follow, Group, Post, TimelineEntry
+from ..search import search
+
+User = get_user_model()
+
+
+class ImportTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='group_test',
+            description='Тестовое описание',
+        )
+
+    def write(self, text, suffix):
+        handle, path = tempfile.mkstemp(suffix=suffix)
+        with os.fdopen(handle, 'w', encoding='utf-8') as file:
+            file.write(text)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def run_import(self, path, *args):
+        out, err = StringIO(), StringIO()
+        call_command('import_content', path, *args, stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def test_ndjson(self):
+        """Проверка: посты, комментарии и подписки из NDJSON"""
+        rows = [
+            {'type': 'follow', 'user': 'reader', 'author': 'author'},
+            {'type': 'post', 'id': 500, 'author': 'author',
+             'group': 'group_test', 'text': 'Импортированный дневник',
+             'pub_date': '2020-01-02T03:04:05'},
+            {'type': 'comment', 'post': 500, 'author': 'reader',
+             'text': 'Комментарий'},
+        ]
+        path = self.write(
+            '\n'.join(json.dumps(row) for row in rows) + '\n\n', '.ndjson')
+        out, _ = self.run_import(path, '--batch-size', '2')
+        self.assertIn('постов 1, комментариев 1, подписок 1; ошибок 0', out)
+        post = Post.objects.get(pk=500)
+        self.assertEqual(post.pub_date.year, 2020)
+        self.assertEqual((post.group, post.comments_count), (self.group, 1))
+        self.assertEqual(
+            Group.objects.get(pk=self.group.pk).posts_count, 1)
+        self.assertEqual(self.author.stats.posts_count, 1)
+        self.assertEqual(self.reader.stats.following_count, 1)
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.reader, post=post).exists())
+        self.assertEqual(list(search('дневники', 10)), [post])
+
+    def test_csv_and_errors(self):
+        """Проверка: CSV и отчет о строках с ошибками"""
+        path = self.write(
+            'author,text,group\n'
+            'author,Первый,\n'
+            'nobody,Второй,\n'
+            'author,,\n'
+            'author,Третий,missing\n',
+            '.csv',
+        )
+        out, err = self.run_import(path, '--type', 'post')
+        self.assertIn('постов 1', out)
+        self.assertIn('ошибок 3', out)
+        self.assertIn("строка 3: нет пользователя 'nobody'", err)
+        self.assertIn('строка 4: пустое поле text', err)
+        self.assertEqual(Post.objects.get().text, 'Первый')
+
+    def test_bad_rows_are_skipped(self):
+        """Проверка: битые строки и ссылки не прерывают импорт"""
+        Post.objects.create(author=self.author, text='Старый', id=7)
+        path = self.write(
+            'не json\n'
+            '{"type": "post", "id": 7, "author": "author", "text": "Дубль"}\n'
+            '{"type": "comment", "post": 8, "author": "reader", '
+            '"text": "Нет поста"}\n'
+            '{"type": "follow", "user": "author", "author": "author"}\n'
+            '{"type": "follow", "user": "reader", "author": "author"}\n'
+            '{"type": "follow", "user": "reader", "author": "author"}\n',
+            '.ndjson',
+        )
+        out, _ = self.run_import(path)
+        self.assertIn('ошибок 4', out)
+        self.assertEqual(Post.objects.get(pk=7).text, 'Старый')
+        self.assertEqual(Comment.objects.count(), 0)
+        self.assertEqual(Follow.objects.count(), 1)
+
+    def test_malformed_fields(self):
+        """Проверка: поля неверного типа и несуществующая дата - ошибки
+        строк, а не падение импорта"""
+        rows = [
+            {'type': 'post', 'author': 'author', 'text': 'Дата',
+             'pub_date': '2020-13-45T00:00:00'},
+            {'type': 'post', 'author': 'author', 'text': 123},
+            {'type': 'post', 'author': ['a'], 'text': 'Список'},
+            {'type': 'post', 'author': 'author', 'text': 'Группа',
+             'group': {'slug': 'group_test'}},
+            {'type': ['post'], 'author': 'author', 'text': 'Тип'},
+            {'type': 'post', 'author': 'author', 'text': 'Целый'},
+        ]
+        path = self.write(
+            '\n'.join(json.dumps(row) for row in rows), '.ndjson')
+        out, err = self.run_import(path)
+        self.assertIn('постов 1', out)
+        self.assertIn('ошибок 5', out)
+        self.assertIn('строка 1: неверная дата в поле pub_date', err)
+        self.assertIn('строка 2: поле text должно быть строкой: 123', err)
+        self.assertIn("строка 3: поле author должно быть строкой", err)
+        self.assertEqual(Post.objects.get().text, 'Целый')
+
+    def test_recounts_only_commented_posts(self):
+        """Проверка: счетчик комментариев пересчитан только у постов
+        из импорта"""
+        commented = Post.objects.create(author=self.author, text='Первый')
+        other = Post.objects.create(author=self.author, text='Второй')
+        Post.objects.filter(pk=other.pk).update(comments_count=5)
+        path = self.write(json.dumps({
+            'type': 'comment', 'post': commented.pk, 'author': 'reader',
+            'text': 'Комментарий',
+        }), '.ndjson')
+        self.run_import(path)
+        self.assertEqual(Post.objects.get(pk=commented.pk).comments_count, 1)
+        self.assertEqual(Post.objects.get(pk=other.pk).comments_count, 5)
+
+    def test_flush_every_rows(self):
+        """Проверка: счетчики и поиск обновляются раз в flush_rows строк,
+        накопленное между обновлениями не копится"""
+        rows = [(number, {
+            'type': 'post', 'author': 'author', 'group': 'group_test',
+            'text': f'Дневник номер {number}',
+        }) for number in range(1, 6)]
+        job = Importer(batch_size=1, flush_rows=2)
+        with mock.patch('posts.importer.refresh',
+                        wraps=importer.refresh) as refresh:
+            job.run(iter(rows))
+            self.assertEqual(refresh.call_count, 2)
+            self.assertEqual(job.touched_users, {self.author.pk})
+            self.assertEqual(len(search('дневники', 10)), 4)
+            job.finish()
+        self.assertEqual(refresh.call_count, 3)
+        self.assertEqual((job.users, job.touched_users), ({}, set()))
+        self.assertEqual(len(search('дневники', 10)), 5)
+        self.assertEqual(Group.objects.get(pk=self.group.pk).posts_count, 5)
+        self.assertEqual(
+            User.objects.get(pk=self.author.pk).stats.posts_count, 5)
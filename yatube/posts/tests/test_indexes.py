@@ -0,0 +1,107 @@
+import re
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import IntegrityError, connection, transaction
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post
+from ..paginator import encode_cursor
+
+User = get_user_model()
+
+TABLES = (
+    'posts_post', 'posts_comment', 'posts_follow', 'posts_timelineentry'
+)
+FULL_SCAN = re.compile(r'SCAN (TABLE )?(?P<table>\w+)(?! USING)')
+
+
+class QueryPlanTests(TestCase):
+    """EXPLAIN QUERY PLAN запросов каждой view: только поиск по индексу."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='group_test',
+            description='Тестовое описание',
+        )
+        for i in range(3):
+            cls.post = Post.objects.create(
+                author=cls.author, text=f'Пост {i}', group=cls.group)
+            Comment.objects.create(
+                post=cls.post, author=cls.reader, text='Комментарий')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(QueryPlanTests.reader)
+
+    def plans(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.authorized_client.get(url)
+            # у выгрузки запросы идут, пока читается поток
+            b''.join(getattr(response, 'streaming_content', ()))
+        with connection.cursor() as cursor:
+            for query in context.captured_queries:
+                sql = query['sql']
+                if not sql.startswith('SELECT'):
+                    continue
+                if not any(table in sql for table in TABLES):
+                    continue
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+                yield sql, [row[-1] for row in cursor.fetchall()]
+
+    def test_views_use_indexes(self):
+        """Проверка: запросы лент, поста и подписок идут по индексам"""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:index') + '?page=1',
+            reverse('posts:group_list', args=[self.group.slug]),
+            reverse('posts:profile', args=[self.author.username]),
+            reverse('posts:post_detail', args=[self.post.pk]),
+            reverse('posts:post_comments', args=[self.post.pk]),
+            reverse('posts:export', args=['post']),
+            reverse('posts:export', args=['comment']),
+            reverse('posts:follow_index'),
+            reverse('posts:follow_index') + '?cursor=',
+        )
+        for url in urls:
+            for sql, plan in self.plans(url):
+                with self.subTest(url=url, sql=sql):
+                    for step in plan:
+                        match = FULL_SCAN.search(step)
+                        self.assertFalse(
+                            match and match.group('table') in TABLES
+                            and 'COUNT' not in sql,
+                            step
+                        )
+                        self.assertNotIn('TEMP B-TREE FOR ORDER BY', step)
+
+    def test_follow_cursor_seeks_timeline_index(self):
+        """Проверка: страница ленты подписок по курсору начинает чтение
+        индекса ленты с позиции курсора"""
+        post = Post.objects.order_by('pub_date', 'pk').first()
+        url = reverse('posts:follow_index') + '?cursor=' + encode_cursor(
+            post.pub_date, post.pk, 'n')
+        plans = [
+            plan for sql, plan in self.plans(url)
+            if 'cursor_date' in sql
+        ]
+        self.assertEqual(len(plans), 1)
+        self.assertIn(
+            'timeline_user_date_post_idx (user_id=? AND pub_date<?)',
+            ' '.join(plans[0]))
+        self.assertNotIn('TEMP B-TREE', ' '.join(plans[0]))
+
+    def test_follow_unique(self):
+        """Проверка: повторная подписка не создает дубль"""
+        with self.assertRaises(IntegrityError):
+            with transaction.atomic():
+                Follow.objects.create(user=self.reader, author=self.author)
@@ -0,0 +1,169 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from yatube.settings import COUNT_POSTS_PAGE as CPP
+
+from ..models import Follow, Group, Post
+from ..paginator import (ELLIPSIS, CursorPaginator, WindowedPaginator,
+                         decode_cursor, encode_cursor)
+
+User = get_user_model()
+
+
+class CursorPaginatorTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='group_test',
+            description='Тестовое описание',
+        )
+        Post.objects.bulk_create([
+            Post(text=f'Тестовый пост {i}', author=cls.user, group=cls.group)
+            for i in range(CPP * 2 + 3)
+        ])
+        Follow.objects.create(user=cls.reader, author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(CursorPaginatorTests.reader)
+
+    def walk(self, paginator):
+        """Проходит ленту по курсорам вперед, возвращает страницы."""
+        pages = [paginator.get_page()]
+        while pages[-1].has_next():
+            pages.append(paginator.get_page(pages[-1].next_cursor))
+        return pages
+
+    def test_cursor_roundtrip(self):
+        """Проверка: курсор кодирует и декодирует позицию"""
+        post = Post.objects.first()
+        token = encode_cursor(post.pub_date, post.pk, 'n')
+        self.assertEqual(decode_cursor(token), (post.pub_date, post.pk, 'n'))
+
+    def test_walk_forward_and_back(self):
+        """Проверка: проход вперед и назад дает ту же ленту"""
+        paginator = CursorPaginator(Post.objects.all(), CPP)
+        pages = self.walk(paginator)
+        forward = [post.pk for page in pages for post in page]
+        expected = list(
+            Post.objects.order_by('-pub_date', '-pk').values_list(
+                'pk', flat=True)
+        )
+        self.assertEqual(forward, expected)
+        self.assertEqual(len(pages[-1]), Post.objects.count() % CPP)
+        self.assertFalse(pages[0].has_previous())
+        previous = paginator.get_page(pages[-1].previous_cursor)
+        self.assertEqual(list(previous), list(pages[-2]))
+
+    def test_invalid_cursor_returns_first_page(self):
+        """Проверка: испорченный курсор открывает первую страницу"""
+        paginator = CursorPaginator(Post.objects.all(), CPP)
+        page = paginator.get_page('испорчен')
+        self.assertEqual(list(page), list(paginator.get_page()))
+
+    def test_feed_views_accept_cursor(self):
+        """Проверка: все ленты поддерживают ?cursor="""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', args=[self.group.slug]),
+            reverse('posts:profile', args=[self.user.username]),
+            reverse('posts:follow_index'),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.authorized_client.get(url + '?cursor=')
+                page_obj = response.context['page_obj']
+                self.assertTrue(page_obj.is_cursor)
+                self.assertEqual(len(page_obj), CPP)
+                response = self.authorized_client.get(
+                    url + '?cursor=' + page_obj.next_cursor)
+                self.assertEqual(len(response.context['page_obj']), CPP)
+                self.assertContains(response, '?cursor=')
+
+    @override_settings(PAGINATION_MODE='cursor')
+    def test_cursor_mode_setting(self):
+        """Проверка: PAGINATION_MODE='cursor' включает курсоры по умолчанию"""
+        response = self.guest_client.get(reverse('posts:index'))
+        self.assertTrue(response.context['page_obj'].is_cursor)
+        response = self.guest_client.get(reverse('posts:index') + '?page=2')
+        self.assertEqual(response.context['page_obj'].number, 2)
+
+
+class WindowedPaginatorTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        Post.objects.bulk_create([
+            Post(text=f'Тестовый пост {i}', author=cls.user)
+            for i in range(CPP * 20 + 3)
+        ])
+
+    def setUp(self):
+        cache.clear()
+        self.posts = Post.objects.all()
+
+    def test_window(self):
+        """Проверка: окно номеров вокруг текущей страницы с пропусками"""
+        paginator = WindowedPaginator(self.posts, 1, count=200000)
+        self.assertEqual(
+            paginator.get_page(100).window,
+            [1, ELLIPSIS, 98, 99, 100, 101, 102, ELLIPSIS, 200000],
+        )
+        self.assertEqual(paginator.get_page(1).window,
+                         [1, 2, 3, ELLIPSIS, 200000])
+        self.assertEqual(paginator.get_page(5).window,
+                         [1, 2, 3, 4, 5, 6, 7, ELLIPSIS, 200000])
+
+    def test_feed_renders_window(self):
+        """Проверка: лента выводит окно, а не все номера страниц"""
+        response = self.client.get(reverse('posts:index') + '?page=10')
+        page_obj = response.context['page_obj']
+        self.assertEqual(page_obj.window,
+                         [1, ELLIPSIS, 8, 9, 10, 11, 12, ELLIPSIS, 21])
+        self.assertContains(response, '?page=21')
+        self.assertNotContains(response, '?page=15"')
+        self.assertContains(response, '&hellip;', count=2)
+
+    @override_settings(PAGINATION_MAX_COUNT=CPP * 5)
+    def test_too_many_rows_degrade_to_next_previous(self):
+        """Проверка: без числа записей в окне только соседние страницы"""
+        paginator = WindowedPaginator(self.posts, CPP)
+        self.assertIsNone(paginator.count)
+        page = paginator.get_page(10)
+        self.assertEqual(len(page), CPP)
+        self.assertTrue(page.has_next())
+        self.assertEqual(page.window, [1, ELLIPSIS, 8, 9, 10, 11, ELLIPSIS])
+        last = paginator.get_page(21)
+        self.assertEqual(len(last), 3)
+        self.assertFalse(last.has_next())
+        self.assertEqual(paginator.get_page(99).number, 1)
+
+    def test_count_is_cached(self):
+        """Проверка: число записей кэшируется, устаревшее не режет ленту"""
+        self.assertEqual(WindowedPaginator(self.posts, CPP).count,
+                         self.posts.count())
+        Post.objects.create(text='Новый пост', author=self.user)
+        with self.assertNumQueries(1):
+            page = WindowedPaginator(self.posts, CPP).get_page(21)
+            self.assertEqual(len(page), 4)
+            self.assertFalse(page.has_next())
+
+    def test_known_count_reads_rows_lazily(self):
+        """Проверка: с готовым счетчиком записи читаются только по нужде"""
+        paginator = WindowedPaginator(self.posts, CPP, count=CPP * 2)
+        with self.assertNumQueries(0):
+            page = paginator.get_page(2)
+            self.assertFalse(page.has_next())
+            self.assertEqual(page.window, [1, 2])
+            self.assertEqual(paginator.get_page(5).number, 2)
+        with self.assertNumQueries(1):
+            self.assertEqual(len(page), CPP)
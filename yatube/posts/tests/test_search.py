@@ -0,0 +1,92 @@
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Post
+from ..search import highlight, parse_query, search
+from ..stemmer import stem
+
+User = get_user_model()
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='admin')
+        cls.post = Post.objects.create(
+            author=cls.user,
+            text='Пишу дневник о программировании на Python',
+        )
+        cls.other = Post.objects.create(
+            author=cls.user,
+            text='Сегодня гуляли в парке, дневники не писали',
+        )
+        for i in range(12):
+            Post.objects.create(author=cls.user, text=f'Заметка номер {i}')
+
+    def setUp(self):
+        self.guest_client = Client()
+
+    def test_stemmer(self):
+        """Проверка: разные формы слова дают одну основу"""
+        self.assertEqual(stem('постами'), stem('посты'))
+        self.assertEqual(stem('дневник'), stem('дневники'))
+        self.assertEqual(stem('Ёлками'), 'елк')
+
+    def test_search_stems_and_prefix(self):
+        """Проверка: поиск по словоформам и по префиксу"""
+        found = list(search('дневники', 10))
+        self.assertEqual(set(found), {self.post, self.other})
+        found = list(search('программ*', 10))
+        self.assertEqual(found, [self.post])
+        self.assertIn('<mark>программировании</mark>', found[0].highlight)
+        self.assertEqual(list(search('"', 10)), [])
+
+    def test_index_follows_edits(self):
+        """Проверка: индекс обновляется при правке и удалении поста"""
+        post = Post.objects.create(author=self.user, text='Про программы')
+        post.text = 'Текст про котов'
+        post.save()
+        self.assertEqual(list(search('программ*', 10)), [self.post])
+        self.assertEqual(list(search('коты', 10)), [post])
+        post.delete()
+        self.assertEqual(list(search('коты', 10)), [])
+
+    def test_search_cursor_pages(self):
+        """Проверка: выдача листается курсором без повторов"""
+        page = search('заметка', 5)
+        seen = [post.pk for post in page]
+        while page.has_next():
+            page = search('заметка', 5, cursor=page.next_cursor)
+            seen += [post.pk for post in page]
+        self.assertEqual(len(seen), 12)
+        self.assertEqual(len(set(seen)), 12)
+        previous = search('заметка', 5, cursor=page.previous_cursor)
+        self.assertEqual(len(previous), 5)
+
+    def test_search_view(self):
+        """Проверка: страница /search/ выводит подсвеченные результаты"""
+        response = self.guest_client.get(
+            reverse('posts:search'), {'q': 'заметки'})
+        self.assertEqual(len(response.context['page_obj']), 10)
+        self.assertContains(response, '<mark>Заметка</mark>')
+        self.assertContains(response, 'q=%D0%B7')
+
+    def test_admin_search_uses_index(self):
+        """Проверка: поиск в админке идет по индексу"""
+        client = Client()
+        client.force_login(self.admin)
+        response = client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'дневники'})
+        self.assertEqual(response.context['cl'].result_count, 2)
+
+    def test_highlight_escapes(self):
+        """Проверка: подсветка экранирует HTML"""
+        text = '<b>пост</b>'
+        self.assertEqual(
+            highlight(text, parse_query('пост')),
+            '&lt;b&gt;<mark>пост</mark>&lt;/b&gt;'
+        )
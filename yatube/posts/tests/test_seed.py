@@ -0,0 +1,70 @@
+import io
+import shutil
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db.models import F
+from django.test import TestCase, override_settings
+
+from ..exporter import parse_moment
+from ..models import Comment, Follow, Group, Post, User, UserStats
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class SeedTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def seed(self, **options):
+        call_command('seed', scale=0.02, stdout=io.StringIO(),
+                     stderr=io.StringIO(), **options)
+
+    def snapshot(self):
+        return list(Post.objects.order_by('pk').values_list(
+            'pk', 'author__username', 'group__slug', 'text', 'pub_date'))
+
+    def test_sizes_and_counters(self):
+        """Проверка: объемы по scale, счетчики и ленты пересчитаны"""
+        self.seed(images=1, image_ratio=0.5)
+        self.assertEqual(User.objects.count(), 20)
+        self.assertEqual(Group.objects.count(), 1)
+        self.assertEqual(Post.objects.count(), 200)
+        self.assertEqual(Comment.objects.count(), 400)
+        self.assertTrue(Follow.objects.exists())
+        self.assertFalse(Follow.objects.filter(
+            user=F('author')).exists())
+        stats = UserStats.objects.get(user=Post.objects.first().author)
+        self.assertEqual(stats.posts_count, Post.objects.filter(
+            author_id=stats.user_id).count())
+        post = Post.objects.exclude(image='').first()
+        self.assertIn('card', post.thumbnail_urls)
+        user = User.objects.first()
+        self.assertTrue(self.client.login(
+            username=user.username, password='seed-password'))
+
+    def test_same_seed_same_data(self):
+        """Проверка: одно зерно - одни и те же данные"""
+        self.seed(seed=7, images=0)
+        first = self.snapshot()
+        User.objects.all().delete()
+        Group.objects.all().delete()
+        self.seed(seed=7, images=0)
+        self.assertEqual(self.snapshot(), first)
+        User.objects.all().delete()
+        Group.objects.all().delete()
+        self.seed(seed=8, images=0)
+        self.assertNotEqual(self.snapshot(), first)
+
+    def test_end(self):
+        """Проверка: даты отсчитываются от --end"""
+        self.seed(images=0, end='2020-06-01')
+        newest = Post.objects.order_by('-pub_date').first().pub_date
+        end = parse_moment('2020-06-01')
+        self.assertLessEqual(newest, end)
+        self.assertGreater(newest, end - timedelta(days=3))
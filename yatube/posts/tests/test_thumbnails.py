@@ -0,0 +1,177 @@
+import io
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from ..images import render_variants, variant_urls
+from ..models import Post
+from ..thumbnails import generate
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+User = get_user_model()
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class ThumbnailTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(ThumbnailTests.user)
+
+    def upload(self, name='small.gif'):
+        return SimpleUploadedFile(
+            name=name, content=SMALL_GIF, content_type='image/gif')
+
+    def test_form_upload_generates_thumbnails(self):
+        """Проверка: миниатюры готовы сразу после сохранения формы"""
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Пост с картинкой', 'image': self.upload()},
+        )
+        post = Post.objects.get(text='Пост с картинкой')
+        url = post.thumbnail_urls['card']
+        self.assertTrue(os.path.exists(self.media_path(url)))
+        response = self.authorized_client.get(reverse('posts:index'))
+        self.assertContains(response, url)
+
+    def photo(self):
+        """JPEG 3000x1500 с EXIF: камера и поворот на 90 градусов."""
+        exif = Image.Exif()
+        exif[0x010F] = 'Camera'
+        exif[0x0112] = 6
+        buffer = io.BytesIO()
+        Image.new('RGB', (3000, 1500), 'red').save(
+            buffer, 'JPEG', exif=exif.tobytes())
+        return SimpleUploadedFile(
+            name='photo.jpg', content=buffer.getvalue(),
+            content_type='image/jpeg')
+
+    def media_path(self, url):
+        return os.path.join(TEMP_MEDIA_ROOT, url[len(settings.MEDIA_URL):])
+
+    def test_original_is_sanitized(self):
+        """Проверка: оригинал повернут, уменьшен и без EXIF"""
+        post = Post.objects.create(
+            author=self.user, text='Фото', image=self.photo())
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.size, (1280, 2560))
+            self.assertEqual(len(image.getexif()), 0)
+
+    def test_responsive_variants(self):
+        """Проверка: варианты всех ширин и форматов попадают в srcset"""
+        post = Post.objects.create(
+            author=self.user, text='Фото', image=self.photo())
+        post.refresh_from_db()
+        urls = post.thumbnail_urls
+        types = [type_ for type_, _ in urls['sources']]
+        self.assertEqual(types[-2:], ['image/webp', 'image/jpeg'])
+        for _, srcset in urls['sources']:
+            widths = [item.split()[1] for item in srcset.split(', ')]
+            self.assertEqual(widths, ['480w', '960w'])
+        with Image.open(self.media_path(urls['card'])) as image:
+            self.assertEqual(image.format, 'JPEG')
+            self.assertEqual(image.size, (960, 339))
+        response = self.authorized_client.get(reverse('posts:index'))
+        self.assertContains(response, '<source type="image/webp"')
+        self.assertContains(response, urls['card'])
+
+    def test_new_image_replaces_thumbnails(self):
+        """Проверка: новая картинка сбрасывает старые миниатюры"""
+        post = Post.objects.create(
+            author=self.user, text='Пост', image=self.upload())
+        post.refresh_from_db()
+        old_urls = post.thumbnail_urls
+        post.image = self.upload('other.gif')
+        with override_settings(THUMBNAIL_WORKERS=2):
+            post.save()
+        post = Post.objects.get(pk=post.pk)
+        self.assertEqual(post.thumbnail_urls, {})
+        response = self.authorized_client.get(
+            reverse('posts:post_detail', args=[post.pk]))
+        self.assertContains(response, post.image.url)
+        self.assertNotEqual(generate(post.pk, post.image.name), old_urls)
+
+    def variant_paths(self, post):
+        return [self.media_path(url)
+                for url in variant_urls(post.thumbnail_urls)]
+
+    def test_old_variants_are_deleted(self):
+        """Проверка: файлы вариантов удаляются при смене картинки и
+        удалении поста"""
+        post = Post.objects.create(
+            author=self.user, text='Фото', image=self.photo())
+        post.refresh_from_db()
+        old_paths = self.variant_paths(post)
+        self.assertEqual(
+            len(old_paths), 2 * len(post.thumbnail_urls['sources']))
+        self.assertTrue(all(map(os.path.exists, old_paths)))
+        post.image = self.upload()
+        post.save()
+        new_paths = self.variant_paths(Post.objects.get(pk=post.pk))
+        self.assertTrue(all(map(os.path.exists, new_paths)))
+        self.assertFalse(any(map(os.path.exists, old_paths)))
+        post.delete()
+        self.assertFalse(any(map(os.path.exists, new_paths)))
+
+    def test_stale_variants_are_deleted(self):
+        """Проверка: варианты, посчитанные для замененной картинки,
+        не остаются на диске"""
+        post = Post.objects.create(
+            author=self.user, text='Пост', image=self.upload())
+
+        def replace_image(field_file):
+            Post.objects.filter(pk=post.pk).update(image='posts/other.gif')
+            return render_variants(field_file)
+
+        with mock.patch('posts.images.render_variants', replace_image):
+            urls = generate(post.pk, post.image.name)
+        self.assertTrue(urls)
+        self.assertFalse(any(
+            os.path.exists(self.media_path(url))
+            for url in variant_urls(urls)))
+
+    def test_stale_job_is_skipped(self):
+        """Проверка: задача для уже замененной картинки ничего не пишет"""
+        post = Post.objects.create(
+            author=self.user, text='Пост', image=self.upload())
+        self.assertIsNone(generate(post.pk, 'posts/old.gif'))
+
+    def test_thumbnails_reset_feed_fragments(self):
+        """Проверка: готовые миниатюры сразу видны в закэшированных лентах"""
+        with override_settings(THUMBNAIL_WORKERS=2):
+            post = Post.objects.create(
+                author=self.user, text='Пост', image=self.upload())
+        url = reverse('posts:index')
+        response = self.authorized_client.get(url)
+        self.assertNotContains(response, '<source type="image/webp"')
+        generate(post.pk, post.image.name)
+        response = self.authorized_client.get(url)
+        self.assertContains(response, '<source type="image/webp"')
@@ -0,0 +1,102 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from ..models import Follow, Post, TimelineEntry
+from ..timeline import follow_posts, hot_authors
+
+User = get_user_model()
+
+
+class TimelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.post = Post.objects.create(
+            author=cls.author,
+            text='Тестовый пост до подписки',
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(TimelineTests.reader)
+
+    def test_follow_backfills_timeline(self):
+        """Проверка: при подписке старые посты автора попадают в ленту"""
+        self.authorized_client.get(
+            reverse('posts:profile_follow', args=[self.author.username]))
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.reader, post=self.post).exists())
+
+    def test_new_post_fans_out(self):
+        """Проверка: новый пост раскладывается по лентам подписчиков"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(author=self.author, text='Новый пост')
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.reader, post=post).exists())
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        self.assertEqual(response.context['page_obj'][0], post)
+
+    def test_unfollow_prunes_timeline(self):
+        """Проверка: после отписки посты автора убираются из ленты"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.authorized_client.get(
+            reverse('posts:profile_unfollow', args=[self.author.username]))
+        self.assertFalse(TimelineEntry.objects.filter(
+            user=self.reader).exists())
+        self.assertFalse(follow_posts(self.reader).exists())
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=0)
+    def test_hot_author_read_on_fan_out(self):
+        """Проверка: посты популярного автора читаются без раскладки"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(author=self.author, text='Новый пост')
+        self.assertFalse(TimelineEntry.objects.filter(post=post).exists())
+        self.assertEqual(
+            list(follow_posts(self.reader)), [post, self.post])
+
+    def follow_author(self, count):
+        follows, start = [], User.objects.count()
+        for number in range(start, start + count):
+            user = User.objects.create_user(username=f'follower{number}')
+            follows.append(
+                Follow.objects.create(user=user, author=self.author))
+        return follows
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=3, TIMELINE_WORKERS=0)
+    def test_author_leaving_hot_set_is_backfilled(self):
+        """Проверка: посты времен популярности остаются в ленте, когда
+        автор перестает быть популярным; у границы автор не выпадает"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        follows = self.follow_author(2)
+        self.assertEqual(hot_authors(), frozenset())
+        follows += self.follow_author(1)
+        with self.assertNumQueries(0):
+            self.assertEqual(hot_authors(), {self.author.pk})
+        post = Post.objects.create(author=self.author, text='Горячий пост')
+        self.assertFalse(TimelineEntry.objects.filter(post=post).exists())
+        follows.pop().delete()
+        with self.assertNumQueries(0):
+            self.assertEqual(hot_authors(), {self.author.pk})
+        self.assertFalse(TimelineEntry.objects.filter(post=post).exists())
+        follows.pop().delete()
+        with self.assertNumQueries(0):
+            self.assertEqual(hot_authors(), frozenset())
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.reader, post=post).exists())
+        self.assertEqual(
+            list(follow_posts(self.reader)), [post, self.post])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1, TIMELINE_WORKERS=1)
+    def test_backfill_waits_for_commit(self):
+        """Проверка: раскладка выбывшего автора не идет в запросе"""
+        follows = self.follow_author(2)
+        post = Post.objects.create(author=self.author, text='Горячий пост')
+        follows.pop().delete()
+        follows.pop().delete()
+        self.assertEqual(hot_authors(), frozenset())
+        self.assertFalse(TimelineEntry.objects.filter(post=post).exists())
@@ -1,19 +1,19 @@
 import shutil
 import tempfile
-import time
+from io import StringIO
 
 from django import forms
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
-from django.core.cache.utils import make_template_fragment_key
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 
 from yatube.settings import COUNT_POSTS_PAGE as CPP
 
-from ..models import Follow, Group, Post
+from ..models import Comment, Follow, Group, Post
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 User = get_user_model()
@@ -45,6 +45,8 @@ class TaskViewTests(TestCase):
             text='Тестовый пост c группой и новым user',
             group=cls.group
         )
+        # bulk_create не шлет сигналы - счетчики чиним как после импорта
+        call_command('recount', stdout=StringIO())
 
     @classmethod
     def tearDownClass(cls):
@@ -52,6 +54,7 @@ class TaskViewTests(TestCase):
         shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
 
     def setUp(self):
+        cache.clear()
         self.guest_client = Client()
         self.authorized_client = Client()
         self.authorized_client.force_login(TaskViewTests.user_authorized)
@@ -335,20 +338,117 @@ class TaskViewTests(TestCase):
 
     def test_cache(self):
         """ Проверка. Список постов на главной странице сайта
-        хранится в кэше и обновляется раз в 20 секунд."""
+        хранится в кэше и сбрасывается сразу после нового поста."""
         self.guest_client.get(reverse('posts:index'))
-        key = make_template_fragment_key('index_page', '1')
-        cache_old = cache.get(key)
+        Post.objects.filter(pk=TaskViewTests.post.pk).update(
+            text='Изменено в обход сигналов')
+        response = self.guest_client.get(reverse('posts:index'))
+        self.assertNotContains(response, 'Изменено в обход сигналов')
+        post_new = Post.objects.create(
+            author=TaskViewTests.user,
+            text='Временный пост для кэш',
+        )
+        response = self.guest_client.get(reverse('posts:index'))
+        self.assertContains(response, post_new.text)
+
+    def test_cache_scopes(self):
+        """ Проверка. Пост сбрасывает кэш только своей группы и автора."""
+        group_other = Group.objects.create(
+            title='Другая группа',
+            slug='group_other',
+            description='Тестовое описание',
+        )
+        urls = {
+            'group': reverse('posts:group_list', args=[self.group.slug]),
+            'other': reverse('posts:group_list', args=[group_other.slug]),
+            'author': reverse('posts:profile', args=[self.user.username]),
+        }
+        versions = {
+            name: self.authorized_client.get(
+                url).context['cache_version']
+            for name, url in urls.items()
+        }
         Post.objects.create(
             author=TaskViewTests.user,
             text='Временный пост для кэш',
+            group=TaskViewTests.group,
         )
-        self.guest_client.get(reverse('posts:index'))
-        key_new = make_template_fragment_key('index_page', '1')
-        cache_new = cache.get(key_new)
-        self.assertEqual(cache_old, cache_new)
-        time.sleep(20)
-        self.guest_client.get(reverse('posts:index'))
-        key_new = make_template_fragment_key('index_page', '1')
-        cache_new = cache.get(key_new)
-        self.assertNotEqual(cache_old, cache_new)
+        for name, url in urls.items():
+            with self.subTest(name=name):
+                response = self.authorized_client.get(url)
+                version = response.context['cache_version']
+                if name == 'other':
+                    self.assertEqual(version, versions[name])
+                else:
+                    self.assertNotEqual(version, versions[name])
+
+    def test_anonymous_page_key(self):
+        """Проверка: посторонние параметры запроса не дают новых копий
+        страницы, а пост в другой группе не сбрасывает страницу группы"""
+        url = reverse('posts:group_list', args=[TaskViewTests.group.slug])
+        self.guest_client.get(url + '?page=2')
+        response = self.guest_client.get(url + '?utm_source=x&page=2')
+        self.assertIsNone(response.context)
+        response = self.guest_client.get(url + '?page=3')
+        self.assertIsNotNone(response.context)
+        Post.objects.create(author=TaskViewTests.user, text='Без группы')
+        response = self.guest_client.get(url + '?page=2')
+        self.assertIsNone(response.context)
+        Post.objects.create(
+            author=TaskViewTests.user, text='В группе',
+            group=TaskViewTests.group)
+        response = self.guest_client.get(url + '?page=2')
+        self.assertIsNotNone(response.context)
+        self.guest_client.get(url + '?page=2')
+        author = User.objects.get(pk=TaskViewTests.user.pk)
+        author.first_name = 'Переименован'
+        author.save()
+        response = self.guest_client.get(url + '?page=2')
+        self.assertIsNotNone(response.context)
+
+    def test_anonymous_author_pages_key(self):
+        """Проверка: пост, подписка и комментарий у других авторов не
+        сбрасывают профиль и пост автора, подписка на автора - сбрасывает"""
+        post = TaskViewTests.post
+        urls = (
+            reverse('posts:profile', args=[post.author.username]),
+            reverse('posts:post_detail', args=[post.pk]),
+        )
+        other = Post.objects.create(author=TaskViewTests.user, text='Чужой')
+        for url in urls:
+            self.guest_client.get(url)
+        reader = User.objects.create_user(username='reader')
+        Post.objects.create(author=TaskViewTests.user, text='Еще чужой')
+        Follow.objects.create(user=reader, author=TaskViewTests.user)
+        Comment.objects.create(post=other, author=reader, text='Чужой')
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertIsNone(self.guest_client.get(url).context)
+        Follow.objects.create(user=reader, author=post.author)
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertIsNotNone(self.guest_client.get(url).context)
+
+    def test_anonymous_page_cache(self):
+        """ Проверка. Гостю страница отдается из кэша целиком,
+        авторизованному пользователю - рендерится."""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', args=[TaskViewTests.group.slug]),
+            reverse('posts:profile', args=[TaskViewTests.user.username]),
+            reverse('posts:post_detail', args=[TaskViewTests.post.id]),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                first = self.guest_client.get(url)
+                second = self.guest_client.get(url)
+                self.assertIsNone(second.context)
+                self.assertEqual(first.content, second.content)
+                response = self.authorized_client.get(url)
+                self.assertIsNotNone(response.context)
+        Post.objects.create(
+            author=TaskViewTests.user,
+            text='Временный пост для кэш',
+        )
+        response = self.guest_client.get(reverse('posts:index'))
+        self.assertIsNotNone(response.context)
@@ -0,0 +1,99 @@
+"""Миниатюры картинок постов, которые готовятся сразу после загрузки.
+
+Варианты карточки (images.render_variants) считаются в пуле потоков
+после коммита, а их URL записываются в Post.thumbnails. Шаблоны только
+читают готовые URL и не вызывают Pillow в запросе пользователя.
+Файлы вариантов прежней картинки удаляются функцией discard.
+"""
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from . import caching, images
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+
+@lru_cache(maxsize=None)
+def _get_executor():
+    # Пул создается лениво, уже в рабочем процессе после fork.
+    return ThreadPoolExecutor(
+        max_workers=settings.THUMBNAIL_WORKERS,
+        thread_name_prefix='thumbnails',
+    )
+
+
+def generate(post_id, image_name):
+    """Считает миниатюры и сохраняет их URL, если картинка не сменилась."""
+    try:
+        post = Post.objects.only('image', 'author_id', 'group_id').get(
+            pk=post_id)
+    except Post.DoesNotExist:
+        return None
+    if post.image.name != image_name:
+        return None
+    urls = images.render_variants(post.image) if image_name else {}
+    updated = Post.objects.filter(pk=post_id, image=image_name).update(
+        thumbnails=json.dumps(urls) if urls else '')
+    if not updated:
+        # Картинку сменили или пост удалили, пока считались варианты.
+        images.delete_variants(urls, post.image.storage)
+    else:
+        # update() сигналов не шлет, а фрагменты лент и страницы гостей
+        # до сброса показывали бы картинку без миниатюр.
+        caching.bump(
+            caching.INDEX,
+            caching.group_scope(post.group_id),
+            caching.author_scope(post.author_id),
+        )
+    return urls
+
+
+def _run(post_id, image_name):
+    try:
+        generate(post_id, image_name)
+    except Exception:
+        logger.exception('Не удалось подготовить миниатюры поста %s',
+                         post_id)
+    finally:
+        close_old_connections()
+
+
+def _delete(urls):
+    try:
+        images.delete_variants(urls, Post._meta.get_field('image').storage)
+    except Exception:
+        logger.exception('Не удалось удалить миниатюры %s', urls)
+
+
+def schedule(post):
+    """Ставит миниатюры поста в очередь после коммита транзакции.
+
+    При THUMBNAIL_WORKERS = 0 они считаются сразу в текущем потоке.
+    """
+    post_id, image_name = post.pk, post.image.name or ''
+    if not settings.THUMBNAIL_WORKERS:
+        generate(post_id, image_name)
+        return
+    transaction.on_commit(
+        lambda: _get_executor().submit(_run, post_id, image_name))
+
+
+def discard(thumbnails):
+    """Удаляет файлы миниатюр по значению Post.thumbnails после коммита.
+
+    После отката строка по-прежнему ссылалась бы на них, поэтому раньше
+    коммита файлы не трогаются. При THUMBNAIL_WORKERS = 0 - сразу.
+    """
+    if not thumbnails:
+        return
+    urls = json.loads(thumbnails)
+    if not settings.THUMBNAIL_WORKERS:
+        _delete(urls)
+        return
+    transaction.on_commit(lambda: _get_executor().submit(_delete, urls))
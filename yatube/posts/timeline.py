@@ -0,0 +1,210 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+from core import stampede
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Count, F, Q
+
+from .models import Follow, Post, TimelineEntry
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+HOT_AUTHORS_TIMEOUT = 300
+# Популярный автор выбывает из набора, только когда подписчиков
+# становится не больше этой доли предела: иначе автора у самой границы
+# раскладывали бы по лентам заново при каждой подписке и отписке.
+COOL_RATIO = 0.9
+
+
+def _hot_authors_key():
+    return f'timeline:hot_authors:{settings.TIMELINE_FANOUT_LIMIT}'
+
+
+def _cool_limit():
+    return int(settings.TIMELINE_FANOUT_LIMIT * COOL_RATIO)
+
+
+def hot_authors():
+    """Авторы, у которых подписчиков больше TIMELINE_FANOUT_LIMIT.
+
+    Их посты не раскладываются по лентам, а подмешиваются при чтении.
+    Полный пересчет берет нижний предел _cool_limit(): лишний автор
+    в наборе безвреден, а выбывший без раскладки пропал бы из лент.
+    """
+    return stampede.get_or_compute(_hot_authors_key(), lambda: frozenset(
+        Follow.objects.values('author').annotate(
+            followers=Count('pk')
+        ).filter(
+            followers__gt=_cool_limit()
+        ).values_list('author', flat=True)
+    ), HOT_AUTHORS_TIMEOUT)
+
+
+def forget_hot_authors():
+    cache.delete(_hot_authors_key())
+
+
+def follow_changed(author_id, delta):
+    """Подписка (delta=1) или отписка (-1) от автора.
+
+    Набор популярных авторов правится на месте по числу подписчиков
+    одного автора, без полного пересчета: автор входит в набор сверх
+    TIMELINE_FANOUT_LIMIT подписчиков, а выбывает на _cool_limit().
+    Посты, вышедшие, пока автор был популярным, в ленты не
+    раскладывались, поэтому выбывший автор раскладывается по лентам
+    всех своих подписчиков - после коммита, см. schedule_fill.
+    """
+    followers = Follow.objects.filter(author_id=author_id).count()
+    if delta > 0 and followers > settings.TIMELINE_FANOUT_LIMIT:
+        stampede.update(
+            _hot_authors_key(), lambda authors: authors | {author_id})
+    elif (delta < 0 and followers <= _cool_limit()
+            and author_id in hot_authors()):
+        stampede.update(
+            _hot_authors_key(), lambda authors: authors - {author_id})
+        schedule_fill(author_id)
+
+
+@lru_cache(maxsize=None)
+def _get_executor():
+    # Один поток: раскладка - большая запись, а SQLite пишет по одной.
+    return ThreadPoolExecutor(max_workers=1, thread_name_prefix='timeline')
+
+
+def _run_fill(author_id):
+    try:
+        fill([author_id])
+    except Exception:
+        logger.exception('Не удалось разложить посты автора %s', author_id)
+    finally:
+        close_old_connections()
+
+
+def schedule_fill(author_id):
+    """Раскладывает посты автора по лентам в фоне после коммита.
+
+    INSERT ... SELECT по всем подписчикам держал бы блокировку записи
+    до конца запроса отписки. При TIMELINE_WORKERS = 0 - сразу.
+    """
+    if not settings.TIMELINE_WORKERS:
+        fill([author_id])
+        return
+    transaction.on_commit(
+        lambda: _get_executor().submit(_run_fill, author_id))
+
+
+def _entries(user_ids, author_id, posts):
+    for user_id in user_ids:
+        for pk, pub_date in posts:
+            yield TimelineEntry(
+                user_id=user_id,
+                post_id=pk,
+                author_id=author_id,
+                pub_date=pub_date,
+            )
+
+
+def fan_out(post):
+    """Кладет новый пост в ленты всех подписчиков автора."""
+    if post.author_id in hot_authors():
+        return
+    followers = Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user_id', flat=True).distinct()
+    TimelineEntry.objects.bulk_create(
+        _entries(followers, post.author_id, [(post.pk, post.pub_date)]),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту подписчика уже опубликованные посты автора."""
+    if author_id in hot_authors():
+        return
+    posts = Post.objects.filter(
+        author_id=author_id
+    ).values_list('pk', 'pub_date').iterator()
+    TimelineEntry.objects.bulk_create(
+        _entries([user_id], author_id, posts),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def fill(author_ids):
+    """Раскладывает посты авторов по лентам всех их подписчиков.
+
+    Нужно после массового импорта, где сигналы не срабатывают. Это один
+    INSERT ... SELECT по соединению Follow и Post; уже разложенные
+    записи пропускаются.
+    """
+    # Условие на посты в том же filter(), что и values_list ниже:
+    # иначе Django добавит второй JOIN с постами.
+    rows = Follow.objects.filter(
+        author_id__in=author_ids, author__posts__isnull=False
+    ).exclude(
+        author_id__in=hot_authors()
+    ).order_by().values_list(
+        'user_id', 'author__posts__id', 'author_id', 'author__posts__pub_date'
+    )
+    select, params = rows.query.sql_with_params()
+    ops = connection.ops
+    columns = ('user_id', 'post_id', 'author_id', 'pub_date')
+    sql = '{} {} ({}) {} {}'.format(
+        ops.insert_statement(ignore_conflicts=True),
+        ops.quote_name(TimelineEntry._meta.db_table),
+        ', '.join(ops.quote_name(column) for column in columns),
+        select,
+        ops.ignore_conflicts_suffix_sql(ignore_conflicts=True),
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def prune(user_id, author_id):
+    """Убирает посты автора из ленты бывшего подписчика."""
+    if Follow.objects.filter(user_id=user_id, author_id=author_id).exists():
+        return
+    TimelineEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def follow_feed(user):
+    """Посты ленты «Избранные авторы» и ключи для CursorPaginator.
+
+    Обычно это один проход по индексу (user, pub_date, post) таблицы
+    TimelineEntry; посты популярных авторов читаются напрямую, тогда
+    ключи - обычные (pub_date, pk) поста, то есть None.
+    """
+    # Сортировка и курсоры по колонкам TimelineEntry: значения те же,
+    # что у поста, но база идет прямо по индексу. Выражения, а не
+    # имена полей: фильтр по полю связи в отдельном filter() добавил
+    # бы второй JOIN, а выражение берет уже присоединенную таблицу.
+    keys = (F('timeline_entries__pub_date'), F('timeline_entries__post'))
+    posts = Post.objects.filter(timeline_entries__user=user)
+    hot = hot_authors()
+    if hot:
+        followed_hot = [
+            author_id for author_id in Follow.objects.filter(
+                user=user
+            ).values_list('author_id', flat=True)
+            if author_id in hot
+        ]
+        if followed_hot:
+            posts = Post.objects.filter(
+                Q(pk__in=TimelineEntry.objects.filter(
+                    user=user
+                ).values('post_id'))
+                | Q(author_id__in=followed_hot)
+            )
+            return posts.order_by(*Post._meta.ordering), None
+    return posts.order_by(*(key.desc() for key in keys)), keys
+
+
+def follow_posts(user):
+    """Посты ленты «Избранные авторы», см. follow_feed."""
+    return follow_feed(user)[0]
@@ -1,47 +1,149 @@
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
+from django.db import transaction
+from django.http import Http404, HttpResponseBadRequest, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
 
-from yatube.settings import COUNT_POSTS_PAGE
-
+from . import timeline
+from .caching import (INDEX, NAMES, author_scope, cache_anonymous,
+                      conditional_page, fragment_context, group_scope)
+from .counters import get_stats
+from .exporter import CONTENT_TYPES, EXPORTS, FORMATS, export, parse_moment
+from .feeds import feed
 from .forms import CommentForm, PostForm
-from .models import Follow, Group, Post, User
+from .models import Comment, Follow, Post
+from .objects import authors, groups
+from .paginator import CursorPaginator, WindowedPaginator
+from .search import search as search_posts
 
 
-def my_paginator(request, post_list):
-    paginator = Paginator(post_list, COUNT_POSTS_PAGE)
+def my_paginator(request, post_list, count=None, keys=None):
+    cursor = request.GET.get('cursor')
+    cursor_mode = (
+        settings.PAGINATION_MODE == 'cursor' and 'page' not in request.GET
+    )
+    if cursor is not None or cursor_mode:
+        paginator = CursorPaginator(
+            post_list, settings.COUNT_POSTS_PAGE, keys=keys)
+        return paginator.get_page(cursor)
+    # Если счетчик уже известен, COUNT(*) не нужен.
+    paginator = WindowedPaginator(
+        post_list, settings.COUNT_POSTS_PAGE, count=count)
     page_number = request.GET.get('page')
     return paginator.get_page(page_number)
 
 
+def comment_page(post, cursor=None):
+    """Порция комментариев поста от новых к старым, сразу с авторами."""
+    comments = post.comments.select_related('author').only(
+        'id', 'post_id', 'text', 'created', 'author__id', 'author__username'
+    )
+    paginator = CursorPaginator(
+        comments, settings.COUNT_COMMENTS_PAGE, date_field='created'
+    )
+    return paginator.get_page(cursor)
+
+
+def _newest(queryset, field='pub_date'):
+    """Самая свежая дата в queryset: один запрос по индексу."""
+    return queryset.order_by(f'-{field}').values_list(
+        field, flat=True).first()
+
+
+def _newest_in_index(request):
+    return _newest(Post.objects.all())
+
+
+def _newest_in_group(request, slug):
+    group = groups.get(slug)
+    if group is None:
+        return None
+    return _newest(Post.objects.filter(group_id=group.pk))
+
+
+def _newest_in_profile(request, username):
+    author = authors.get(username)
+    if author is None:
+        return None
+    return _newest(Post.objects.filter(author_id=author.pk))
+
+
+def _newest_in_post(request, post_id):
+    dates = [
+        _newest(Post.objects.filter(pk=post_id)),
+        _newest(Comment.objects.filter(post_id=post_id), 'created'),
+    ]
+    return max((date for date in dates if date), default=None)
+
+
+def _newest_in_follow(request):
+    if not request.user.is_authenticated:
+        return None
+    return timeline.follow_posts(request.user).values_list(
+        'pub_date', flat=True).first()
+
+
+def _group_scope(request, slug):
+    group = groups.get(slug)
+    return group_scope(group.pk) if group is not None else None
+
+
+def _author_scope(request, username):
+    author = authors.get(username)
+    return author_scope(author.pk) if author is not None else None
+
+
+def _post_author_scope(request, post_id):
+    """Область автора поста: ее меняют правки поста и комментарии."""
+    if not hasattr(request, '_post_author_id'):
+        request._post_author_id = Post.objects.filter(
+            pk=post_id).values_list('author_id', flat=True).first()
+    if request._post_author_id is None:
+        return None
+    return author_scope(request._post_author_id)
+
+
+def _follower_scope(request):
+    """Область читателя ленты: ее меняют его подписки."""
+    return author_scope(request.user.pk)
+
+
+@conditional_page(INDEX, latest=_newest_in_index)
+@cache_anonymous(INDEX)
 def index(request):
     template = 'posts/index.html'
-    post_list = Post.objects.all()
+    post_list = feed()
     page_obj = my_paginator(request, post_list)
     context = {
         'page_obj': page_obj,
+        **fragment_context(INDEX),
     }
     return render(request, template, context)
 
 
+@conditional_page(_group_scope, latest=_newest_in_group)
+@cache_anonymous(_group_scope)
 def group_posts(request, slug):
     template = 'posts/group_list.html'
-    group = get_object_or_404(Group, slug=slug)
-    post_list = group.posts_group.all()
-    page_obj = my_paginator(request, post_list)
+    group = groups.get_or_404(slug)
+    post_list = feed(group.posts_group.all())
+    page_obj = my_paginator(request, post_list, group.posts_count)
     context = {
         'group': group,
         'page_obj': page_obj,
+        **fragment_context(group_scope(group.pk)),
     }
     return render(request, template, context)
 
 
+@conditional_page(_author_scope, NAMES, latest=_newest_in_profile)
+@cache_anonymous(_author_scope, NAMES)
 def profile(request, username):
     template = 'posts/profile.html'
-    user = get_object_or_404(User, username=username)
-    post_list = user.posts.all()
-    posts_count = post_list.count()
-    page_obj = my_paginator(request, post_list)
+    user = authors.get_or_404(username)
+    post_list = feed(user.posts.all())
+    stats = get_stats(user)
+    page_obj = my_paginator(request, post_list, stats.posts_count)
     following = False
     if request.user.is_authenticated:
         following = Follow.objects.filter(
@@ -49,18 +151,25 @@ def profile(request, username):
         ).exists()
     context = {
         'page_obj': page_obj,
-        'posts_count': posts_count,
+        'posts_count': stats.posts_count,
+        'stats': stats,
         'author': user,
-        'following': following
+        'following': following,
+        **fragment_context(author_scope(user.pk), NAMES),
     }
     return render(request, template, context)
 
 
+@conditional_page(_post_author_scope, NAMES, latest=_newest_in_post)
+@cache_anonymous(_post_author_scope, NAMES, params=('comments',))
 def post_detail(request, post_id):
     template = 'posts/post_detail.html'
-    post = get_object_or_404(Post, pk=post_id)
-    post_count = post.author.posts.count()
-    comments = post.comments.all()
+    post = get_object_or_404(
+        Post.objects.select_related('author', 'group'), pk=post_id
+    )
+    post_count = get_stats(post.author).posts_count
+    comments_cursor = request.GET.get('comments', '')
+    comments = comment_page(post, comments_cursor)
     form = CommentForm(
         request.POST or None
     )
@@ -68,11 +177,74 @@ def post_detail(request, post_id):
         'post': post,
         'post_count': post_count,
         'comments': comments,
-        'form': form
+        'comments_cursor': comments_cursor,
+        'form': form,
+        **fragment_context(author_scope(post.author_id), NAMES),
     }
     return render(request, template, context)
 
 
+@cache_anonymous(_post_author_scope, NAMES, params=('cursor',))
+def post_comments(request, post_id):
+    """Следующая порция комментариев для подгрузки на странице поста."""
+    post = get_object_or_404(Post.objects.only('id'), pk=post_id)
+    context = {
+        'post': post,
+        'comments': comment_page(post, request.GET.get('cursor')),
+    }
+    return render(request, 'posts/includes/comments.html', context)
+
+
+def post_search(request):
+    template = 'posts/search.html'
+    query = request.GET.get('q', '').strip()
+    page_obj = search_posts(
+        query,
+        settings.COUNT_POSTS_PAGE,
+        cursor=request.GET.get('cursor'),
+        post_list=feed(),
+    )
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+    }
+    return render(request, template, context)
+
+
+@transaction.non_atomic_requests
+@login_required
+def export_content(request, kind):
+    """Выгрузка постов или комментариев потоком, без загрузки в память.
+
+    Параметры: format (ndjson, csv), author, group, since, until, gzip.
+    """
+    if kind not in EXPORTS:
+        raise Http404
+    fmt = request.GET.get('format', 'ndjson')
+    if fmt not in FORMATS:
+        return HttpResponseBadRequest('Неизвестный формат')
+    filters = {
+        'author': request.GET.get('author'),
+        'group': request.GET.get('group'),
+    }
+    try:
+        for name in ('since', 'until'):
+            if request.GET.get(name):
+                filters[name] = parse_moment(request.GET[name])
+    except ValueError as error:
+        return HttpResponseBadRequest(str(error))
+    compress = request.GET.get('gzip') == '1'
+    filename = f'{kind}s.{fmt}' + ('.gz' if compress else '')
+    response = StreamingHttpResponse(
+        export(kind, fmt, compress=compress, **filters),
+        content_type=(
+            'application/gzip' if compress else CONTENT_TYPES[fmt]
+        ) + '; charset=utf-8',
+    )
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
 @login_required
 def post_create(request):
     form = PostForm(
@@ -122,13 +294,11 @@ def add_comment(request, post_id):
 
 
 @login_required
+@conditional_page(INDEX, _follower_scope, latest=_newest_in_follow)
 def follow_index(request):
     template = 'posts/follow.html'
-    user = request.user
-    post_list = Post.objects.filter(
-        author__following__user=user
-    )
-    page_obj = my_paginator(request, post_list)
+    post_list, keys = timeline.follow_feed(request.user)
+    page_obj = my_paginator(request, feed(post_list), keys=keys)
     context = {
         'page_obj': page_obj,
     }
@@ -138,7 +308,7 @@ def follow_index(request):
 @login_required
 def profile_follow(request, username):
     """Подписаться на автора"""
-    author = get_object_or_404(User, username=username)
+    author = authors.get_or_404(username)
     if request.user != author:
         Follow.objects.get_or_create(
             user=request.user,
@@ -150,7 +320,7 @@ def profile_follow(request, username):
 @login_required
 def profile_unfollow(request, username):
     """Дизлайк, отписка"""
-    author = get_object_or_404(User, username=username)
+    author = authors.get_or_404(username)
     follow_del = get_object_or_404(Follow, user=request.user, author=author)
     follow_del.delete()
     return redirect('posts:profile', username)
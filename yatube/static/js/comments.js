@@ -0,0 +1,11 @@
+// Подгрузка следующих порций комментариев без перезагрузки страницы.
+document.addEventListener('click', function (event) {
+  var link = event.target.closest('.js-more-comments');
+  if (!link) {
+    return;
+  }
+  event.preventDefault();
+  fetch(link.dataset.fragment, {credentials: 'same-origin'})
+    .then(function (response) { return response.text(); })
+    .then(function (html) { link.outerHTML = html; });
+});
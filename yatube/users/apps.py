@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class UsersConfig(AppConfig):
     name = 'users'
+
+    def ready(self):
+        # Кэш пользователей подключает сброс по сигналам модели.
+        from . import backends  # noqa: F401
@@ -0,0 +1,22 @@
+from core.objects import ObjectCache
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+
+users = ObjectCache(
+    get_user_model(), 'pk', timeout=settings.USER_CACHE_TIMEOUT)
+
+
+class CachedModelBackend(ModelBackend):
+    """ModelBackend, который берет пользователя сессии из кэша.
+
+    Кэш сбрасывается при каждом сохранении и удалении пользователя,
+    в том числе при смене пароля: хэш пароля входит в проверку сессии,
+    и старые сессии перестают действовать сразу.
+    """
+
+    def get_user(self, user_id):
+        user = users.get(user_id)
+        if user is None or not self.user_can_authenticate(user):
+            return None
+        return user
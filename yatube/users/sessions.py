@@ -0,0 +1,98 @@
+"""Сессии из кэша с отложенной записью в базу.
+
+Сессия читается из кэша, в базу идут только промахи. Новая сессия
+вместе с данными входа и удаление сессии при выходе пишутся в базу
+сразу. Изменения существующей сессии копятся в процессе и после
+ответа, не чаще раза в SESSION_WRITE_BEHIND_INTERVAL секунд, пишутся
+в базу одним UPDATE на сессию. UPDATE не создает строк, так что
+отложенная запись не воскресит сессию, удаленную при выходе в другом
+процессе.
+"""
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.sessions.backends import cached_db
+from django.contrib.sessions.backends.base import UpdateError
+from django.core.signals import request_finished
+from django.db import DatabaseError, transaction
+
+logger = logging.getLogger(__name__)
+
+# session_key -> (session_data, expire_date) еще не записанных изменений.
+_pending = {}
+_lock = threading.Lock()
+_next_flush = 0
+
+
+class SessionStore(cached_db.SessionStore):
+    cache_key_prefix = 'session:'
+    # Сессия создана в этом запросе (вход): ее данные пишутся сразу.
+    created = False
+
+    def create(self):
+        super().create()
+        self.created = True
+
+    def save(self, must_create=False):
+        if self.session_key is None or must_create or self.created:
+            super().save(must_create)
+            return
+        data = self._get_session()
+        obj = self.create_model_instance(data)
+        # Кэш переписывается, только если сессия в нем еще есть, одной
+        # командой общего слоя: проверка по слою процесса могла отстать
+        # от выхода в другом процессе, и запись вернула бы сессию.
+        replace = getattr(self._cache, 'replace', None)
+        if replace and replace(self.cache_key, data, self.get_expiry_age()):
+            with _lock:
+                _pending[obj.session_key] = obj.session_data, obj.expire_date
+            return
+        # В кэше сессии нет: UPDATE в базе сразу, строку он не создаст.
+        # Кэш заполнит следующее чтение.
+        with _lock:
+            _pending.pop(obj.session_key, None)
+        updated = self.model.objects.filter(
+            session_key=obj.session_key
+        ).update(session_data=obj.session_data, expire_date=obj.expire_date)
+        if not updated:
+            # Как у db: сессию удалили, пока шел запрос, - не пересоздаем.
+            raise UpdateError
+
+    def delete(self, session_key=None):
+        key = session_key or self.session_key
+        with _lock:
+            _pending.pop(key, None)
+        super().delete(session_key)
+
+
+def flush(force=False):
+    """Пишет накопленные изменения сессий в базу."""
+    global _next_flush
+    now = time.monotonic()
+    with _lock:
+        if not force and now < _next_flush:
+            return
+        _next_flush = now + settings.SESSION_WRITE_BEHIND_INTERVAL
+        pending = dict(_pending)
+        _pending.clear()
+    if not pending:
+        return
+    model = SessionStore.get_model_class()
+    try:
+        with transaction.atomic():
+            for key, (data, expire_date) in pending.items():
+                model.objects.filter(session_key=key).update(
+                    session_data=data, expire_date=expire_date)
+    except DatabaseError:
+        logger.exception('Сессии не записаны в базу, повтор позже')
+        with _lock:
+            for key, value in pending.items():
+                _pending.setdefault(key, value)
+
+
+request_finished.connect(
+    lambda **kwargs: flush(), weak=False, dispatch_uid='users.sessions')
+atexit.register(flush, force=True)
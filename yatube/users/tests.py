@@ -0,0 +1,106 @@
+from http import HTTPStatus
+
+from core.cache import SQLiteCache
+from django.contrib.auth import get_user_model
+from django.contrib.sessions.backends.base import UpdateError
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from . import sessions
+
+User = get_user_model()
+
+
+class CachedAuthTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='reader', password='old-password-42')
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def auth_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        return [
+            query['sql'] for query in context.captured_queries
+            if 'django_session' in query['sql']
+            or '"auth_user"."password"' in query['sql']
+        ]
+
+    def test_warm_cache_needs_no_auth_queries(self):
+        """Проверка: с теплым кэшем сессия и пользователь без запросов"""
+        url = reverse('posts:follow_index')
+        self.assertTrue(self.auth_queries(url))
+        self.assertEqual(self.auth_queries(url), [])
+
+    def test_sessions_of_model_backend_stay_valid(self):
+        """Проверка: сессии, открытые через ModelBackend, действуют"""
+        client = Client()
+        client.force_login(
+            self.user, backend='django.contrib.auth.backends.ModelBackend')
+        response = client.get(reverse('posts:follow_index'))
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_password_change_ends_other_sessions(self):
+        """Проверка: после смены пароля другие сессии не действуют"""
+        other = Client()
+        other.force_login(self.user)
+        url = reverse('posts:follow_index')
+        self.assertEqual(other.get(url).status_code, HTTPStatus.OK)
+        response = self.client.post(reverse('users:password_change_form'), {
+            'old_password': 'old-password-42',
+            'new_password1': 'new-password-42',
+            'new_password2': 'new-password-42',
+        })
+        self.assertEqual(response.status_code, HTTPStatus.FOUND)
+        self.assertEqual(self.client.get(url).status_code, HTTPStatus.OK)
+        self.assertEqual(other.get(url).status_code, HTTPStatus.FOUND)
+
+    def test_logout_is_not_undone_by_write_behind(self):
+        """Проверка: отложенная запись не воскрешает сессию после выхода"""
+        key = self.client.session.session_key
+        session = sessions.SessionStore(key)
+        session['theme'] = 'dark'
+        session.save()
+        self.assertNotIn('theme', Session.objects.get(
+            session_key=key).get_decoded())
+        self.client.get(reverse('users:logout'))
+        sessions.flush(force=True)
+        self.assertFalse(Session.objects.filter(session_key=key).exists())
+        self.assertEqual(self.client.get(reverse(
+            'posts:follow_index')).status_code, HTTPStatus.FOUND)
+
+    def test_save_does_not_restore_session_removed_elsewhere(self):
+        """Проверка: сохранение не возвращает в кэш сессию, удаленную
+        выходом в другом процессе"""
+        key = self.client.session.session_key
+        session = sessions.SessionStore(key)
+        session['theme'] = 'dark'
+        # Выход в другом процессе: общий слой уже без сессии, а слой
+        # этого процесса еще помнит ее.
+        Session.objects.filter(session_key=key).delete()
+        made = cache.make_key(session.cache_key)
+        SQLiteCache.remove(cache, [made])
+        self.assertIn(session.cache_key, cache)
+        with self.assertRaises(UpdateError):
+            session.save()
+        self.assertIsNone(cache.get(session.cache_key))
+        self.assertEqual(self.client.get(reverse(
+            'posts:follow_index')).status_code, HTTPStatus.FOUND)
+
+    def test_write_behind(self):
+        """Проверка: изменения сессии попадают в базу при сбросе"""
+        key = self.client.session.session_key
+        session = sessions.SessionStore(key)
+        session['theme'] = 'dark'
+        session.save()
+        self.assertEqual(sessions.SessionStore(key)['theme'], 'dark')
+        sessions.flush(force=True)
+        self.assertEqual(Session.objects.get(
+            session_key=key).get_decoded()['theme'], 'dark')
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
 import os
+import tempfile
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -38,6 +39,7 @@ ALLOWED_HOSTS = ['*']
 
 INSTALLED_APPS = [
     'about.apps.AboutConfig',
+    'api.apps.ApiConfig',
     'core.apps.CoreConfig',
     'posts.apps.PostsConfig',
     'users.apps.UsersConfig',
@@ -48,10 +50,13 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'sorl.thumbnail',
-    'debug_toolbar',
+    'rest_framework',
+    'rest_framework.authtoken',
 ]
 
 MIDDLEWARE = [
+    'core.middleware.MetricsMiddleware',
+    'core.middleware.QueryLogMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -59,9 +64,14 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'debug_toolbar.middleware.DebugToolbarMiddleware',
 ]
 
+# Панель отладки только при DEBUG: под нагрузкой она сама по себе
+# тормозит каждый запрос. Метрики для боевого сервера - на /metrics.
+if DEBUG:
+    INSTALLED_APPS.append('debug_toolbar')
+    MIDDLEWARE.append('debug_toolbar.middleware.DebugToolbarMiddleware')
+
 # INTERNAL_IPS = ['127.0.0.1',]
 
 ROOT_URLCONF = 'yatube.urls'
@@ -93,6 +103,9 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        # Счетчики и ленты обновляются сигналами в той же транзакции,
+        # что и сами посты, комментарии и подписки.
+        'ATOMIC_REQUESTS': True,
     }
 }
 
@@ -100,6 +113,23 @@ DATABASES = {
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
 
+# Пользователь сессии берется из кэша (users.backends) и сбрасывается
+# при изменении; сессии тоже читаются из кэша, а изменения пишутся
+# в базу с задержкой до SESSION_WRITE_BEHIND_INTERVAL секунд.
+# ModelBackend остается для сессий, открытых до CachedModelBackend:
+# они действуют до следующего входа.
+AUTHENTICATION_BACKENDS = [
+    'users.backends.CachedModelBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+USER_CACHE_TIMEOUT = 300
+# Кэш групп и авторов по slug и имени (core.objects); отсутствие
+# объекта кэшируется ненадолго, чтобы поток 404 не доходил до базы.
+OBJECT_CACHE_TIMEOUT = 300
+OBJECT_CACHE_NEGATIVE_TIMEOUT = 30
+SESSION_ENGINE = 'users.sessions'
+SESSION_WRITE_BEHIND_INTERVAL = 5
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -149,14 +179,143 @@ EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
 COUNT_POSTS_PAGE = 10
+# Комментариев в одной порции на странице поста.
+COUNT_COMMENTS_PAGE = 20
+
+# API: токен для мобильных клиентов и интеграций, сессия для браузера.
+REST_FRAMEWORK = {
+    'DEFAULT_AUTHENTICATION_CLASSES': (
+        'rest_framework.authentication.TokenAuthentication',
+        'rest_framework.authentication.SessionAuthentication',
+    ),
+    'DEFAULT_PERMISSION_CLASSES': (
+        'rest_framework.permissions.IsAuthenticatedOrReadOnly',
+    ),
+    'DEFAULT_PAGINATION_CLASS': 'api.pagination.KeysetPagination',
+    'PAGE_SIZE': 20,
+}
+
+# 'page' - нумерованные страницы (?page=N),
+# 'cursor' - keyset-пагинация по (pub_date, id) без COUNT(*) и OFFSET.
+# Ссылки вида ?cursor=... работают в любом режиме.
+PAGINATION_MODE = 'page'
+# Число записей ленты без готового счетчика считается не дальше этого
+# и кэшируется; если записей больше, у страниц только соседние номера.
+PAGINATION_MAX_COUNT = 100000
+PAGINATION_COUNT_TIMEOUT = 300
+
+# Посты авторов, у которых подписчиков больше этого числа, не раскладываются
+# по лентам подписчиков при публикации, а читаются из Post при показе ленты.
+TIMELINE_FANOUT_LIMIT = 5000
+# Раскладка постов автора, выбывшего из популярных, идет в фоне;
+# 0 - сразу в запросе отписки.
+TIMELINE_WORKERS = 1
+
+# Базовый прогон manage.py benchmark, с которым сравниваются новые замеры.
+BENCHMARK_BASELINE = os.path.join(BASE_DIR, 'benchmarks', 'baseline.json')
+# Допустимый рост p95 и памяти относительно базового прогона.
+BENCHMARK_TOLERANCE = 0.2
 
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Оригинал картинки при загрузке уменьшается до этой стороны,
+# метаданные EXIF удаляются.
+IMAGE_MAX_SIDE = 2560
+# Варианты карточки поста для srcset: кадр с пропорциями IMAGE_CARD_SIZE
+# в нескольких ширинах и форматах (по убыванию предпочтения). Форматы,
+# которые не умеет сохранять установленный Pillow, пропускаются.
+IMAGE_CARD_SIZE = (960, 339)
+IMAGE_VARIANT_WIDTHS = (480, 960, 1440)
+IMAGE_VARIANT_FORMATS = ('avif', 'webp', 'jpeg')
+IMAGE_VARIANT_QUALITY = 80
+# Потоков для подготовки миниатюр; 0 - считать сразу в запросе.
+THUMBNAIL_WORKERS = 2
+
+# Фрагменты лент сбрасываются сигналами при изменении постов,
+# поэтому живут долго.
+FRAGMENT_CACHE_TIMEOUT = 60 * 60 * 6
+# Страницы для гостей целиком, сбрасываются так же.
+PAGE_CACHE_TIMEOUT = 60 * 60 * 6
+# Карточки постов и комментариев: версия в ключе, сбрасывать нечего.
+CARD_CACHE_TIMEOUT = 60 * 60 * 24
+
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        # LRU процесса перед общим для воркеров файлом SQLite, со
+        # счетчиками попаданий и промахов для /metrics (core.cache).
+        'BACKEND': 'core.cache.TieredCache',
+        # Не в общем /tmp: в файле pickle сессий и пользователей,
+        # core.cache создает его с правами 0600 и проверяет владельца.
+        'LOCATION': os.environ.get('CACHE_LOCATION', os.path.join(
+            BASE_DIR, 'var', 'cache.sqlite3')),
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+            'LOCAL_MAX_ENTRIES': 2000,
+            # Чужие записи видны процессу не позже чем через столько секунд.
+            'POLL_INTERVAL': 0.25,
+        },
     }
 }
+
+# Пересчет дорогих значений кэша (core.stampede): сколько отдавать
+# прежнее значение после срока, пока его пересчитывает другой запрос,
+# сколько держать блокировку пересчета и ждать чужой пересчет нового
+# ключа. BETA > 1 - пересчитывать заранее чаще, 0 - только по сроку.
+CACHE_STALE_TIMEOUT = 60
+CACHE_REFILL_LOCK_TIMEOUT = 30
+CACHE_REFILL_WAIT = 5
+CACHE_EARLY_REFRESH_BETA = 1.0
+
+# Тесты держат общий кэш в своем временном файле.
+TEST_RUNNER = 'core.runner.TestRunner'
+
+# Каталог снимков метрик процессов (core.metrics); чистится при деплое.
+METRICS_DIR = os.environ.get(
+    'METRICS_DIR', os.path.join(tempfile.gettempdir(), 'yatube-metrics'))
+METRICS_FLUSH_INTERVAL = 5
+# Кому открыт /metrics: адресам из METRICS_ALLOWED_IPS (через запятую)
+# и запросам с заголовком Authorization: Bearer <METRICS_TOKEN>.
+# По умолчанию - никому.
+METRICS_ALLOWED_IPS = [
+    ip for ip in os.environ.get('METRICS_ALLOWED_IPS', '').split(',') if ip
+]
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# Журнал медленных SQL-запросов и N+1 (core.querylog), выключен по
+# умолчанию; читается командой slow_queries.
+SLOW_QUERY_LOG = os.environ.get('SLOW_QUERY_LOG') == '1'
+SLOW_QUERY_THRESHOLD_MS = 100
+# Столько одинаковых по форме запросов за один HTTP-запрос - это N+1.
+N_PLUS_ONE_THRESHOLD = 10
+SLOW_QUERY_LOG_FILE = os.environ.get(
+    'SLOW_QUERY_LOG_FILE',
+    os.path.join(tempfile.gettempdir(), 'yatube-queries.log'))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'message': {'format': '%(message)s'},
+    },
+    'handlers': {
+        'queries': {
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': SLOW_QUERY_LOG_FILE,
+            'maxBytes': 10 * 1024 * 1024,
+            'backupCount': 5,
+            'encoding': 'utf-8',
+            'delay': True,
+            'formatter': 'message',
+        },
+    },
+    'loggers': {
+        'yatube.queries': {
+            'handlers': ['queries'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}